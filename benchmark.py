@@ -0,0 +1,230 @@
+import os
+import sys
+import argparse
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+
+# Runs headless unless a platform is chosen explicitly
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from bson.objectid import ObjectId
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox
+
+import main
+
+# (device name, serial prefix, weight) -- laptops and peripherals dominate a hotel inventory
+DEVICE_MODELS = [
+    ("Dell Latitude 5420", "DL", 14), ("Dell Latitude 7430", "DL", 8), ("HP EliteBook 840", "HP", 10),
+    ("HP ProDesk 400", "HP", 7), ("Lenovo ThinkPad X1", "LN", 6), ("Lenovo ThinkCentre M70", "LN", 5),
+    ("Apple MacBook Pro", "MB", 3), ("Dell P2422H Monitor", "MN", 12), ("Logitech MX Master 3S", "MX", 6),
+    ("Logitech K120 Keyboard", "KB", 6), ("Brother HL-L2370DN", "PR", 3), ("Epson Projector", "PJ", 1),
+    ("Cisco Switch 2960", "SW", 2), ("Ubiquiti AP AC Pro", "AP", 4), ("Yealink T46U Phone", "PH", 8),
+    ("Samsung SSD 1TB", "SSD", 2), ("Zebra ZD421 Label Printer", "ZB", 1), ("Ingenico Move/5000", "POS", 2),
+]
+STATUS_WEIGHTS = [("In Use", 62), ("Available", 28), ("Retired", 10)]
+CUSTOM_LOCATIONS = ["Spa", "Kids Club", "Housekeeping", "Security", "Ballroom", "Pool Bar"]
+FIRST_NAMES = ["Ahmed", "Youssef", "Sara", "Fatima", "Omar", "Imane", "Karim", "Salma", "Mehdi", "Nadia", "John", "Maria"]
+LAST_NAMES = ["Alaoui", "Bennani", "Chraibi", "El Idrissi", "Tazi", "Smith", "Garcia", "Haddad", "Berrada", "Lahlou"]
+TEAMS = ["IT Team", "Finance Team", "Front Office", "All Staff", "Housekeeping"]
+
+def generate_inventory(count, seed=42):
+    # Same schema as populate_sample_inventory, with skewed, repeatable distributions
+    rng = random.Random(seed)
+    models = [(name, prefix) for name, prefix, _ in DEVICE_MODELS]
+    model_weights = [weight for _, _, weight in DEVICE_MODELS]
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    status_weights = [weight for _, weight in STATUS_WEIGHTS]
+    locations = main.LOCATION_OPTIONS + CUSTOM_LOCATIONS
+    # A few busy locations hold most of the devices
+    location_weights = [1.0 / (rank + 1) for rank in range(len(locations))]
+    for i in range(count):
+        name, prefix = rng.choices(models, model_weights)[0]
+        status = rng.choices(statuses, status_weights)[0]
+        if status != "In Use":
+            assigned_to = ""
+        elif rng.random() < 0.15:
+            assigned_to = rng.choice(TEAMS)
+        else:
+            assigned_to = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        yield {
+            "device_name": name,
+            "serial_number": f"{prefix}{i:08d}{rng.randrange(36 ** 2):02X}",
+            "location": rng.choices(locations, location_weights)[0],
+            "status": status,
+            "assigned_to": assigned_to,
+        }
+
+def seed_collection(collection, count, seed, batch_size=10000):
+    collection.drop()
+    docs = generate_inventory(count, seed)
+    while True:
+        batch = [doc for _, doc in zip(range(batch_size), docs)]
+        if not batch:
+            break
+        collection.insert_many(batch, ordered=False)
+
+def wait_until(app, condition, timeout=600):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        app.processEvents()
+        time.sleep(0.001)
+        if time.monotonic() > deadline:
+            raise TimeoutError("benchmark step did not finish")
+
+class Bench:
+    # Times one phase at a time; peak memory is traced only when asked for
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def run(self, name, fn, items=None, unit="rows", note=None):
+        # note formats fn's return value, e.g. "{:,} matches"
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        count = fn()
+        elapsed = time.perf_counter() - start
+        peak = None
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+        items = count if items is None else items
+        result = {'phase': name, 'seconds': elapsed, 'items': items, 'unit': unit, 'peak_mb': peak, 'result': count}
+        self.results.append(result)
+        rate = f"{items / elapsed:,.0f} {unit}/s" if items and elapsed else ""
+        memory = '' if peak is None else f"{peak:8.1f} MB"
+        print(f"  {name:<28} {elapsed:9.3f}s  {rate:>18}  {memory:>11}  {note.format(count) if note else ''}", flush=True)
+        return count
+
+def bench_size(app, rows, args):
+    print(f"\n{rows:,} rows ({args.backend})")
+    bench = Bench(not args.no_memory)
+    collection = main.get_inventory_col()
+    bench.run("seed", lambda: seed_collection(collection, rows, args.seed), rows)
+    main.ensure_indexes()
+
+    window = main.InventoryWindow()
+
+    def load():
+        window.load_data()
+        wait_until(app, lambda: window.loader is None)
+        return window.model.rowCount()
+    wait_until(app, lambda: window.loader is None)
+    bench.run("load_data", load)
+
+    def search(query):
+        def run():
+            window.search_input.blockSignals(True)
+            window.search_input.setText(query)
+            window.search_input.blockSignals(False)
+            window.filter_table()
+            wait_until(app, lambda: window.loader is None)
+            return window.model.rowCount()
+        return run
+    for query in args.queries:
+        bench.run(f"filter_table {query!r}", search(query), rows, note="{:,} matches")
+    bench.run("filter_table ''", search(''), rows, note="{:,} matches")
+
+    def stats():
+        window.stats = window.stats.fetch(collection)
+        window.refresh_stats()
+        return window.stats.total()
+    bench.run("refresh_stats", stats)
+
+    def export(path, selected_filter):
+        # Through the Export button, with the save dialog answered up front
+        def run():
+            finished = []
+            on_export_finished = window.on_export_finished
+            window.on_export_finished = lambda path, result: (on_export_finished(path, result), finished.append(result))
+            QFileDialog.getSaveFileName = staticmethod(lambda *a, **k: (path, selected_filter))
+            try:
+                window.export_csv()
+                wait_until(app, lambda: finished)
+            finally:
+                del window.on_export_finished
+            return finished[0][0]
+        return run
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, selected_filter in (("inventory.csv", main.EXPORT_FILTERS[0]), ("inventory.jsonl.gz", main.EXPORT_FILTERS[3])):
+            bench.run(f"export {name}", export(os.path.join(tmp, name), selected_filter))
+
+    def round_trips(op):
+        def run():
+            for i in range(args.round_trips):
+                done = []
+                if op == 'insert':
+                    doc = dict(next(generate_inventory(1, args.seed + i)), serial_number=f"BENCH{i:06d}")
+                    doc_id = ObjectId()
+                    window.save_item('insert', doc_id, doc, lambda queued: (window.on_item_added(dict(doc, _id=doc_id), queued), done.append(1)))
+                else:
+                    rid = window.model.rid_for_id(added[i])
+                    if op == 'update':
+                        changes = {'status': 'Retired', 'assigned_to': ''}
+                        window.save_item('update', added[i], changes, lambda queued: (window.on_item_updated(rid, changes, queued), done.append(1)))
+                    else:
+                        window.save_item('delete', added[i], {}, lambda queued: (window.on_item_deleted(rid, queued), done.append(1)))
+                wait_until(app, lambda: done)
+                if op == 'insert':
+                    added.append(doc_id)
+            return args.round_trips
+        return run
+    added = []
+    for op in ('insert', 'update', 'delete'):
+        bench.run(f"{op} round trip", round_trips(op), unit="ops")
+
+    window.close()
+    window.deleteLater()
+    app.processEvents()
+    return bench.results
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Time the inventory hot paths against a synthetic collection")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help="collection sizes to run (e.g. 10000 100000 1000000)")
+    parser.add_argument('--mongo', metavar='URI', help="use a real mongod instead of mongomock (the benchmark database is dropped and reseeded)")
+    parser.add_argument('--queries', nargs='+', default=['d', 'de', 'dell', 'dell lat', 'ahmed', 'dl0000', 'zzzz'],
+                        help="search box queries to time")
+    parser.add_argument('--round-trips', type=int, default=20, help="add/edit/delete operations per CRUD phase")
+    parser.add_argument('--seed', type=int, default=42, help="random seed for the generator")
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc, which slows allocation-heavy phases")
+    parser.add_argument('--json', metavar='FILE', help="also write the results as JSON")
+    args = parser.parse_args()
+
+    # Never touch the app's own database
+    main.MONGO_DB = 'inventory_benchmark'
+    spill_dir = tempfile.mkdtemp()
+    main.spill_queue.path = os.path.join(spill_dir, 'spill.db')
+    if args.mongo:
+        main.CONFIG['MONGO_URI'] = args.mongo
+        args.backend = 'mongod'
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("mongomock is not installed; pip install mongomock, or pass --mongo URI")
+        main.client = mongomock.MongoClient()
+        args.backend = 'mongomock'
+        # mongomock answers the server search filters with a Python scan rather than the
+        # words/serial_norm indexes, timings that say nothing about mongod, so keep searches
+        # on the in-memory path
+        main.SERVER_SEARCH_THRESHOLD = max(main.SERVER_SEARCH_THRESHOLD, max(args.rows) + args.round_trips)
+        # It has no change streams either, and live sync polls would scan the whole collection mid-run
+        main.CHANGE_STREAMS = False
+        main.SYNC_INTERVAL_S = 0
+    # Dialogs would block a headless run
+    QMessageBox.information = staticmethod(lambda *a, **k: QMessageBox.Ok)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    results = {}
+    for rows in args.rows:
+        results[rows] = bench_size(app, rows, args)
+    main.get_client().drop_database(main.MONGO_DB)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'backend': args.backend, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main_benchmark()
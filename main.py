@@ -1,44 +1,221 @@
 import sys
-from pymongo import MongoClient
+import argparse
+import asyncio
+import bisect
+import contextlib
+import csv
+import datetime
+import functools
+import getpass
+import gzip
+import hashlib
+import hmac
+import io
+import itertools
+import json
+import operator
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs, unquote
+from pymongo import MongoClient, UpdateOne, DeleteMany, ASCENDING, DESCENDING, ReturnDocument, monitoring
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, OperationFailure, PyMongoError
+import bson
+from bson import json_util
 from bson.objectid import ObjectId
-from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox, QTableWidget, QTableWidgetItem, QHBoxLayout, QDialog, QFormLayout, QFrame, QSpacerItem, QSizePolicy, QComboBox, QToolButton, QFileDialog)
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QIcon, QColor, QPixmap
+from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox, QTableView, QAbstractItemView, QStyledItemDelegate, QHBoxLayout, QDialog, QFormLayout, QFrame, QSpacerItem, QSizePolicy, QComboBox, QToolButton, QFileDialog, QProgressBar, QShortcut, QTableWidget, QTableWidgetItem, QHeaderView, QCheckBox, QTabWidget, QDateTimeEdit)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QDateTime, QModelIndex, QPointF, QTimer, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QIcon, QColor, QPixmap, QBrush, QFont, QKeySequence, QPainter, QPen, QPolygonF
 
 # --- MongoDB Connection ---
 import os
 from urllib.parse import quote_plus
 
-def read_mongo_uri():
+def read_config():
+    # KEY=value settings from config.txt next to this script
+    config = {}
     config_path = os.path.join(os.path.dirname(__file__), 'config.txt')
     if os.path.exists(config_path):
         with open(config_path, 'r') as f:
             for line in f:
-                if line.startswith('MONGO_URI='):
-                    return line.strip().split('=', 1)[1].strip()
+                line = line.strip()
+                if not line or line.startswith('#') or '=' not in line:
+                    continue
+                key, value = line.split('=', 1)
+                config[key.strip()] = value.strip()
+    return config
+
+CONFIG = read_config()
+
+def config_int(name, default):
+    try:
+        return int(CONFIG.get(name, default))
+    except ValueError:
+        return default
+
+def config_flag(name, default=False):
+    value = CONFIG.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+def read_mongo_uri():
     # Default fallback
-    return 'mongodb://localhost:27017/'
-
-try:
-    MONGO_URI = read_mongo_uri()
-    MONGO_DB = 'inventory_app'
-    
-    # Test the connection
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-    client.server_info()  # Test the connection
-    db = client[MONGO_DB]
-    print("✅ Successfully connected to MongoDB!")
-except Exception as e:
-    print(f"❌ Error connecting to MongoDB: {e}")
-    print("Falling back to local database...")
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['inventory_app']
+    return CONFIG.get('MONGO_URI', 'mongodb://localhost:27017/')
+
+MONGO_DB = 'inventory_app'
+# Connection pool and retry settings (see README)
+MONGO_MAX_POOL_SIZE = config_int('MONGO_MAX_POOL_SIZE', 20)
+MONGO_MIN_POOL_SIZE = config_int('MONGO_MIN_POOL_SIZE', 0)
+MONGO_TIMEOUT_MS = config_int('MONGO_TIMEOUT_MS', 5000)
+CONNECT_RETRIES = config_int('CONNECT_RETRIES', 0)
+CONNECT_BACKOFF_MS = config_int('CONNECT_BACKOFF_MS', 500)
+CONNECT_BACKOFF_MAX_MS = config_int('CONNECT_BACKOFF_MAX_MS', 30000)
+
+# --- Diagnostics ---
+# DIAGNOSTICS times every MongoDB command and the window's refresh paths. With it off,
+# profiled() leaves methods undecorated and timed() hands out one shared no-op context.
+DIAGNOSTICS = config_flag('DIAGNOSTICS')
+DIAGNOSTICS_LOG = CONFIG.get('DIAGNOSTICS_LOG') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'diagnostics.jsonl')
+DIAGNOSTICS_LOG_MAX_BYTES = config_int('DIAGNOSTICS_LOG_MAX_BYTES', 5 * 1024 * 1024)
+DIAGNOSTICS_INTERVAL_S = config_int('DIAGNOSTICS_INTERVAL_S', 60)
+# Percentiles are taken over the most recent samples of each operation
+DIAGNOSTICS_SAMPLES = 2000
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+class Diagnostics:
+    # Thread-safe: Mongo commands are recorded from pymongo's and the workers' threads
+    def __init__(self, samples=DIAGNOSTICS_SAMPLES):
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._counts = Counter()
+
+    def record(self, name, seconds, size=0):
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.samples)
+            durations.append((seconds, size))
+            self._counts[name] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._durations = {}
+            self._counts = Counter()
+
+    def summary(self):
+        # {operation: {count, p50_ms, p95_ms, p99_ms, max_ms, avg_bytes}}
+        with self._lock:
+            samples = {name: list(durations) for name, durations in self._durations.items()}
+            counts = dict(self._counts)
+        result = {}
+        for name in sorted(samples):
+            durations = sorted(seconds for seconds, _ in samples[name])
+            result[name] = {
+                'count': counts[name],
+                'p50_ms': round(percentile(durations, 50) * 1000, 3),
+                'p95_ms': round(percentile(durations, 95) * 1000, 3),
+                'p99_ms': round(percentile(durations, 99) * 1000, 3),
+                'max_ms': round(durations[-1] * 1000, 3),
+                'avg_bytes': round(sum(size for _, size in samples[name]) / len(durations)),
+            }
+        return result
+
+    def write_log(self, path=DIAGNOSTICS_LOG, max_bytes=DIAGNOSTICS_LOG_MAX_BYTES):
+        # Appends one summary line; the file rolls over to path.1 once it grows past max_bytes
+        summary = self.summary()
+        if not summary:
+            return
+        if os.path.exists(path) and os.path.getsize(path) > max_bytes:
+            os.replace(path, path + '.1')
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'time': datetime.datetime.now().isoformat(timespec='seconds'), 'operations': summary}) + '\n')
+
+class CommandTimer(monitoring.CommandListener):
+    # Records duration and request+reply size of every command as mongo.<command>.<collection>
+    def __init__(self, diagnostics):
+        self.diagnostics = diagnostics
+        self._started = {}
+
+    def started(self, event):
+        command = event.command
+        target = command.get('collection') if event.command_name == 'getMore' else command.get(event.command_name)
+        name = f"mongo.{event.command_name}" + (f".{target}" if isinstance(target, str) else '')
+        self._started[(event.connection_id, event.request_id)] = (name, len(bson.encode(command)) if command else 0)
+
+    def succeeded(self, event):
+        name, size = self._started.pop((event.connection_id, event.request_id), (f"mongo.{event.command_name}", 0))
+        self.diagnostics.record(name, event.duration_micros / 1e6, size + (len(bson.encode(event.reply)) if event.reply else 0))
+
+    def failed(self, event):
+        name, size = self._started.pop((event.connection_id, event.request_id), (f"mongo.{event.command_name}", 0))
+        self.diagnostics.record(name + '.failed', event.duration_micros / 1e6, size)
+
+diagnostics = Diagnostics() if DIAGNOSTICS else None
+_NO_TIMER = contextlib.nullcontext()
+
+def timed(name):
+    # with timed('ui.step'): ... is recorded only when diagnostics are on
+    return _NO_TIMER if diagnostics is None else diagnostics.timer(name)
+
+def profiled(name):
+    # Method decorator; returns the method untouched when diagnostics are off
+    def decorate(fn):
+        if diagnostics is None:
+            return fn
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                diagnostics.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+client = None
+
+def get_client():
+    # MongoClient connects lazily on its own monitor threads, so creating it never blocks
+    global client
+    if client is None:
+        client = MongoClient(read_mongo_uri(),
+                             maxPoolSize=MONGO_MAX_POOL_SIZE,
+                             minPoolSize=MONGO_MIN_POOL_SIZE,
+                             serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+                             connectTimeoutMS=MONGO_TIMEOUT_MS,
+                             retryWrites=True,
+                             retryReads=True,
+                             appname='it-inventory',
+                             event_listeners=[CommandTimer(diagnostics)] if diagnostics is not None else [])
+    return client
+
+def get_db():
+    return get_client()[MONGO_DB]
 
 # Helper to get collections
 def get_users_col():
-    return db['users']
+    return get_db()['users']
 def get_inventory_col():
-    return db['inventory']
+    return get_db()['inventory']
 
 # Database setup (ensure tables exist)
 def init_db():
@@ -49,23 +226,1500 @@ def init_db():
         {'username': 'aziz taifour', 'password': 'aziz'},
         {'username': 'mohcine elhaddad asoufi', 'password': 'mohcine'},
     ]
-    # Remove any user not in allowed_users
-    existing_usernames = set(u['username'] for u in users_col.find({}, {'username': 1}))
-    allowed_usernames = set(u['username'] for u in allowed_users)
-    for username in existing_usernames - allowed_usernames:
-        users_col.delete_many({'username': username})
-    # Add any missing allowed users
+    # Remove any user not in allowed_users and add any missing ones, in one round trip;
+    # existing passwords are left alone
+    ops = [DeleteMany({'username': {'$nin': [u['username'] for u in allowed_users]}})]
     for user in allowed_users:
-        if users_col.count_documents({'username': user['username']}) == 0:
-            users_col.insert_one(user)
+        ops.append(UpdateOne({'username': user['username']}, {'$setOnInsert': {'password': user['password']}}, upsert=True))
+    users_col.bulk_write(ops)
     # Inventory collection will be empty unless populated
+    ensure_indexes()
+    upgrade_documents(get_inventory_col())
+
+# Bumped whenever upgrade_documents gains a step; the version reached is stored in the
+# inventory_meta collection, so the steps (full scans at this size) run once per database
+# rather than on every start or reconnect
+SCHEMA_VERSION = 1
+SCHEMA_MARKER = 'schema'
+
+def meta_for(collection):
+    return collection.database[collection.name + '_meta']
+
+def upgrade_documents(collection):
+    marker = meta_for(collection).find_one({'_id': SCHEMA_MARKER}) or {}
+    if marker.get('version', 0) >= SCHEMA_VERSION:
+        return
+    # Documents written before live sync get stamped so delta pulls can see them...
+    collection.update_many({'updated_at': None}, {'$currentDate': {'updated_at': True}, '$inc': {'version': 1}})
+    # ...and the ones from before the duplicate check and indexed search get their search keys
+    stamp_search_keys(collection)
+    meta_for(collection).update_one({'_id': SCHEMA_MARKER}, {'$set': {'version': SCHEMA_VERSION}, '$currentDate': {'upgraded_at': True}}, upsert=True)
+
+def stamp_search_keys(collection):
+    ops = []
+    for doc in collection.find({'$or': [{'serial_norm': None}, {'words': None}]}, INVENTORY_PROJECTION):
+        keys = with_search_keys({field: doc.get(field, '') for field, _ in INVENTORY_COLUMNS})
+        ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {key: value for key, value in keys.items() if key == 'serial_norm' or key.startswith('words.')}}))
+        if len(ops) >= IMPORT_BATCH_SIZE:
+            collection.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+
+# --- Indexes ---
+def create_index(collection, keys, **options):
+    # create_index is a no-op when the same index already exists, so this is safe on every start
+    try:
+        collection.create_index(keys, **options)
+    except OperationFailure as e:
+        if not options.get('unique'):
+            print(f"⚠️ Could not create index {options.get('name', keys)} on {collection.name}: {e}")
+            return
+        # Existing duplicates block a unique index; fall back to a plain one so lookups stay indexed
+        print(f"⚠️ Could not create unique index {options.get('name', keys)} on {collection.name}: {e}")
+        options = dict(options, unique=False, name=options.get('name', '') + '_nonunique')
+        create_index(collection, keys, **options)
+
+def ensure_indexes():
+    inventory_col = get_inventory_col()
+    create_index(inventory_col, [('serial_number', ASCENDING)], unique=True, name='serial_number_unique')
+    create_index(inventory_col, [('status', ASCENDING)], name='status')
+    create_index(inventory_col, [('location', ASCENDING)], name='location')
+    create_index(inventory_col, [('updated_at', ASCENDING)], name='updated_at')
+    create_index(inventory_col, [('serial_norm', ASCENDING)], name='serial_norm')
+    for field in SEARCH_WORD_FIELDS:
+        create_index(inventory_col, [(f'words.{field}', ASCENDING)], name=f'words_{field}')
+    if 'device_assigned_text' in inventory_col.index_information():
+        # The text index the word indexes replaced
+        inventory_col.drop_index('device_assigned_text')
+    create_index(tombstones_for(inventory_col), [('deleted_at', ASCENDING)], name='deleted_at_ttl',
+                 expireAfterSeconds=TOMBSTONE_TTL_DAYS * 24 * 3600)
+    create_index(audit_for(inventory_col), [('asset', ASCENDING), ('at', ASCENDING)], name='asset_at')
+    if AUDIT_RETENTION_DAYS > 0:
+        create_index(audit_for(inventory_col), [('at', ASCENDING)], name='at_ttl', expireAfterSeconds=AUDIT_RETENTION_DAYS * 24 * 3600)
+    create_index(get_users_col(), [('username', ASCENDING)], unique=True, name='username_unique')
+
+def plan_stages(plan):
+    # Every stage name in an explain() plan tree, whatever the server version's nesting
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+def uses_collection_scan(collection, query_filter):
+    explain = collection.find(query_filter).explain()
+    return 'COLLSCAN' in set(plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {})))
+
+def check_query_plans():
+    # Explains the queries the app sends and reports any that fall back to a collection scan
+    checks = [(get_users_col(), {'username': 'admin', 'password': 'admin'})]
+    for query in ['dell', 'sn123', 'available', 'storage', 'lenovo thinkpad', 'dell lat']:
+        checks.append((get_inventory_col(), build_indexed_search_filter(query)))
+    for query in ['status:available location:storage', 'serial:SN12* OR status:retired', 'dell -status:retired',
+                  'name:latitude', 'user:sara', 'user:""', 'location:spa', 'serial:1234', 'status:avail',
+                  'dell lat status:available', 'dell OR lenovo', '-status:retired', '-dell', '-location:storage -user:""']:
+        checks.append((get_inventory_col(), parse_query(query).to_filter()))
+    # Live sync polls
+    since = datetime.datetime(2000, 1, 1)
+    checks.append((get_inventory_col(), {'updated_at': {'$gte': since}}))
+    checks.append((tombstones_for(get_inventory_col()), {'deleted_at': {'$gte': since}}))
+    # Duplicate check while typing a serial
+    checks.append((get_inventory_col(), {'serial_norm': {'$in': list(serial_variants('SN1234567'))}}))
+    # History of one item
+    checks.append((audit_for(get_inventory_col()), {'asset': ObjectId(), 'at': {'$lte': since}}))
+    failures = 0
+    for collection, query_filter in checks:
+        scan = uses_collection_scan(collection, query_filter)
+        failures += scan
+        print(f"{'COLLSCAN' if scan else 'ok':8} {collection.name}: {query_filter}")
+    return failures
+
+# --- Background database work ---
+class WorkerSignals(QObject):
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(object)
+    finished = pyqtSignal()
+
+class DbWorker(QRunnable):
+    # Runs fn(worker, *args) on the thread pool and reports back through signals,
+    # which Qt delivers on the GUI thread
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = WorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def report(self, value):
+        self.signals.progress.emit(value)
+
+    def run(self):
+        try:
+            result = self.fn(self, *self.args)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+        else:
+            if not self.is_cancelled():
+                self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+# Workers stay referenced until they finish so their signals are not collected
+_active_workers = set()
+
+def start_worker(worker, on_result=None, on_error=None, on_progress=None, on_finished=None, pool=None):
+    # Long-running workers get a pool of their own so they never hold up the shared one
+    if on_result is not None:
+        worker.signals.result.connect(on_result)
+    if on_error is not None:
+        worker.signals.error.connect(on_error)
+    if on_progress is not None:
+        worker.signals.progress.connect(on_progress)
+    if on_finished is not None:
+        worker.signals.finished.connect(on_finished)
+    _active_workers.add(worker)
+    worker.signals.finished.connect(lambda: _active_workers.discard(worker))
+    (pool or QThreadPool.globalInstance()).start(worker)
+    return worker
+
+def run_in_background(fn, *args, on_result=None, on_error=None, on_progress=None, on_finished=None):
+    return start_worker(DbWorker(fn, *args), on_result, on_error, on_progress, on_finished)
+
+def cancel_all_workers():
+    for worker in list(_active_workers):
+        worker.cancel()
+
+class ConnectionManager(QObject):
+    # Pings the server in the background, retrying with exponential backoff, and runs the
+    # database setup once it answers. state is 'connecting', 'connected' or 'offline'.
+    state_changed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.state = 'connecting'
+        self.worker = None
+        self._wake = threading.Event()
+
+    def is_connected(self):
+        return self.state == 'connected'
+
+    def start(self):
+        if self.worker is None:
+            self._set_state('connecting', "Connecting to database...")
+            self.worker = run_in_background(self._connect, on_progress=self._on_retry, on_result=self._on_connected,
+                                            on_error=self._on_failed, on_finished=self._on_finished)
+
+    def retry_now(self):
+        # Cuts the current backoff short, or starts over after retries ran out
+        if self.worker is None:
+            self.start()
+        else:
+            self._wake.set()
+
+    def _connect(self, worker):
+        delay = CONNECT_BACKOFF_MS / 1000
+        attempt = 0
+        while not worker.is_cancelled():
+            attempt += 1
+            try:
+                get_client().admin.command('ping')
+                init_db()
+                populate_sample_inventory()
+                ensure_rollups(get_inventory_col())
+                return attempt
+            except PyMongoError as e:
+                if CONNECT_RETRIES and attempt > CONNECT_RETRIES:
+                    raise
+                worker.report((attempt, delay, str(e)))
+            self._wake.clear()
+            deadline = time.monotonic() + delay
+            while time.monotonic() < deadline and not worker.is_cancelled():
+                if self._wake.wait(0.25):
+                    break
+            delay = min(delay * 2, CONNECT_BACKOFF_MAX_MS / 1000)
+
+    def _on_retry(self, progress):
+        attempt, delay, error = progress
+        print(f"❌ Error connecting to MongoDB (attempt {attempt}): {error}")
+        self._set_state('offline', f"Database unreachable, retrying in {delay:.0f}s...")
+
+    def _on_connected(self, attempts):
+        print("✅ Successfully connected to MongoDB!")
+        self._set_state('connected', "Connected")
+
+    def _on_failed(self, message):
+        print(f"❌ Error connecting to MongoDB: {message}")
+        self._set_state('offline', "Database unreachable.")
+
+    def _on_finished(self):
+        self.worker = None
+
+    def _set_state(self, state, message):
+        self.state = state
+        self.state_changed.emit(state, message)
+
+class InventoryLoader(DbWorker):
+    # Streams the inventory cursor in batches of (docs, loaded, total, done). In lazy
+    # mode it waits after each batch until the view asks for more. newest is the latest
+    # updated_at read, where live sync picks up afterwards.
+    def __init__(self, collection, query, batch_size, lazy):
+        super().__init__(self._load)
+        self.collection = collection
+        self.query = query
+        self.batch_size = batch_size
+        self._load_all = not lazy
+        self._more = threading.Event()
+        self.newest = None
+
+    def request_more(self):
+        self._more.set()
+
+    def request_all(self):
+        self._load_all = True
+        self._more.set()
+
+    def make_lazy(self):
+        self._load_all = False
+
+    def cancel(self):
+        super().cancel()
+        self._more.set()
+
+    def _open(self):
+        # (total or None, document iterator, cleanup callable)
+        if self.query and EXPLAIN_QUERIES and uses_collection_scan(self.collection, self.query):
+            print(f"⚠️ Query falls back to a collection scan: {self.query}")
+        total = self.collection.estimated_document_count() if not self.query else None
+        # Read first, so a lazy load that stops after one page still knows where live sync starts
+        latest = self.collection.find_one({}, {'updated_at': 1}, sort=[('updated_at', -1)])
+        self.newest = latest and latest.get('updated_at')
+        cursor = self.collection.find(self.query, dict(INVENTORY_PROJECTION, updated_at=1), batch_size=self.batch_size)
+        return total, cursor, cursor.close
+
+    def _load(self, worker):
+        total, docs, close = self._open()
+        loaded = 0
+        try:
+            while not self.is_cancelled():
+                batch = list(itertools.islice(docs, self.batch_size))
+                self.newest = newest_stamp(batch, 'updated_at', self.newest)
+                loaded += len(batch)
+                done = len(batch) < self.batch_size
+                self._more.clear()
+                self.report((batch, loaded, total, done))
+                if done:
+                    break
+                while not self._load_all and not self._more.wait(0.5):
+                    if self.is_cancelled():
+                        break
+        finally:
+            close()
+        return loaded
+
+# --- Inventory table model/view ---
+# (field, header) for every column shown in the inventory table
+INVENTORY_COLUMNS = [
+    ("device_name", "Device Name"),
+    ("serial_number", "Serial Number"),
+    ("location", "Location"),
+    ("status", "Status"),
+    ("assigned_to", "Assigned To"),
+]
+STATUS_COLUMN = 3
+# Choices offered by InventoryDialog; "Other" lets the user type a custom location
+LOCATION_OPTIONS = [
+    "IT Office", "Reception", "Server Room", "CEO Office", "Lobby", "HR", "Finance", "Storage", "Meeting Room",
+    "crudo", "s-lounge", "social kitchen", "parisa"
+]
+STATUS_OPTIONS = ["In Use", "Available", "Retired"]
+# Only the displayed columns are fetched from the inventory collection
+# version is read for optimistic concurrency but never shown
+INVENTORY_PROJECTION = dict({field: 1 for field, _ in INVENTORY_COLUMNS}, version=1)
+# LAZY_LOAD pages rows in from the cursor as the table scrolls
+LAZY_LOAD = config_flag('LAZY_LOAD')
+LOAD_BATCH_SIZE = max(1, config_int('LOAD_BATCH_SIZE', 500))
+# Above this many documents, searches run as indexed queries on the server
+SERVER_SEARCH_THRESHOLD = config_int('SERVER_SEARCH_THRESHOLD', 200000)
+# EXPLAIN_QUERIES warns when a server-side search would scan the whole collection
+EXPLAIN_QUERIES = config_flag('EXPLAIN_QUERIES')
+STATUS_COLORS = {'in use': '#4F8FF9', 'available': '#44b37f', 'retired': '#e06f6c'}
+
+SEARCH_DEBOUNCE_MS = 150
+# After a slow in-memory search, typing waits for a pause of twice its time (up to this)
+SEARCH_DEBOUNCE_MAX_MS = 1000
+# Completed changes that can be undone, newest last
+UNDO_LIMIT = 20
+
+def status_key(doc):
+    return str(doc.get('status', '')).strip().lower()
+
+def search_text(doc):
+    return ' '.join(str(doc.get(field, '')).lower() for field, _ in INVENTORY_COLUMNS)
+
+_NO_ROWS = frozenset()
+
+class SearchIndex:
+    # Trigram inverted index over the lowercased row text, keyed by model row id.
+    # Posting lists are 4-byte arrays; removing or editing a row leaves stale entries
+    # that the text check filters out, and the lists are rebuilt once enough pile up.
+    def __init__(self):
+        self.clear()
+
+    @staticmethod
+    def _grams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def clear(self):
+        self._texts = []
+        self._postings = {}
+        self._live = 0
+        self._stale = 0
+        self._last_query = None
+        self._last_result = None
+
+    def _post(self, rid, grams):
+        postings = self._postings
+        for gram in grams:
+            rids = postings.get(gram)
+            if rids is None:
+                rids = postings[gram] = array('I')
+            rids.append(rid)
+        self._last_query = None
+
+    def add(self, rid, text):
+        texts = self._texts
+        if rid >= len(texts):
+            texts.extend([None] * (rid + 1 - len(texts)))
+        texts[rid] = text
+        self._live += 1
+        self._post(rid, self._grams(text))
+
+    def remove(self, rid):
+        if rid >= len(self._texts) or self._texts[rid] is None:
+            return
+        self._texts[rid] = None
+        self._live -= 1
+        self._stale += 1
+        self._last_query = None
+        self._compact()
+
+    def text(self, rid):
+        return self._texts[rid]
+
+    def update(self, rid, text):
+        old = self._texts[rid]
+        if old == text:
+            return
+        self._texts[rid] = text
+        self._post(rid, self._grams(text) - self._grams(old))
+        self._stale += 1
+        self._compact()
+
+    def _compact(self):
+        if self._stale > 1024 and self._stale * 4 > self._live:
+            self._postings = {}
+            for rid, text in enumerate(self._texts):
+                if text is not None:
+                    self._post(rid, self._grams(text))
+            self._stale = 0
+
+    def search(self, query):
+        # Returns the set of matching row ids, or None when there is no query
+        if not query:
+            return None
+        texts = self._texts
+        candidates = None
+        # A query that extends the previous one can only narrow its result set
+        if self._last_query is not None and self._last_query in query:
+            candidates = self._last_result
+        grams = self._grams(query)
+        if grams:
+            # Checking a row's text costs about as much as one set operation on its id, so the
+            # smallest posting list is checked directly instead of intersected with the others
+            smallest = min((self._postings.get(gram, _NO_ROWS) for gram in grams), key=len)
+            if candidates is None or len(smallest) < len(candidates):
+                candidates = smallest
+        if candidates is None:
+            result = {rid for rid, text in enumerate(texts) if text is not None and query in text}
+        elif len(query) == 3 and candidates is smallest and not self._stale:
+            # A single trigram's posting list with no stale entries is already the answer
+            result = set(candidates)
+        else:
+            result = {rid for rid in candidates if query in (texts[rid] or '')}
+        self._last_query = query
+        self._last_result = result
+        return result
+
+# Columns with a handful of distinct values are stored as integer codes
+CATEGORY_FIELDS = ('status', 'location')
+# Repetitive free-text columns share one string object per distinct value
+INTERNED_FIELDS = ('device_name', 'assigned_to')
+# Category code left behind by a removed row
+_REMOVED = 0xFFFFFFFF
+
+def serial_key(value):
+    # Scanners and people disagree on case and stray whitespace
+    return str(value).strip().upper()
+
+# --- Duplicate detection ---
+# Serials are compared by a normalized key that drops case, separators and the letters
+# people mistake for digits, so SN-1234567, sn 1234567 and SNI234567 share one. Near
+# duplicates are keys one typo apart (a dropped or extra character, or two neighbours
+# swapped): those variants are generated and looked up in an exact-key index, a few
+# hundred lookups per serial instead of a comparison with every other one. A character
+# differing in place is not a typo worth flagging, as sequential serials differ that way.
+SERIAL_FOLD = str.maketrans('OI', '01')
+SERIAL_ALPHABET = '0123456789ABCDEFGHJKLMNPQRSTUVWXYZ'
+SAME_SERIAL = "Same serial"
+# Free-text fields whose words are indexed for server searches
+SEARCH_WORD_FIELDS = ('device_name', 'assigned_to', 'location')
+# Near-duplicate serials only count when the device names also look alike
+DUPLICATE_NAME_SIMILARITY = 0.4
+
+def normalize_serial(value):
+    return re.sub(r'[^0-9A-Z]', '', str(value).upper()).translate(SERIAL_FOLD)
+
+def search_words(value):
+    # Lowercased words; [''] keeps empty values findable through the index too
+    return re.findall(r'\w+', str(value).lower()) or ['']
+
+def with_search_keys(fields):
+    # The normalized serial and the words of each text field are stored alongside, so the
+    # server can answer lookups and searches from indexes
+    keys = {f'words.{field}': search_words(fields[field]) for field in SEARCH_WORD_FIELDS if field in fields}
+    if 'serial_number' in fields:
+        keys['serial_norm'] = normalize_serial(fields['serial_number'])
+    return dict(fields, **keys) if keys else fields
+
+def serial_variants(key, insertions=True):
+    # {variant: reason} for the keys one typo away. The batch report leaves out insertions:
+    # the longer key of a pair finds the shorter one by deletion.
+    variants = {}
+    if insertions:
+        for i in range(len(key) + 1):
+            for char in SERIAL_ALPHABET:
+                variants[key[:i] + char + key[i:]] = "One character missing"
+    for i in range(len(key)):
+        variants[key[:i] + key[i + 1:]] = "One character extra"
+    for i in range(len(key) - 1):
+        variants[key[:i] + key[i + 1] + key[i] + key[i + 2:]] = "Characters swapped"
+    variants.pop(key, None)
+    variants.pop('', None)
+    return variants
+
+def name_grams(value):
+    text = ' '.join(re.findall(r'[a-z0-9]+', str(value).lower()))
+    return {text[i:i + 3] for i in range(len(text) - 2)} or {text}
+
+def name_similarity(a, b):
+    # Jaccard similarity of character trigrams; spelling slips keep most of them
+    a, b = name_grams(a), name_grams(b)
+    return len(a & b) / len(a | b)
+
+def likely_duplicate(reason, name, other_name):
+    return reason == SAME_SERIAL or not name or name_similarity(name, other_name) >= DUPLICATE_NAME_SIMILARITY
+
+def find_similar_serials(worker, collection, serial):
+    # Server-side live check: one indexed $in over the key and its variants
+    key = normalize_serial(serial)
+    if not key:
+        return []
+    reasons = dict(serial_variants(key), **{key: SAME_SERIAL})
+    docs = collection.find({'serial_norm': {'$in': list(reasons)}}, dict(INVENTORY_PROJECTION, serial_norm=1)).limit(50)
+    return [(doc, reasons[doc.pop('serial_norm')]) for doc in docs]
+
+def find_duplicates(worker, collection):
+    # Batch report: one pass over the serials builds the key index, then each key looks up
+    # its variants, so the work grows with the number of items rather than of pairs
+    total = collection.estimated_document_count()
+    index = {}
+    read = 0
+    cursor = collection.find({}, {'serial_number': 1}, batch_size=EXPORT_BATCH_SIZE)
+    try:
+        for doc in cursor:
+            key = normalize_serial(doc.get('serial_number', ''))
+            if key:
+                index.setdefault(key, []).append(doc['_id'])
+            read += 1
+            if read % 50000 == 0:
+                if worker.is_cancelled():
+                    return None
+                worker.report((read, total))
+    finally:
+        cursor.close()
+    pairs = {}
+    keys = index.keys()
+    for key, ids in index.items():
+        for other in ids[1:]:
+            pairs[(ids[0], other)] = SAME_SERIAL
+        # Most keys have no neighbour, so the reasons are only worked out for the few hits
+        near = {key[:i] + key[i + 1:] for i in range(len(key))}
+        near.update([key[:i] + key[i + 1] + key[i] + key[i + 2:] for i in range(len(key) - 1)])
+        near.discard(key)
+        hits = keys & near
+        if hits:
+            reasons = serial_variants(key, insertions=False)
+            for variant in hits:
+                others = index[variant]
+                # A swap is found from both ends
+                if (others[0], ids[0]) not in pairs:
+                    pairs[(ids[0], others[0])] = reasons[variant]
+    docs = {}
+    wanted = list({doc_id for pair in pairs for doc_id in pair})
+    for start in range(0, len(wanted), EXPORT_BATCH_SIZE):
+        for doc in collection.find({'_id': {'$in': wanted[start:start + EXPORT_BATCH_SIZE]}}, INVENTORY_PROJECTION):
+            docs[doc['_id']] = doc
+    found = []
+    for (a, b), reason in pairs.items():
+        if a in docs and b in docs and likely_duplicate(reason, docs[a].get('device_name', ''), docs[b].get('device_name', '')):
+            found.append({'reason': reason, 'a': docs[a], 'b': docs[b]})
+    found.sort(key=lambda pair: (pair['reason'] != SAME_SERIAL, normalize_serial(pair['a'].get('serial_number', ''))))
+    return {'read': read, 'pairs': found}
+
+class InventoryStore:
+    # Column-per-field storage for the loaded rows. A row id is a position in every
+    # column and stays valid until the store is replaced; removed rows leave a hole.
+    def __init__(self):
+        self.ids = []
+        self.alive = bytearray()
+        # Document version for optimistic concurrency; 0 when the document has none yet
+        self.versions = array('I')
+        self.columns = {}
+        self.values = {}
+        self.codes = {}
+        self.interned = {}
+        for field, _ in INVENTORY_COLUMNS:
+            if field in CATEGORY_FIELDS:
+                self.columns[field] = array('I')
+                self.values[field] = []
+                self.codes[field] = {}
+            else:
+                self.columns[field] = []
+                if field in INTERNED_FIELDS:
+                    self.interned[field] = {}
+        self.by_id = {}
+        self.live = 0
+        # Per-value posting lists for the low-cardinality columns, built on first use
+        self.postings_fields = CATEGORY_FIELDS + INTERNED_FIELDS
+        self.postings = {}
+        self.stale = Counter()
+        # serial_number -> row id, built on the first scan lookup
+        self.serials = None
+        # normalized serial -> row ids, built on the first duplicate check
+        self.serial_norms = None
+
+    def __len__(self):
+        return self.live
+
+    def __contains__(self, rid):
+        return 0 <= rid < len(self.alive) and self.alive[rid]
+
+    @staticmethod
+    def _key(doc_id):
+        # ObjectIds are kept as their 12 raw bytes
+        return doc_id.binary if isinstance(doc_id, ObjectId) else doc_id
+
+    @staticmethod
+    def _doc_id(key):
+        return ObjectId(key) if isinstance(key, bytes) and len(key) == 12 else key
+
+    def _encode(self, field, value):
+        codes = self.codes.get(field)
+        if codes is not None:
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.values[field])
+                self.values[field].append(value)
+            return code
+        interned = self.interned.get(field)
+        return value if interned is None else interned.setdefault(value, value)
+
+    def append(self, doc):
+        rid = len(self.ids)
+        key = self._key(doc.get('_id'))
+        self.ids.append(key)
+        self.alive.append(1)
+        self.versions.append(doc.get('version') or 0)
+        for field, column in self.columns.items():
+            column.append(self._encode(field, doc.get(field, '')))
+        if key is not None:
+            self.by_id[key] = rid
+        self._map_serial(rid)
+        self.live += 1
+        for field in self.postings:
+            self._post(field, rid)
+        return rid
+
+    def update(self, rid, changes):
+        if 'version' in changes:
+            self.versions[rid] = changes['version'] or 0
+        if 'serial_number' in changes:
+            self._unmap_serial(rid)
+        for field, value in changes.items():
+            column = self.columns.get(field)
+            if column is not None:
+                column[rid] = self._encode(field, value)
+                if field in self.postings:
+                    # The old entry stays behind until the next rebuild
+                    self.stale[field] += 1
+                    self._post(field, rid)
+        if 'serial_number' in changes:
+            self._map_serial(rid)
+
+    def remove(self, rid):
+        key = self.ids[rid]
+        if self.by_id.get(key) == rid:
+            del self.by_id[key]
+        self._unmap_serial(rid)
+        self.ids[rid] = None
+        self.alive[rid] = 0
+        for field in self.codes:
+            self.columns[field][rid] = _REMOVED
+        for field in self.postings:
+            self.stale[field] += 1
+        self.live -= 1
+
+    def _post(self, field, rid):
+        postings = self.postings[field]
+        key = self.columns[field][rid]
+        rids = postings.get(key)
+        if rids is None:
+            rids = postings[key] = array('I')
+        rids.append(rid)
+
+    def value_rids(self, field, predicate):
+        # Row ids whose value satisfies predicate; it runs once per distinct value, not per row
+        if field not in self.postings or self.stale[field] * 4 > max(self.live, 4096):
+            self.postings[field] = {}
+            self.stale[field] = 0
+            for rid in self.rids():
+                self._post(field, rid)
+        column = self.columns[field]
+        values = self.values.get(field)
+        alive = self.alive
+        result = set()
+        for key, rids in self.postings[field].items():
+            if not predicate(key if values is None else values[key]):
+                continue
+            if self.stale[field]:
+                result.update(rid for rid in rids if alive[rid] and column[rid] == key)
+            else:
+                result.update(rids)
+        return result
+
+    def get(self, rid, field):
+        value = self.columns[field][rid]
+        values = self.values.get(field)
+        return value if values is None else values[value]
+
+    def document(self, rid):
+        doc = {field: self.get(rid, field) for field in self.columns}
+        doc['_id'] = self._doc_id(self.ids[rid])
+        doc['version'] = self.versions[rid] or None
+        return doc
+
+    def rid_for_id(self, doc_id):
+        return self.by_id.get(self._key(doc_id))
+
+    def rid_for_serial(self, serial):
+        if self.serials is None:
+            column = self.columns['serial_number']
+            self.serials = {serial_key(column[rid]): rid for rid in self.rids()}
+        return self.serials.get(serial_key(serial))
+
+    def similar_rids(self, serial):
+        # [(rid, reason)] for rows with the same serial or one a typo away
+        if self.serial_norms is None:
+            column = self.columns['serial_number']
+            self.serial_norms = {}
+            for rid in self.rids():
+                self.serial_norms.setdefault(normalize_serial(column[rid]), []).append(rid)
+        key = normalize_serial(serial)
+        if not key:
+            return []
+        reasons = dict(serial_variants(key), **{key: SAME_SERIAL})
+        return [(rid, reason) for variant, reason in reasons.items() for rid in self.serial_norms.get(variant, ())]
+
+    def _map_serial(self, rid):
+        serial = self.columns['serial_number'][rid]
+        if self.serials is not None:
+            self.serials[serial_key(serial)] = rid
+        if self.serial_norms is not None:
+            self.serial_norms.setdefault(normalize_serial(serial), []).append(rid)
+
+    def _unmap_serial(self, rid):
+        serial = self.columns['serial_number'][rid]
+        if self.serials is not None and self.serials.get(serial_key(serial)) == rid:
+            del self.serials[serial_key(serial)]
+        if self.serial_norms is not None:
+            rids = self.serial_norms.get(normalize_serial(serial), [])
+            if rid in rids:
+                rids.remove(rid)
+
+    def rids(self):
+        # Live row ids in insertion order
+        if self.live == len(self.alive):
+            return list(range(self.live))
+        return list(itertools.compress(range(len(self.alive)), self.alive))
+
+    def value_counts(self, field):
+        counts = Counter(self.columns[field])
+        counts.pop(_REMOVED, None)
+        values = self.values[field]
+        return {values[code]: count for code, count in counts.items()}
+
+    def sort_key(self, field):
+        # Case-insensitive display order; categories compare by the rank of their value
+        column = self.columns[field]
+        values = self.values.get(field)
+        if values is None:
+            return lambda rid: str(column[rid]).lower()
+        lowered = [str(value).lower() for value in values]
+        ranks = {value: rank for rank, value in enumerate(sorted(set(lowered)))}
+        rank = [ranks[value] for value in lowered]
+        return lambda rid: rank[column[rid]]
+
+# --- Search query language ---
+# status:available location:"server room" -assigned:"" dell OR serial:SN12*
+# Terms in a clause must all match, OR/| separates clauses, -term negates, value* is a
+# prefix and "value" is exact. Text without any of these stays a plain substring search.
+QUERY_FIELDS = {
+    'device': 'device_name', 'name': 'device_name', 'device_name': 'device_name',
+    'serial': 'serial_number', 'sn': 'serial_number', 'serial_number': 'serial_number',
+    'location': 'location', 'loc': 'location',
+    'status': 'status',
+    'assigned': 'assigned_to', 'assignee': 'assigned_to', 'user': 'assigned_to', 'assigned_to': 'assigned_to',
+}
+QUERY_TOKEN = re.compile(r'(-?)(?:([A-Za-z_]+):)?("[^"]*"?|\S+)')
+QueryTerm = namedtuple('QueryTerm', 'field text value mode negate')
+MATCHERS = {
+    'equals': operator.eq,
+    'prefix': str.startswith,
+    'contains': lambda value, part: part in value,
+}
+
+def parse_query(text):
+    # Returns an InventoryQuery, or None for a plain substring search
+    clauses = [[]]
+    structured = False
+    for negate, field, value in QUERY_TOKEN.findall(text):
+        if value in ('OR', '|') and not negate and not field:
+            clauses.append([])
+            structured = True
+            continue
+        if field and field.lower() not in QUERY_FIELDS:
+            value = f"{field}:{value}"
+            field = ''
+        if negate and not value:
+            value, negate = '-', ''
+        quoted = value.startswith('"')
+        starred = not quoted and value.endswith('*')
+        if quoted:
+            value = value.strip('"')
+            mode = 'equals'
+        elif starred:
+            value = value.rstrip('*')
+            mode = 'prefix'
+        else:
+            mode = 'equals' if field and QUERY_FIELDS[field.lower()] in CATEGORY_FIELDS else 'contains'
+        field = QUERY_FIELDS[field.lower()] if field else None
+        if field is None:
+            # Bare words always match anywhere in the row
+            mode = 'contains'
+            if not value:
+                continue
+        structured = structured or bool(field or negate or quoted or starred)
+        clauses[-1].append(QueryTerm(field, value, value.lower(), mode, bool(negate)))
+    clauses = [clause for clause in clauses if clause]
+    return InventoryQuery(clauses) if structured and clauses else None
+
+class InventoryQuery:
+    # A parsed query, evaluated in memory over the model's indexes or compiled to a Mongo filter
+    def __init__(self, clauses):
+        self.clauses = clauses
+
+    def __eq__(self, other):
+        return isinstance(other, InventoryQuery) and self.clauses == other.clauses
+
+    # --- In memory: set operations over posting lists, never a per-row string join ---
+    def search(self, model):
+        result = set()
+        for clause in self.clauses:
+            # Positive terms first so negations subtract from the smallest set
+            rids = None
+            for term in sorted(clause, key=lambda term: term.negate):
+                if rids is not None and len(rids) < 4096:
+                    # Few rows left: checking them is cheaper than building the term's set
+                    rids = {rid for rid in rids if self._term_matches(model, term, rid) != term.negate}
+                elif term.negate:
+                    rids = (set(model.store.rids()) if rids is None else rids) - self._term_rids(model, term)
+                else:
+                    term_rids = self._term_rids(model, term)
+                    rids = set(term_rids) if rids is None else rids & term_rids
+                if not rids:
+                    break
+            result |= rids
+        return result
+
+    def matches(self, model, rid):
+        return any(all(self._term_matches(model, term, rid) != term.negate for term in clause) for clause in self.clauses)
+
+    def _term_rids(self, model, term):
+        if term.field is None:
+            return model.search_index.search(term.value)
+        store = model.store
+        match = MATCHERS[term.mode]
+        if term.field in store.postings_fields:
+            return store.value_rids(term.field, lambda value: match(str(value).lower(), term.value))
+        # Serial numbers are unique, so the trigram index narrows the scan instead
+        column = store.columns[term.field]
+        candidates = model.search_index.search(term.value) if len(term.value) >= 3 else store.rids()
+        return {rid for rid in candidates if match(str(column[rid]).lower(), term.value)}
+
+    def _term_matches(self, model, term, rid):
+        if term.field is None:
+            return term.value in model.search_index.text(rid)
+        return MATCHERS[term.mode](str(model.store.get(rid, term.field)).lower(), term.value)
+
+    # --- On the server ---
+    # Each clause is driven by one term the indexes can answer (a word prefix, the serial,
+    # or status/location equality) and every term's exact match is checked only on the rows
+    # that one narrows to. Free text therefore matches from the start of a word on the
+    # server: "lat" finds Latitude, "titude" does not. indexed=False keeps plain substring
+    # matching, for exports of what the in-memory search shows.
+    def to_filter(self, indexed=True):
+        filters = []
+        for clause in self.clauses:
+            parts = [self._negated_filter(term) if term.negate else self._term_filter(term) for term in clause]
+            if indexed:
+                drivers = sorted((driver for driver in map(self._term_driver, clause) if driver), key=lambda driver: driver[0])
+                if drivers:
+                    if drivers[0][1] not in parts:
+                        parts.insert(0, drivers[0][1])
+                elif not any(term.negate and self._is_indexed(self._term_filter(term)) for term in clause):
+                    # Nothing to narrow by (only negations): a complement matches most of the
+                    # inventory, so it is read in _id order and the lazy load stops after a page
+                    parts.insert(0, {'_id': {'$gte': ObjectId('0' * 24)}})
+            filters.append(parts[0] if len(parts) == 1 else {'$and': parts})
+        return filters[0] if len(filters) == 1 else {'$or': filters}
+
+    @staticmethod
+    def _is_indexed(part):
+        # Equality on one of the indexed fields, as _term_filter builds it
+        if len(part) != 1:
+            return False
+        (field, value), = part.items()
+        return field in ('serial_number', 'status', 'location') and (isinstance(value, str) or
+                                                                   isinstance(value, dict) and all(isinstance(item, str) for item in value.get('$in', [None])))
+
+    def _term_filter(self, term):
+        text = term.text
+        if term.field is None:
+            return build_search_filter(term.value)
+        escaped = re.escape(text)
+        if term.field == 'serial_number' and term.mode != 'contains':
+            # Case-sensitive forms stay on the serial_number index
+            if term.mode == 'prefix':
+                return {'serial_number': {'$in': [re.compile('^' + re.escape(prefix)) for prefix in {text, text.upper()}]}}
+            return {'serial_number': {'$in': sorted({text, text.upper()})}}
+        if term.mode == 'equals' and term.field == 'status' and normalize_status(text):
+            return {'status': normalize_status(text)}
+        if term.mode == 'equals' and term.field == 'location' and normalize_location(text) in LOCATION_OPTIONS:
+            return {'location': normalize_location(text)}
+        pattern = {'equals': f'^{escaped}$', 'prefix': f'^{escaped}', 'contains': escaped}[term.mode]
+        return {term.field: {'$regex': pattern, '$options': 'i'}}
+
+    def _negated_filter(self, term):
+        # Negated equality stays on the field's index as a complement of its bounds
+        part = self._term_filter(term)
+        if self._is_indexed(part):
+            (field, value), = part.items()
+            return {field: {'$nin': value['$in']} if isinstance(value, dict) else {'$ne': value}}
+        return {'$nor': [part]}
+
+    def _term_driver(self, term):
+        # (rank, index-backed filter matching at least the rows the term matches), or None
+        if term.negate:
+            return None
+        part = self._term_filter(term)
+        if term.field == 'serial_number':
+            if term.mode != 'contains':
+                return 0, part
+            norm = normalize_serial(term.text)
+            return (0, {'serial_norm': re.compile('^' + re.escape(norm))}) if norm else None
+        if self._is_indexed(part):
+            return (3 if term.field == 'status' else 2), part
+        if term.field == 'status':
+            return 3, {'status': {'$in': [status for status in STATUS_OPTIONS if MATCHERS[term.mode](status.lower(), term.value)]}}
+        words = re.findall(r'\w+', term.value)
+        if term.mode == 'equals':
+            # Every word of a whole value is a whole word; '' stands for an empty value
+            word = max(words, key=len) if words else ''
+        elif words:
+            # Only the last word may go on past the typed text
+            word = max(words[:-1], key=len, default='')
+            if len(word) < len(words[-1]):
+                word = re.compile('^' + re.escape(words[-1]))
+        else:
+            return None
+        if term.field is not None:
+            return 1, {f'words.{term.field}': word}
+        branches = [{f'words.{field}': word} for field in SEARCH_WORD_FIELDS]
+        norm = normalize_serial(term.value)
+        if norm:
+            branches.append({'serial_norm': re.compile('^' + re.escape(norm))})
+        statuses = [status for status in STATUS_OPTIONS if term.value in status.lower()]
+        if statuses:
+            branches.append({'status': {'$in': statuses}})
+        return 1, {'$or': branches}
+
+class InventoryTableModel(QAbstractTableModel):
+    # Filtering and sorting happen here over row ids so a query costs a few set
+    # operations instead of one Python callback per row
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.search_index = SearchIndex()
+        self.store = InventoryStore()
+        self._stream = None
+        self._stream_pending = False
+        self._order = []
+        self._query = ''
+        self._matches = None
+        self._sorted_all = None
+        self._sorted_count = 0
+        self._tail_unsorted = False
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+
+    def set_rows(self, rows):
+        self._stream = None
+        self.store = InventoryStore()
+        self.search_index.clear()
+        for doc in rows:
+            self._store(doc)
+        self._sorted_all = None
+        self._matches = None
+        self._refresh_order()
+
+    def _store(self, doc):
+        rid = self.store.append(doc)
+        self.search_index.add(rid, search_text(doc))
+        return rid
+
+    # --- Streaming: batches arrive from an InventoryLoader running on a worker thread ---
+    def set_stream(self, loader):
+        self.set_rows([])
+        self._stream = loader
+        self._stream_pending = True
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._stream is not None and not self._stream_pending
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._stream_pending = True
+            self._stream.request_more()
+
+    def fetch_all(self):
+        if self._stream is not None:
+            self._stream_pending = True
+            self._stream.request_all()
+
+    def receive_batch(self, batch, done):
+        self._stream_pending = False
+        self.append_rows(batch)
+        if done:
+            self.end_stream()
+
+    def end_stream(self):
+        self._stream = None
+        self._stream_pending = False
+        if self._tail_unsorted:
+            self._refresh_order()
+
+    def append_rows(self, docs):
+        if not docs:
+            return
+        rids = [self._store(doc) for doc in docs]
+        if self._sort_column >= 0 and len(self.store) >= 2 * self._sorted_count:
+            # Re-sort each time the row count doubles, so a full load costs O(log N) sorts
+            if self._query:
+                self._matches = self._search()
+            self._sorted_all = None
+            self._refresh_order()
+            return
+        if self._query:
+            rids = [rid for rid in rids if self._row_matches(rid)]
+            self._matches.update(rids)
+        if self._sort_column >= 0:
+            # Until the next re-sort, new rows wait at the end of the view
+            self._sorted_all = None
+            self._tail_unsorted = True
+        if rids:
+            first = len(self._order)
+            self.beginInsertRows(QModelIndex(), first, first + len(rids) - 1)
+            self._order.extend(rids)
+            self.endInsertRows()
+
+    @profiled('ui.set_query')
+    def set_query(self, query):
+        # query is a lowercase substring or a parsed InventoryQuery. Text that extends the
+        # previous query only drops rows, so a sorted view is filtered rather than rebuilt.
+        narrowed = (isinstance(query, str) and isinstance(self._query, str) and self._query != ''
+                    and self._query in query and not self._tail_unsorted)
+        self._query = query
+        self._matches = self._search()
+        self._refresh_order(narrowed)
+
+    def _search(self):
+        if isinstance(self._query, InventoryQuery):
+            return self._query.search(self)
+        return self.search_index.search(self._query)
+
+    def _row_matches(self, rid):
+        if isinstance(self._query, InventoryQuery):
+            return self._query.matches(self, rid)
+        return self._query in self.search_index.text(rid)
+
+    def rid_at(self, row):
+        return self._order[row]
+
+    def row_data(self, row):
+        return self.store.document(self._order[row])
+
+    def document(self, rid):
+        return self.store.document(rid) if rid in self.store else None
+
+    def documents(self):
+        return (self.store.document(rid) for rid in self.store.rids())
+
+    def rid_for_id(self, doc_id):
+        return self.store.rid_for_id(doc_id)
+
+    def rid_for_serial(self, serial):
+        return self.store.rid_for_serial(serial)
+
+    def similar_rids(self, serial):
+        return self.store.similar_rids(serial)
+
+    def value_counts(self, field):
+        return self.store.value_counts(field)
+
+    # --- In-place deltas: patch one row instead of resetting the whole model ---
+    # Rows are addressed by row id, which stays valid while a write is in flight
+    def add_row(self, doc):
+        rid = self._store(doc)
+        self._place(rid)
+        return rid
+
+    def update_row(self, rid, changes):
+        if rid not in self.store:
+            return
+        self._unplace(rid)
+        self.store.update(rid, changes)
+        self.search_index.update(rid, search_text(self.store.document(rid)))
+        self._place(rid)
+
+    def remove_row(self, rid):
+        if rid not in self.store:
+            return
+        self._unplace(rid)
+        self.search_index.remove(rid)
+        self.store.remove(rid)
+
+    # Large batches patch the store and re-sort once instead of moving rows one at a time
+    BATCH_DELTA_ROWS = 32
+
+    def add_rows(self, docs):
+        if len(docs) <= self.BATCH_DELTA_ROWS:
+            for doc in docs:
+                self.add_row(doc)
+            return
+        for doc in docs:
+            self._store(doc)
+        self._refresh_all()
+
+    def update_rows(self, updates):
+        # updates: [(rid, changes)]
+        if len(updates) <= self.BATCH_DELTA_ROWS:
+            for rid, changes in updates:
+                self.update_row(rid, changes)
+            return
+        rids = {rid for rid, _ in updates if rid in self.store}
+        self._drop(rids)
+        for rid, changes in updates:
+            if rid in self.store:
+                self.store.update(rid, changes)
+                self.search_index.update(rid, search_text(self.store.document(rid)))
+        self._merge(rids)
+
+    def remove_rows(self, rids):
+        if len(rids) <= self.BATCH_DELTA_ROWS:
+            for rid in rids:
+                self.remove_row(rid)
+            return
+        rids = {rid for rid in rids if rid in self.store}
+        self._drop(rids)
+        for rid in rids:
+            self.search_index.remove(rid)
+            self.store.remove(rid)
+        self.beginResetModel()
+        self.endResetModel()
+
+    # A batch leaves the view in one pass over the order and comes back in one merge,
+    # rather than a list search and shift per row
+    def _drop(self, rids):
+        shared = self._order is self._sorted_all
+        self._order = [rid for rid in self._order if rid not in rids]
+        if shared:
+            self._sorted_all = self._order
+        elif self._sorted_all is not None:
+            self._sorted_all = [rid for rid in self._sorted_all if rid not in rids]
+        if self._matches is not None:
+            self._matches -= rids
+
+    def _merge(self, rids):
+        if self._tail_unsorted:
+            self._refresh_all()
+            return
+        if self._sort_column < 0:
+            ordered = sorted(rids)
+        else:
+            key = self._sort_key(INVENTORY_COLUMNS[self._sort_column][0])
+            ordered = sorted(sorted(rids), key=key, reverse=self._sort_order == Qt.DescendingOrder)
+        shared = self._order is self._sorted_all
+        if self._sorted_all is not None and not shared:
+            self._sorted_all = self._merged(self._sorted_all, ordered)
+        if self._query:
+            ordered = [rid for rid in ordered if self._row_matches(rid)]
+            self._matches.update(ordered)
+        self.beginResetModel()
+        self._order = self._merged(self._order, ordered)
+        if shared:
+            self._sorted_all = self._order
+        self.endResetModel()
+
+    def _merged(self, order, rids):
+        # order with rids (already in view order) inserted at their places
+        merged = []
+        last = 0
+        for rid in rids:
+            row = self._position(order, rid)
+            merged.extend(order[last:row])
+            merged.append(rid)
+            last = row
+        merged.extend(order[last:])
+        return merged
+
+    def _refresh_all(self):
+        if self._query:
+            self._matches = self._search()
+        self._sorted_all = None
+        self._refresh_order()
+
+    def _position(self, rids, rid):
+        # Binary search for rid's slot in a list ordered like the current view. Equal values
+        # stay in row id order, so every row has exactly one slot.
+        if self._sort_column < 0:
+            return bisect.bisect_left(rids, rid)
+        key = self._sort_key(INVENTORY_COLUMNS[self._sort_column][0])
+        value = key(rid)
+        descending = self._sort_order == Qt.DescendingOrder
+        lo, hi = 0, len(rids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = rids[mid]
+            other_value = key(other)
+            if other_value == value:
+                before = other < rid
+            else:
+                before = (other_value > value) if descending else (other_value < value)
+            if before:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _row_of(self, rids, rid):
+        row = None if self._tail_unsorted else self._position(rids, rid)
+        if row is not None and row < len(rids) and rids[row] == rid:
+            return row
+        # Rows appended since the last sort wait unsorted at the end
+        try:
+            return rids.index(rid)
+        except ValueError:
+            return None
+
+    def _place(self, rid):
+        # When the view is the cached full ordering, inserting into one updates both
+        shared = self._order is self._sorted_all
+        if self._sorted_all is not None and not shared:
+            self._sorted_all.insert(self._position(self._sorted_all, rid), rid)
+        if self._query:
+            if not self._row_matches(rid):
+                return
+            self._matches.add(rid)
+        row = self._position(self._order, rid)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._order.insert(row, rid)
+        self.endInsertRows()
+
+    def _unplace(self, rid):
+        shared = self._order is self._sorted_all
+        row = self._row_of(self._order, rid)
+        if row is not None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._order[row]
+            self.endRemoveRows()
+        if self._sorted_all is not None and not shared:
+            row = self._row_of(self._sorted_all, rid)
+            if row is not None:
+                del self._sorted_all[row]
+        if self._matches is not None:
+            self._matches.discard(rid)
+
+    def _sort_key(self, field):
+        return self.store.sort_key(field)
+
+    def _refresh_order(self, narrowed=False):
+        matches = self._matches
+        if self._sort_column < 0:
+            order = self.store.rids() if matches is None else sorted(matches)
+        else:
+            key = self._sort_key(INVENTORY_COLUMNS[self._sort_column][0])
+            reverse = self._sort_order == Qt.DescendingOrder
+            if matches is not None and len(matches) * 16 < len(self.store):
+                # Sorted by row id first so equal values keep row id order, as in _sorted_all
+                order = sorted(sorted(matches), key=key, reverse=reverse)
+            elif narrowed:
+                order = [rid for rid in self._order if rid in matches]
+            else:
+                if self._sorted_all is None:
+                    self._sorted_all = sorted(self.store.rids(), key=key, reverse=reverse)
+                order = self._sorted_all if matches is None else [rid for rid in self._sorted_all if rid in matches]
+        self._sorted_count = len(self.store)
+        self._tail_unsorted = False
+        self.beginResetModel()
+        self._order = order
+        self.endResetModel()
+
+    @profiled('ui.sort')
+    def sort(self, column, order=Qt.AscendingOrder):
+        if (column, order) == (self._sort_column, self._sort_order) and self._order:
+            return
+        self._sort_column = column
+        self._sort_order = order
+        self._sorted_all = None
+        self._refresh_order()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(INVENTORY_COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return str(self.store.get(self._order[index.row()], INVENTORY_COLUMNS[index.column()][0]))
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignVCenter | Qt.AlignLeft)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return INVENTORY_COLUMNS[section][1]
+        return super().headerData(section, orientation, role)
+
+class StatusDelegate(QStyledItemDelegate):
+    # Brushes and the bold font are created once and shared by every painted cell
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._brushes = {status: QBrush(QColor(color)) for status, color in STATUS_COLORS.items()}
+        self._default_brush = QBrush(QColor('#fff'))
+        self._font = None
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        if self._font is None:
+            self._font = QFont(option.font)
+            self._font.setBold(True)
+        option.font = self._font
+        option.displayAlignment = Qt.AlignCenter
+        option.backgroundBrush = self._brushes.get(option.text.strip().lower(), self._default_brush)
+
+# --- Dashboard statistics ---
+# STATS_BY_LOCATION adds a per-location breakdown under the dashboard counters
+STATS_BY_LOCATION = config_flag('STATS_BY_LOCATION')
+
+def location_key(doc):
+    return str(doc.get('location', '') or '').strip()
+
+class InventoryStats:
+    # Status (and optionally location) counts, seeded by one server-side $group
+    # and then kept current by applying each write as a delta
+    def __init__(self, by_location=False):
+        self.by_location = by_location
+        self.status = Counter()
+        self.location = Counter()
+
+    def pipeline(self):
+        # Raw values are grouped on the server; the handful of groups is normalized here
+        facets = {'status': [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]}
+        if self.by_location:
+            facets['location'] = [{'$group': {'_id': '$location', 'count': {'$sum': 1}}}]
+        return [{'$facet': facets}]
+
+    def fetch(self, collection):
+        stats = InventoryStats(self.by_location)
+        for result in collection.aggregate(self.pipeline()):
+            for group in result.get('status', []):
+                stats.status[status_key({'status': group['_id'] or ''})] += group['count']
+            for group in result.get('location', []):
+                stats.location[location_key({'location': group['_id']})] += group['count']
+        return stats
+
+    def count(self, source):
+        # Same totals as fetch(), from the rows already loaded (the model's category codes)
+        # or from the local snapshot
+        stats = InventoryStats(self.by_location)
+        for value, count in source.value_counts('status').items():
+            stats.status[status_key({'status': value})] += count
+        if self.by_location:
+            for value, count in source.value_counts('location').items():
+                stats.location[location_key({'location': value})] += count
+        return stats
+
+    def apply(self, old_doc=None, new_doc=None):
+        # old_doc is None for an insert, new_doc is None for a delete
+        if old_doc is not None:
+            self.status[status_key(old_doc)] -= 1
+            if self.by_location:
+                self.location[location_key(old_doc)] -= 1
+        if new_doc is not None:
+            self.status[status_key(new_doc)] += 1
+            if self.by_location:
+                self.location[location_key(new_doc)] += 1
+
+    def total(self):
+        return sum(self.status.values())
+
+# --- Rollup reports ---
+# inventory_rollups holds one count per (location, status, device_name) cell. Every write
+# the app makes moves its documents between cells with $inc, and rebuild_rollups recounts
+# them all with one $group/$merge on the server. Reports read only the rollups, plus one
+# summary per day in inventory_rollups_daily for the trend. The deltas come from a read
+# made before the write, so two clients moving the same item at once both take it out of
+# its old cell: the sum stays right while the cells drift, and only a recount repairs
+# that. One runs at least every ROLLUP_RECOUNT_HOURS for this reason.
+ROLLUP_FIELDS = ('location', 'status', 'device_name')
+REPORT_DAYS = max(1, config_int('REPORT_DAYS', 90))
+ROLLUP_RECOUNT_HOURS = config_int('ROLLUP_RECOUNT_HOURS', 24)
+# Not a cell: when rebuild_rollups last ran
+ROLLUP_RECOUNTED = 'recounted'
+
+def rollups_for(collection):
+    return collection.database[collection.name + '_rollups']
+
+def daily_rollups_for(collection):
+    return collection.database[collection.name + '_rollups_daily']
+
+def rollup_cell(doc):
+    return tuple(doc.get(field) or '' for field in ROLLUP_FIELDS)
+
+def update_rollups(collection, changes):
+    # changes: [(old doc or None, new doc or None)], sent as one $inc per cell that moved
+    deltas = Counter()
+    for old_doc, new_doc in changes:
+        if old_doc is not None:
+            deltas[rollup_cell(old_doc)] -= 1
+        if new_doc is not None:
+            deltas[rollup_cell(new_doc)] += 1
+    ops = [UpdateOne({'_id': dict(zip(ROLLUP_FIELDS, cell))}, {'$inc': {'count': delta}}, upsert=True)
+           for cell, delta in deltas.items() if delta]
+    if ops:
+        rollups_for(collection).bulk_write(ops, ordered=False)
+
+def rebuild_rollups(collection):
+    # Cells that were there before the recount and that it did not write are the ones no
+    # document falls into any more. Cells a concurrent write creates meanwhile are kept.
+    rollups = rollups_for(collection)
+    generation = ObjectId()
+    before = [cell['_id'] for cell in rollups.find({'_id': {'$ne': ROLLUP_RECOUNTED}}, {'_id': 1})]
+    collection.aggregate([
+        {'$group': {'_id': {field: {'$ifNull': [f'${field}', '']} for field in ROLLUP_FIELDS}, 'count': {'$sum': 1}}},
+        {'$set': {'generation': generation}},
+        {'$merge': {'into': rollups.name, 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ])
+    if before:
+        rollups.delete_many({'_id': {'$in': before}, 'generation': {'$ne': generation}})
+    rollups.update_one({'_id': ROLLUP_RECOUNTED}, {'$currentDate': {'at': True}}, upsert=True)
+
+def rollups_due(collection):
+    if ROLLUP_RECOUNT_HOURS <= 0:
+        return False
+    recounted = rollups_for(collection).find_one({'_id': ROLLUP_RECOUNTED})
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return recounted is None or recounted['at'] < now - datetime.timedelta(hours=ROLLUP_RECOUNT_HOURS)
+
+def read_rollups(collection):
+    return [dict(cell['_id'], count=cell['count']) for cell in rollups_for(collection).find({'count': {'$gt': 0}})]
+
+def record_daily_rollup(collection, cells):
+    # Today's totals per status, location and model; the last call of the day wins
+    totals = {field: Counter() for field in ROLLUP_FIELDS}
+    for cell in cells:
+        for field in ROLLUP_FIELDS:
+            totals[field][cell[field]] += cell['count']
+    summary = {field: sorted(counts.items()) for field, counts in totals.items()}
+    summary['total'] = sum(cell['count'] for cell in cells)
+    daily_rollups_for(collection).update_one({'_id': datetime.date.today().isoformat()},
+                                             {'$set': summary, '$currentDate': {'taken_at': True}}, upsert=True)
+
+def ensure_rollups(collection):
+    # Recounts when the cells no longer add up to the collection (on the first start, or
+    # after writes made outside the app) or when the last recount is too old
+    cells = read_rollups(collection)
+    if sum(cell['count'] for cell in cells) != collection.estimated_document_count() or rollups_due(collection):
+        rebuild_rollups(collection)
+        cells = read_rollups(collection)
+    record_daily_rollup(collection, cells)
+
+def load_report(worker, collection, rebuild=False):
+    # Never reads the inventory itself unless a rebuild was asked for or is due
+    if rebuild or rollups_due(collection):
+        rebuild_rollups(collection)
+    cells = read_rollups(collection)
+    record_daily_rollup(collection, cells)
+    days = list(daily_rollups_for(collection).find({}, {'total': 1, 'status': 1}).sort('_id', DESCENDING).limit(REPORT_DAYS))
+    return {'cells': cells, 'days': days[::-1]}
+
+def check_login(worker, users_col, cache, username, password):
+    user = users_col.find_one({'username': username, 'password': password})
+    if user and cache is not None:
+        cache.remember_login(username, password)
+    return user
 
 # Login Window
 class LoginWindow(QWidget):
-    def __init__(self):
+    def __init__(self, connection=None, cache=None):
         super().__init__()
+        self.connection = connection
+        self.cache = cache
         self.setWindowTitle("IT Inventory Login")
-        self.setFixedSize(380, 315)
+        self.setFixedSize(380, 340)
         self.setWindowIcon(QIcon())
         layout = QVBoxLayout()
         layout.setContentsMargins(34, 32, 34, 34)
@@ -120,36 +1774,97 @@ class LoginWindow(QWidget):
         footer = QLabel("<span style='color:#bfc6d1;font-size:12px;'>© 2025 IT Dept. Fairmont Tazi Palace</span>")
         footer.setAlignment(Qt.AlignCenter)
         layout.addWidget(footer)
+        # Connection state, updated while the database connects in the background
+        self.connection_label = QLabel()
+        self.connection_label.setAlignment(Qt.AlignCenter)
+        self.connection_label.setStyleSheet("font-size:12px;color:#6b7280;")
+        layout.addWidget(self.connection_label)
         self.setLayout(layout)
+        if connection is not None:
+            connection.state_changed.connect(self.on_connection_state)
+            self.on_connection_state(connection.state, "Connecting to database...")
+
+    def on_connection_state(self, state, message):
+        color = {'connected': '#44b37f', 'offline': '#e06f6c'}.get(state, '#6b7280')
+        self.connection_label.setText(f"<span style='color:{color};'>●</span> {message}")
     def toggle_password(self):
         self.pass_input.setEchoMode(QLineEdit.Normal if self.show_pass_btn.isChecked() else QLineEdit.Password)
 
     def handle_login(self):
         username = self.user_input.text()
         password = self.pass_input.text()
+        if self.connection is not None and not self.connection.is_connected():
+            self.connection.retry_now()
+            verified = self.cache.verify_login(username, password) if self.cache is not None else None
+            if verified:
+                # Checked against the credentials saved at this user's last online sign-in
+                self.accept_login()
+            elif verified is False:
+                QMessageBox.warning(self, "Login Failed", "Invalid username or password.")
+            else:
+                QMessageBox.warning(self, "Not Connected", "The database is not reachable yet. Retrying in the background...")
+            return
         users_col = get_users_col()
-        user = users_col.find_one({'username': username, 'password': password})
+        self.login_btn.setEnabled(False)
+        self.login_btn.setText("Signing in...")
+        run_in_background(check_login, users_col, self.cache, username, password,
+                          on_result=self.on_login_result, on_error=self.on_login_error)
+
+    def on_login_result(self, user):
+        self.reset_login_button()
         if user:
             self.accept_login()
         else:
             QMessageBox.warning(self, "Login Failed", "Invalid username or password.")
 
+    def on_login_error(self, message):
+        self.reset_login_button()
+        QMessageBox.critical(self, "Database Error", f"Could not reach the database:\n{message}")
+
+    def reset_login_button(self):
+        self.login_btn.setEnabled(True)
+        self.login_btn.setText("Login")
+
     def accept_login(self):
         self.close()
-        self.main_window = InventoryWindow()
+        self.main_window = InventoryWindow(self.connection, self.cache, self.user_input.text().strip())
         self.main_window.show()
 
 # Main Inventory Window with CRUD operations
 class InventoryWindow(QWidget):
-    def __init__(self):
+    def __init__(self, connection=None, cache=None, user=None):
         super().__init__()
         self.setWindowTitle("IT Inventory - Fairmont Tazi Palace Tanger")
         self.setGeometry(500, 200, 950, 600)
         self.setWindowIcon(QIcon())
         self.users_col = get_users_col()
         self.inventory_col = get_inventory_col()
+        self.connection = connection
+        self.cache = cache
+        # Credited in the audit log for every change made from this window
+        self.user = user
+        self.write_queue = WriteBehindQueue(self.inventory_col, cache, connection, self, user=user)
+        self.write_queue.failed.connect(self.on_scan_write_failed)
+        self.writes_saved = False
+        self.scan_dialog = None
+        self.reports_dialog = None
         self.setStyleSheet(self.get_stylesheet())
         self.init_ui()
+        if connection is not None:
+            connection.state_changed.connect(self.on_connection_state)
+        # Collects the recounts remote changes to unloaded rows ask for into one
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setSingleShot(True)
+        self.stats_timer.setInterval(STATS_RECOUNT_MS)
+        self.stats_timer.timeout.connect(self.load_stats)
+        if SYNC_INTERVAL_S > 0:
+            self.sync_timer = QTimer(self)
+            self.sync_timer.setInterval(SYNC_INTERVAL_S * 1000)
+            self.sync_timer.timeout.connect(self.on_sync_timer)
+            self.sync_timer.start()
+        self.diagnostics_dialog = None
+        if diagnostics is not None:
+            QShortcut(QKeySequence("Ctrl+Shift+D"), self, activated=self.show_diagnostics)
         self.load_data()
 
     def get_stylesheet(self):
@@ -157,8 +1872,8 @@ class InventoryWindow(QWidget):
         QWidget { background: #f4f7fb; color: #222; font-family: 'Segoe UI', Arial, sans-serif; font-size: 15px; }
         QFrame#HeaderBar { background: #fff; border-radius: 12px; padding: 18px 32px; margin-bottom: 18px; border: 1px solid #e0e4ea; }
         QLabel#HeaderTitle { font-size: 26px; font-weight: bold; color: #222; letter-spacing: 1px; }
-        QTableWidget { background: #fff; border-radius: 10px; border: 1px solid #e0e4ea; gridline-color: #e0e4ea; selection-background-color: #e8f0fe; font-size: 14px; }
-        QTableWidget::item:selected { background: #e8f0fe; }
+        QTableView { background: #fff; border-radius: 10px; border: 1px solid #e0e4ea; gridline-color: #e0e4ea; selection-background-color: #e8f0fe; font-size: 14px; }
+        QTableView::item:selected { background: #e8f0fe; }
         QPushButton#AddBtn {
             background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #4F8FF9, stop:1 #44b37f);
             color: #fff;
@@ -244,6 +1959,10 @@ class InventoryWindow(QWidget):
         widget_layout.addWidget(self.retired_label)
         self.widget_frame.setLayout(widget_layout)
         main_layout.addWidget(self.widget_frame)
+        self.location_label = QLabel()
+        self.location_label.setStyleSheet("font-size:13px;color:#6b7280;margin-left:4px;")
+        self.location_label.setVisible(STATS_BY_LOCATION)
+        main_layout.addWidget(self.location_label)
 
         # Search Bar & Export
         search_layout = QHBoxLayout()
@@ -251,7 +1970,12 @@ class InventoryWindow(QWidget):
         self.search_input.setPlaceholderText("Search inventory...")
         self.search_input.setMinimumHeight(34)
         self.search_input.setStyleSheet("border-radius:7px;background:#fff;border:1.5px solid #e0e4ea;padding:8px 14px;font-size:15px;")
-        self.search_input.textChanged.connect(self.filter_table)
+        # Debounced so fast typing runs one search instead of one per character
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.filter_table)
+        self.search_input.textChanged.connect(lambda _text: self.search_timer.start())
         search_icon = QLabel("")
         search_icon.setStyleSheet("font-size:18px;margin-right:6px;")
         search_layout.addWidget(search_icon)
@@ -263,22 +1987,64 @@ class InventoryWindow(QWidget):
         self.export_btn.setStyleSheet("background:#fff;border:1.5px solid #e0e4ea;border-radius:7px;padding:7px 18px;font-size:14px;font-weight:600;color:#4F8FF9;")
         self.export_btn.clicked.connect(self.export_csv)
         search_layout.addWidget(self.export_btn)
+        self.import_btn = QToolButton()
+        self.import_btn.setText("Import")
+        self.import_btn.setIcon(QIcon.fromTheme("document-open"))
+        self.import_btn.setToolTip("Import inventory from a CSV or JSON Lines file")
+        self.import_btn.setStyleSheet("background:#fff;border:1.5px solid #e0e4ea;border-radius:7px;padding:7px 18px;font-size:14px;font-weight:600;color:#44b37f;")
+        self.import_btn.clicked.connect(self.import_file)
+        search_layout.addWidget(self.import_btn)
+        self.scan_btn = QToolButton()
+        self.scan_btn.setText("Scan Mode")
+        self.scan_btn.setToolTip("Check items in and out with a barcode scanner")
+        self.scan_btn.setStyleSheet("background:#fff;border:1.5px solid #e0e4ea;border-radius:7px;padding:7px 18px;font-size:14px;font-weight:600;color:#2563eb;")
+        self.scan_btn.clicked.connect(self.show_scan_mode)
+        search_layout.addWidget(self.scan_btn)
+        self.reports_btn = QToolButton()
+        self.reports_btn.setText("Reports")
+        self.reports_btn.setToolTip("Item counts by location, device model and status")
+        self.reports_btn.setStyleSheet("background:#fff;border:1.5px solid #e0e4ea;border-radius:7px;padding:7px 18px;font-size:14px;font-weight:600;color:#6b7280;")
+        self.reports_btn.clicked.connect(self.show_reports)
+        search_layout.addWidget(self.reports_btn)
         main_layout.addLayout(search_layout)
 
         # Table
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels([
-            "Device Name", "Serial Number", "Location", "Status", "Assigned To"
-        ])
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.model = InventoryTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setItemDelegateForColumn(STATUS_COLUMN, StatusDelegate(self.table))
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.table.setAlternatingRowColors(True)
         self.table.setSortingEnabled(True)
-        self.table.setStyleSheet("QTableWidget {background:#fff;border-radius:12px;font-size:15px;} QHeaderView::section {background:#f3f6fa;font-size:16px;font-weight:600;color:#4F8FF9;border:none;border-bottom:2px solid #e0e4ea;padding:10px;} QTableWidget::item:hover {background:#eaf1fa;}")
+        self.table.setStyleSheet("QTableView {background:#fff;border-radius:12px;font-size:15px;} QHeaderView::section {background:#f3f6fa;font-size:16px;font-weight:600;color:#4F8FF9;border:none;border-bottom:2px solid #e0e4ea;padding:10px;} QTableView::item:hover {background:#eaf1fa;}")
         main_layout.addWidget(self.table)
 
+        # Progress / busy row for background database work
+        progress_layout = QHBoxLayout()
+        self.sync_label = QLabel()
+        self.sync_label.setStyleSheet("font-size:13px;color:#6b7280;margin-right:12px;")
+        self.sync_label.setVisible(self.cache is not None)
+        progress_layout.addWidget(self.sync_label)
+        self.progress_label = QLabel()
+        self.progress_label.setStyleSheet("font-size:13px;color:#6b7280;")
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(260)
+        self.progress_bar.setMaximumHeight(14)
+        self.progress_bar.setTextVisible(False)
+        self.progress_cancel_btn = QToolButton()
+        self.progress_cancel_btn.setText("Cancel")
+        self.progress_cancel_btn.setStyleSheet("background:#fff;border:1.5px solid #e0e4ea;border-radius:7px;padding:2px 12px;font-size:13px;color:#e06f6c;")
+        self.progress_cancel_btn.clicked.connect(self.cancel_progress)
+        progress_layout.addWidget(self.progress_label)
+        progress_layout.addStretch()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.progress_cancel_btn)
+        main_layout.addLayout(progress_layout)
+        self.progress_worker = None
+        self.hide_progress()
+
         # Action Buttons with icons
         btn_layout = QHBoxLayout()
         btn_layout.addStretch()
@@ -302,132 +2068,1990 @@ class InventoryWindow(QWidget):
         self.delete_btn.setMinimumHeight(38)
         self.delete_btn.setStyleSheet("background:#e06f6c;color:#fff;font-size:16px;font-weight:600;border-radius:8px;")
         self.delete_btn.clicked.connect(self.delete_item)
+        self.undo_btn = QPushButton("↶ Undo")
+        self.undo_btn.setMinimumHeight(38)
+        self.undo_btn.setStyleSheet("QPushButton {background:#fff;color:#4F8FF9;font-size:16px;font-weight:600;border-radius:8px;border:1.5px solid #e0e4ea;padding:0 18px;margin-left:14px;} QPushButton:disabled {color:#bfc6d1;}")
+        self.undo_btn.clicked.connect(self.undo)
+        self.undo_btn.setEnabled(False)
+        QShortcut(QKeySequence.Undo, self, activated=self.undo)
+        self.history_btn = QPushButton("History")
+        self.history_btn.setMinimumHeight(38)
+        self.history_btn.setToolTip("Every change made to the selected item, and who made it")
+        self.history_btn.setStyleSheet("QPushButton {background:#fff;color:#6b7280;font-size:16px;font-weight:600;border-radius:8px;border:1.5px solid #e0e4ea;padding:0 18px;margin-left:14px;}")
+        self.history_btn.clicked.connect(self.show_history)
         btn_layout.addWidget(self.add_btn)
         btn_layout.addWidget(self.edit_btn)
         btn_layout.addWidget(self.delete_btn)
+        btn_layout.addWidget(self.undo_btn)
+        btn_layout.addWidget(self.history_btn)
         btn_layout.addStretch()
         main_layout.addLayout(btn_layout)
         self.setLayout(main_layout)
-        self.all_data = []
-
-    def load_data(self):
-        self.all_data = list(self.inventory_col.find())
+        self.stats = InventoryStats(STATS_BY_LOCATION)
         self.refresh_stats()
-        self.filter_table()
-        self.table.resizeColumnsToContents()
-        self.table.horizontalHeader().setStretchLastSection(True)
+        self.loader = None
+        self.server_search = False
+        self.server_query = ''
+        self.undo_stack = []
+        self.sync_worker = None
+        self.sync_on_load = True
+        self.sync_again = False
+        self.needs_reconcile = True
+        self.last_sync = None
+        # Without a snapshot the window keeps its own high-water mark
+        self.high_water_mark = None
+        self.watcher = None
+        self.watching = False
+        self.watch_supported = CHANGE_STREAMS
+        self.watch_pool = QThreadPool(self)
+        # A paged load stays open for as long as the table shows it
+        self.load_pool = QThreadPool(self)
 
-    def refresh_stats(self):
-        total = len(self.all_data)
-        inuse = sum(1 for row in self.all_data if str(row.get('status', '')).strip().lower() == 'in use')
-        available = sum(1 for row in self.all_data if str(row.get('status', '')).strip().lower() == 'available')
-        retired = sum(1 for row in self.all_data if str(row.get('status', '')).strip().lower() == 'retired')
-        self.total_label.setText(f"Total Items: <b>{total}</b>")
-        self.inuse_label.setText(f"In Use: <b style='color:#4F8FF9'>{inuse}</b>")
-        self.available_label.setText(f"Available: <b style='color:#44b37f'>{available}</b>")
-        self.retired_label.setText(f"Retired: <b style='color:#e06f6c'>{retired}</b>")
+    # --- Progress and busy state ---
+    def show_progress(self, text, value=0, maximum=0, worker=None):
+        # maximum=0 shows a busy indicator; a worker makes the load cancellable
+        self.progress_label.setText(text)
+        self.progress_bar.setRange(0, maximum)
+        self.progress_bar.setValue(value)
+        self.progress_worker = worker
+        self.progress_label.show()
+        self.progress_bar.show()
+        self.progress_cancel_btn.setVisible(worker is not None)
 
-    def filter_table(self):
-        query = self.search_input.text().strip().lower()
-        self.table.setRowCount(0)
-        
-        for row in self.all_data:
-            # row: MongoDB doc
-            row_values = [
-                row.get('device_name', ''),
-                row.get('serial_number', ''),
-                row.get('location', ''),
-                row.get('status', ''),
-                row.get('assigned_to', '')
-            ]
-            if query:
-                row_str = ' '.join(str(x).lower() for x in row_values)
-                if query not in row_str:
-                    continue
-            row_idx = self.table.rowCount()
-            self.table.insertRow(row_idx)
-            for col_idx, value in enumerate(row_values):
-                if col_idx == 3:  # Status column
-                    status = str(value).strip().lower()
-                    if status == 'in use':
-                        color = QColor('#4F8FF9')
-                    elif status == 'available':
-                        color = QColor('#44b37f')
-                    elif status == 'retired':
-                        color = QColor('#e06f6c')
-                    else:
-                        color = QColor('#fff')
-                    item = QTableWidgetItem(str(value))
-                    item.setBackground(color)
-                    item.setTextAlignment(Qt.AlignCenter)
-                    font = item.font(); font.setBold(True)
-                    item.setFont(font)
-                else:
-                    item = QTableWidgetItem(str(value))
-                    item.setTextAlignment(Qt.AlignVCenter | Qt.AlignLeft)
-                self.table.setItem(row_idx, col_idx, item)
-    def add_item(self):
-        dialog = InventoryDialog(self)
-        if dialog.exec_() == QDialog.Accepted:
-            data = dialog.get_data()
-            self.inventory_col.insert_one(data)
-            self.load_data()
-            QMessageBox.information(self, "Item Added", "Inventory item added successfully!")
+    def hide_progress(self):
+        self.progress_worker = None
+        self.progress_label.hide()
+        self.progress_bar.hide()
+        self.progress_cancel_btn.hide()
 
+    def cancel_progress(self):
+        if self.progress_worker is not None:
+            self.progress_worker.cancel()
+        self.hide_progress()
 
-    def edit_item(self):
-        selected = self.table.currentRow()
-        if selected < 0 or selected >= len(self.all_data):
-            QMessageBox.warning(self, "No Selection", "Please select an item to edit.")
+    def show_db_error(self, message):
+        self.hide_progress()
+        QMessageBox.critical(self, "Database Error", message)
+
+    def closeEvent(self, event):
+        if self.write_queue.on_drained is not None:
+            event.ignore()
             return
-        row_data = self.all_data[selected]
-        dialog = InventoryDialog(self, (
-            str(row_data.get('_id', '')),
-            row_data.get('device_name', ''),
-            row_data.get('serial_number', ''),
-            row_data.get('location', ''),
-            row_data.get('status', ''),
-            row_data.get('assigned_to', '')
-        ))
-        if dialog.exec_() == QDialog.Accepted:
+        if not self.writes_saved and len(self.write_queue):
+            # Scanned changes are saved first, and the window closes once they are
+            event.ignore()
+            self.show_progress("Saving scanned changes...")
+            self.write_queue.drain(self.on_write_queue_drained)
+            return
+        for worker in (self.loader, self.sync_worker, self.watcher):
+            if worker is not None:
+                worker.cancel()
+        super().closeEvent(event)
+
+    def on_write_queue_drained(self, saved):
+        self.hide_progress()
+        if not saved and QMessageBox.question(
+                self, "Unsaved Scans", f"{len(self.write_queue):,} scanned changes could not be saved. Close anyway?",
+                QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            self.write_queue.resume()
+            return
+        self.writes_saved = True
+        self.close()
+
+    def load_data(self, query_filter=None):
+        if self.loader is not None:
+            self.loader.cancel()
+        if self.cache is not None and query_filter is None:
+            # The local snapshot paints right away; start_sync brings it up to date afterwards
+            loader = SnapshotLoader(self.cache, LOAD_BATCH_SIZE, self.server_search)
+        else:
+            # In lazy mode the first page is shown right away and the rest arrives through fetchMore
+            loader = InventoryLoader(self.inventory_col, query_filter or {}, LOAD_BATCH_SIZE, LAZY_LOAD or self.server_search)
+        self.loader = loader
+        self.load_started = time.perf_counter()
+        self.model.set_stream(loader)
+        if query_filter is None and self.cache is None:
+            self.load_stats()
+        self.show_progress("Loading inventory...", worker=loader)
+        start_worker(loader,
+                     on_progress=lambda payload: self.on_batch_loaded(loader, payload),
+                     on_error=lambda message: self.on_load_error(loader, message),
+                     on_finished=lambda: self.on_load_finished(loader),
+                     pool=self.load_pool)
+
+    def on_batch_loaded(self, loader, payload):
+        if loader is not self.loader:
+            return
+        batch, loaded, total, done = payload
+        first_batch = loaded == len(batch)
+        if first_batch and not self.server_search and (LAZY_LOAD or (total or 0) > SERVER_SEARCH_THRESHOLD):
+            # Too many rows to hold in memory: page them in and let the server answer searches.
+            # A snapshot keeps paging from disk, so its load never finishes: the counters and
+            # the first sync it would have started come now.
+            self.server_search = True
+            loader.make_lazy()
+            if isinstance(loader, SnapshotLoader):
+                self.load_stats()
+                self.start_sync()
+        with timed('ui.receive_batch'):
+            self.model.receive_batch(batch, done)
+        if self.cache is None:
+            self.advance_high_water_mark(loader.newest)
+            if self.server_search:
+                # Paging keeps the loader open, so live sync cannot wait for it to finish
+                self.start_watch()
+        if first_batch:
+            self.filter_table()
+            with timed('ui.resize_columns'):
+                self.table.resizeColumnsToContents()
+            self.table.horizontalHeader().setStretchLastSection(True)
+        if done or not loader._load_all:
+            self.hide_progress()
+        else:
+            self.show_progress(f"Loading inventory... {loaded:,} of {total or loaded:,}", loaded, total or 0, loader)
+
+    def on_load_error(self, loader, message):
+        if loader is self.loader:
+            self.show_db_error(f"Could not load inventory:\n{message}")
+
+    def on_load_finished(self, loader):
+        if loader is self.loader:
+            self.loader = None
+            self.model.end_stream()
+            self.hide_progress()
+            if diagnostics is not None and not loader.is_cancelled():
+                diagnostics.record('ui.load_data', time.perf_counter() - self.load_started)
+            if self.cache is None and not loader.is_cancelled():
+                self.start_watch()
+                if self.sync_again:
+                    self.start_sync()
+            if isinstance(loader, SnapshotLoader) and not loader.is_cancelled():
+                # With the whole snapshot in memory the counters are cheaper to count here
+                self.stats = InventoryStats(STATS_BY_LOCATION).count(self.model)
+                self.refresh_stats()
+                if self.sync_on_load:
+                    self.start_sync()
+                self.sync_on_load = True
+
+    # --- Live sync: other clients' writes, from the change stream or by polling ---
+    def on_connection_state(self, state, message):
+        if state == 'connected':
+            self.start_sync()
+        self.update_sync_label()
+
+    def on_sync_timer(self):
+        # With a change stream open, polling only has queued offline writes left to send
+        if self.watching and (self.cache is None or not self.cache.pending_count()):
+            return
+        self.start_sync()
+
+    def start_sync(self):
+        # A paged server-search load stays open, and its rows take deltas like any others
+        if self.sync_worker is not None or (self.loader is not None and not self.server_search):
+            self.sync_again = True
+            return
+        if self.connection is not None and not self.connection.is_connected():
+            self.update_sync_label()
+            return
+        self.sync_again = False
+        if self.cache is not None:
+            self.sync_worker = run_in_background(sync_snapshot, self.inventory_col, self.cache, self.needs_reconcile, self.user,
+                                                 on_progress=lambda pulled: self.sync_label.setText(f"Syncing... {pulled:,} rows"),
+                                                 on_result=self.on_synced, on_error=self.on_sync_error,
+                                                 on_finished=self.on_sync_finished)
+        else:
+            self.sync_worker = run_in_background(pull_changes, self.inventory_col, self.high_water_mark,
+                                                 on_result=self.on_synced, on_error=self.on_sync_error,
+                                                 on_finished=self.on_sync_finished)
+        self.update_sync_label()
+
+    def advance_high_water_mark(self, stamp):
+        if stamp is not None and (self.high_water_mark is None or stamp > self.high_water_mark):
+            self.high_water_mark = stamp
+
+    @profiled('ui.apply_sync')
+    def on_synced(self, result):
+        self.needs_reconcile = False
+        self.last_sync = datetime.datetime.now()
+        if self.cache is None:
+            self.advance_high_water_mark(result['newest'])
+        self.start_watch()
+        if result.get('rejected'):
+            QMessageBox.warning(self, "Offline Changes Rejected",
+                                "Some changes made offline were rejected by the database:\n" + "\n".join(result['rejected'][:10]))
+        if self.loader is not None and not self.server_search:
+            # A load is already under way and will pick the changes up
+            return
+        if result['changed'] is None or result.get('rejected') or (not self.server_search and result.get('total', 0) > SERVER_SEARCH_THRESHOLD):
+            # Too many changes to patch row by row, local rows a rejected write left ahead of
+            # the server, or a snapshot grown past the server search threshold; reload instead
+            # (a server search keeps its page and recounts)
+            if self.server_search:
+                self.load_stats()
+            else:
+                self.sync_on_load = False
+                self.load_data()
+            return
+        self.apply_changes(result['changed'], result['deleted'], result.get('before'))
+
+    def apply_changes(self, changed, deleted, before=None):
+        # A copy older than the row's version (a slow pull racing the change stream) is
+        # skipped. A server search only patches the rows it has loaded, but the counters
+        # follow every change: before holds the snapshot's cells for the rest. Without a
+        # snapshot nothing says what an unloaded row was (or whether its change is the echo
+        # of one already counted here), so the counters are recounted instead.
+        model = self.model
+        recount = False
+        for doc in changed:
+            rid = model.rid_for_id(doc['_id'])
+            if rid is None:
+                if not self.server_search:
+                    model.add_row(doc)
+                    self.stats.apply(None, doc)
+                elif before is None:
+                    recount = True
+                else:
+                    old_cell = before.get(doc_key(doc['_id']))
+                    if old_cell is None:
+                        self.stats.apply(None, doc)
+                    elif (doc.get('version') or 0) >= (old_cell.get('version') or 0):
+                        self.stats.apply(old_cell, dict(old_cell, **doc))
+                continue
+            old_doc = model.document(rid)
+            if (doc.get('version') or 0) < (old_doc.get('version') or 0):
+                continue
+            if any(old_doc.get(field) != value for field, value in doc.items()):
+                self.stats.apply(old_doc, dict(old_doc, **doc))
+                model.update_row(rid, doc)
+        for doc_id in deleted:
+            rid = model.rid_for_id(doc_id)
+            if rid is not None:
+                self.stats.apply(model.document(rid), None)
+                model.remove_row(rid)
+            elif self.server_search:
+                if before is None:
+                    recount = True
+                elif before.get(doc_key(doc_id)) is not None:
+                    # None: the snapshot had already dropped it (a delete made here)
+                    self.stats.apply(before[doc_key(doc_id)], None)
+        self.refresh_stats()
+        if recount:
+            self.stats_timer.start()
+
+    def on_sync_error(self, message):
+        print(f"⚠️ Live sync failed: {message}")
+
+    def on_sync_finished(self):
+        self.sync_worker = None
+        self.update_sync_label()
+        if self.sync_again:
+            self.start_sync()
+
+    def start_watch(self):
+        if self.watcher is not None or not self.watch_supported:
+            return
+        if self.connection is not None and not self.connection.is_connected():
+            return
+        self.watcher = start_worker(DbWorker(watch_changes, self.inventory_col, self.cache),
+                                    on_progress=self.on_watch_changes, on_result=self.on_watch_ended,
+                                    on_error=self.on_watch_error, on_finished=self.on_watch_finished,
+                                    pool=self.watch_pool)
+
+    def on_watch_changes(self, payload):
+        if payload is None:
+            # The stream is open; one more pull covers what was written before it started
+            self.watching = True
+            self.start_sync()
+            self.update_sync_label()
+            return
+        changed, deleted, newest, before = payload
+        if self.cache is None:
+            self.advance_high_water_mark(newest)
+        if self.loader is not None and not self.server_search:
+            # The rows being loaded may already hold these; a pull after the load sorts it out
+            self.sync_again = True
+            return
+        self.apply_changes(changed, deleted, before)
+
+    def on_watch_ended(self, reason):
+        if reason:
+            self.watch_supported = False
+            print(f"ℹ️ Change streams unavailable, polling every {SYNC_INTERVAL_S}s instead: {reason}")
+
+    def on_watch_error(self, message):
+        # Polling takes over; the next successful sync opens a new stream
+        print(f"⚠️ Change stream closed: {message}")
+
+    def on_watch_finished(self):
+        self.watcher = None
+        self.watching = False
+        self.update_sync_label()
+
+    def update_sync_label(self):
+        if self.cache is None:
+            return
+        pending = self.cache.pending_count()
+        waiting = f"{pending} change{'s' if pending != 1 else ''} waiting to sync" if pending else ''
+        if self.sync_worker is not None:
+            text = "Syncing..."
+        elif self.connection is not None and not self.connection.is_connected():
+            text = "Offline: showing the local copy" + (f", {waiting}" if waiting else '')
+        elif waiting:
+            text = waiting.capitalize()
+        elif self.watching:
+            text = "Live"
+        elif self.last_sync is not None:
+            text = f"Synced at {self.last_sync:%H:%M}"
+        else:
+            text = ''
+        self.sync_label.setText(text)
+
+    def load_stats(self):
+        # Counts come from the server (or the whole local snapshot), so they cover the
+        # whole collection even when only a page of rows is loaded
+        stats = self.stats
+        inventory_col = self.inventory_col
+        cache = self.cache
+        run_in_background(lambda worker: stats.count(cache) if cache is not None else stats.fetch(inventory_col),
+                          on_result=self.on_stats_loaded, on_error=self.show_db_error)
+
+    def on_stats_loaded(self, stats):
+        self.stats = stats
+        self.refresh_stats()
+
+    @profiled('ui.refresh_stats')
+    def refresh_stats(self):
+        # Counters are seeded by load_stats and kept up to date by the CRUD deltas
+        total = self.stats.total()
+        inuse = self.stats.status['in use']
+        available = self.stats.status['available']
+        retired = self.stats.status['retired']
+        self.total_label.setText(f"Total Items: <b>{total}</b>")
+        self.inuse_label.setText(f"In Use: <b style='color:#4F8FF9'>{inuse}</b>")
+        self.available_label.setText(f"Available: <b style='color:#44b37f'>{available}</b>")
+        self.retired_label.setText(f"Retired: <b style='color:#e06f6c'>{retired}</b>")
+        if self.stats.by_location:
+            locations = [(name or 'Unassigned', count) for name, count in self.stats.location.most_common() if count > 0]
+            self.location_label.setText("By location: " + " · ".join(f"{name} <b>{count}</b>" for name, count in locations[:8]))
+            self.location_label.setToolTip("\n".join(f"{name}: {count}" for name, count in locations))
+
+    @profiled('ui.filter_table')
+    def filter_table(self):
+        raw = self.search_input.text().strip()
+        query = raw.lower()
+        parsed = parse_query(raw)
+        if self.server_search:
+            # Large collections: the query runs on the server against its indexes
+            key = raw if parsed else query
+            if key != self.server_query:
+                self.server_query = key
+                self.model.set_query('')
+                if parsed:
+                    query_filter = parsed.to_filter()
+                elif query:
+                    query_filter = build_indexed_search_filter(query)
+                else:
+                    # No search: page through the snapshot when there is one
+                    query_filter = None if self.cache is not None else {}
+                self.load_data(query_filter)
+            return
+        if query and self.model.canFetchMore():
+            # Searching needs every row, so finish a lazy load; matches fill in as batches arrive
+            self.model.fetch_all()
+            self.show_progress("Loading inventory...", worker=self.loader)
+        started = time.perf_counter()
+        self.model.set_query(parsed or query)
+        # A burst of keystrokes on a large table then costs one search instead of one each
+        wait_ms = int((time.perf_counter() - started) * 2000)
+        self.search_timer.setInterval(min(max(SEARCH_DEBOUNCE_MS, wait_ms), SEARCH_DEBOUNCE_MAX_MS))
+
+    def selected_rids(self):
+        # Row ids of every selected row, stable while a write is in flight
+        return [self.model.rid_at(row) for row in sorted({index.row() for index in self.table.selectionModel().selectedRows()})]
+
+    def save_item(self, op, doc_id, fields, on_saved, text="Saving...", on_conflict=None):
+        # While the server is unreachable, writes go to the snapshot's queue and the next sync replays them
+        offline = self.connection is not None and not self.connection.is_connected()
+        if offline and self.cache is None:
+            self.connection.retry_now()
+            QMessageBox.warning(self, "Not Connected", "The database is not reachable yet. Retrying in the background...")
+            return
+        self.show_progress(text)
+        started = time.perf_counter()
+        def saved(queued):
+            if diagnostics is not None:
+                diagnostics.record(f'ui.save_{op}', time.perf_counter() - started)
+            if isinstance(queued, EditConflict):
+                self.hide_progress()
+                on_conflict(queued.current)
+                return
+            on_saved(queued)
+        run_in_background(write_inventory, self.inventory_col, self.cache, op, doc_id, fields, offline, self.user,
+                          on_result=saved, on_error=self.show_db_error)
+
+    def show_diagnostics(self):
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = DiagnosticsDialog(diagnostics, self)
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
+
+    def show_reports(self):
+        if self.reports_dialog is None:
+            self.reports_dialog = ReportsDialog(self.inventory_col, self)
+        self.reports_dialog.show()
+        self.reports_dialog.raise_()
+
+    def show_history(self):
+        rids = self.selected_rids()
+        if len(rids) != 1:
+            QMessageBox.warning(self, "No Selection", "Please select one item to see its history.")
+            return
+        HistoryDialog(self.inventory_col, self.model.document(rids[0]), self).show()
+
+    def saved_offline_note(self, queued):
+        self.update_sync_label()
+        if not queued:
+            return ""
+        if self.connection is not None:
+            self.connection.retry_now()
+        return "\n\nThe database is unreachable, so the change was saved on this computer and will be sent when the connection returns."
+
+    def check_duplicates(self, serial, device_name, report, exclude_id=None):
+        # Loaded rows answer at once; a server search holds only a page, so the server's
+        # serial_norm index is asked as well
+        def likely(matches):
+            return [(doc, reason) for doc, reason in matches
+                    if doc['_id'] != exclude_id and likely_duplicate(reason, device_name.strip(), doc.get('device_name', ''))]
+        local = likely([(self.model.document(rid), reason) for rid, reason in self.model.similar_rids(serial)])
+        report(local)
+        if self.server_search and (self.connection is None or self.connection.is_connected()):
+            def merge(found):
+                matches = {doc['_id']: (doc, reason) for doc, reason in likely(found) + local}
+                report(list(matches.values()))
+            run_in_background(find_similar_serials, self.inventory_col, serial, on_result=merge,
+                              on_error=lambda message: print(f"⚠️ Duplicate check failed: {message}"))
+
+    def add_item(self):
+        dialog = InventoryDialog(self, check_duplicates=self.check_duplicates)
+        if dialog.exec_() == QDialog.Accepted:
             data = dialog.get_data()
-            self.inventory_col.update_one({'_id': ObjectId(str(row_data['_id']))}, {'$set': data})
-            self.load_data()
-            QMessageBox.information(self, "Item Updated", "Inventory item updated successfully!")
+            # The id is chosen here so a write queued offline keeps it when replayed
+            doc_id = ObjectId()
+            self.save_item('insert', doc_id, data, lambda queued: self.on_item_added(dict(data, _id=doc_id, version=1), queued))
+
+    def on_item_added(self, data, queued=False):
+        self.hide_progress()
+        self.push_undo("add", 'delete_many', [data['_id']], {})
+        # The change stream may have delivered the new row already
+        if self.model.rid_for_id(data['_id']) is None:
+            self.model.add_row(data)
+            self.stats.apply(None, data)
+            self.refresh_stats()
+        QMessageBox.information(self, "Item Added", "Inventory item added successfully!" + self.saved_offline_note(queued))
+
+    def edit_item(self):
+        rids = self.selected_rids()
+        if len(rids) > 1:
+            self.bulk_edit(rids)
+            return
+        if not rids:
+            QMessageBox.warning(self, "No Selection", "Please select an item to edit.")
+            return
+        rid = rids[0]
+        row_data = self.model.document(rid)
+        dialog = InventoryDialog(self, (
+            str(row_data.get('_id', '')),
+            row_data.get('device_name', ''),
+            row_data.get('serial_number', ''),
+            row_data.get('location', ''),
+            row_data.get('status', ''),
+            row_data.get('assigned_to', '')
+        ), check_duplicates=functools.partial(self.check_duplicates, exclude_id=row_data['_id']))
+        if dialog.exec_() == QDialog.Accepted:
+            self.save_edit(rid, row_data, dialog.get_data())
+
+    def save_edit(self, rid, before, data):
+        # Optimistic concurrency: the update only applies while the item is still at the
+        # version it was read at, so an edit made elsewhere meanwhile is never overwritten blindly
+        version = before.get('version')
+        self.save_item('update', before['_id'], dict(data, version=version),
+                       lambda queued: self.on_item_updated(rid, dict(data, version=(version or 0) + 1), queued, before),
+                       on_conflict=lambda current: self.on_edit_conflict(rid, before, data, current))
+
+    def on_edit_conflict(self, rid, before, data, current):
+        if current is None:
+            self.apply_changes([], [before['_id']])
+            QMessageBox.warning(self, "Edit Conflict", "This item was deleted by someone else, so your changes were not saved.")
+            return
+        self.apply_changes([current], [])
+        choice = QMessageBox.question(self, "Edit Conflict",
+                                      "This item was changed by someone else while you were editing it. The table now shows their version.\n\n"
+                                      "Save your changes over theirs?", QMessageBox.Yes | QMessageBox.No)
+        if choice == QMessageBox.Yes:
+            self.save_edit(rid, current, data)
+
+    def on_item_updated(self, rid, data, queued=False, before=None):
+        self.hide_progress()
+        row_data = self.model.document(rid)
+        if row_data is not None:
+            self.push_undo_edit("edit", [before or row_data], data)
+            self.stats.apply(row_data, dict(row_data, **data))
+            self.model.update_row(rid, data)
+            self.refresh_stats()
+        QMessageBox.information(self, "Item Updated", "Inventory item updated successfully!" + self.saved_offline_note(queued))
 
     def delete_item(self):
-        selected = self.table.currentRow()
-        if selected < 0 or selected >= len(self.all_data):
+        rids = self.selected_rids()
+        if len(rids) > 1:
+            self.bulk_delete(rids)
+            return
+        if not rids:
             QMessageBox.warning(self, "No Selection", "Please select an item to delete.")
             return
+        rid = rids[0]
+        row_data = self.model.document(rid)
         confirm = QMessageBox.question(self, "Confirm Delete", "Are you sure you want to delete this item?", QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
-            row_data = self.all_data[selected]
-            self.inventory_col.delete_one({'_id': ObjectId(str(row_data['_id']))})
-            self.load_data()
-            QMessageBox.information(self, "Item Deleted", "Inventory item deleted successfully!")
+            self.save_item('delete', row_data['_id'], {}, lambda queued: self.on_item_deleted(rid, queued), "Deleting...")
+
+    def on_item_deleted(self, rid, queued=False):
+        self.hide_progress()
+        row_data = self.model.document(rid)
+        if row_data is not None:
+            self.push_undo("delete", 'restore', [row_data['_id']], {'docs': [row_data]})
+            self.stats.apply(row_data, None)
+            self.model.remove_row(rid)
+            self.refresh_stats()
+        QMessageBox.information(self, "Item Deleted", "Inventory item deleted successfully!" + self.saved_offline_note(queued))
+
+    # --- Bulk actions: one update_many/delete_many over the selected ids, one view delta ---
+    def bulk_edit(self, rids):
+        dialog = BulkEditDialog(len(rids), self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        if dialog.delete_requested:
+            self.bulk_delete(rids, confirm=False)
+            return
+        changes = dialog.get_changes()
+        before = [self.model.document(rid) for rid in rids]
+        ids = [doc['_id'] for doc in before]
+        self.save_item('update_many', ids, changes, lambda queued: self.on_bulk_updated(rids, before, changes, queued),
+                       f"Saving {len(ids):,} items...")
+
+    def on_bulk_updated(self, rids, before, changes, queued=False):
+        self.hide_progress()
+        self.push_undo_edit(f"edit of {len(rids):,} items", before, changes)
+        # Counted from the current rows, which the change stream may have updated already
+        updates = []
+        for rid, doc in zip(rids, before):
+            current = self.model.document(rid)
+            if current is not None:
+                self.stats.apply(current, dict(current, **changes))
+                updates.append((rid, dict(changes, version=(doc.get('version') or 0) + 1)))
+        self.model.update_rows(updates)
+        self.refresh_stats()
+        QMessageBox.information(self, "Items Updated", f"{len(rids):,} inventory items updated successfully!" + self.saved_offline_note(queued))
+
+    def bulk_delete(self, rids, confirm=True):
+        if confirm and QMessageBox.question(self, "Confirm Delete", f"Are you sure you want to delete these {len(rids):,} items?",
+                                            QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            return
+        before = [self.model.document(rid) for rid in rids]
+        ids = [doc['_id'] for doc in before]
+        self.save_item('delete_many', ids, {}, lambda queued: self.on_bulk_deleted(rids, before, queued), f"Deleting {len(ids):,} items...")
+
+    def on_bulk_deleted(self, rids, before, queued=False):
+        self.hide_progress()
+        self.push_undo(f"delete of {len(rids):,} items", 'restore', [doc['_id'] for doc in before], {'docs': before})
+        for rid in rids:
+            doc = self.model.document(rid)
+            if doc is not None:
+                self.stats.apply(doc, None)
+        self.model.remove_rows(rids)
+        self.refresh_stats()
+        QMessageBox.information(self, "Items Deleted", f"{len(rids):,} inventory items deleted successfully!" + self.saved_offline_note(queued))
+
+    # --- Undo: each entry is the write that reverses a completed change ---
+    def push_undo(self, label, op, ids, fields):
+        self.undo_stack.append((label, op, ids, fields))
+        del self.undo_stack[:-UNDO_LIMIT]
+        self.undo_btn.setEnabled(True)
+        self.undo_btn.setToolTip(f"Undo {label}")
+
+    def push_undo_edit(self, label, before, changes):
+        # Undoing an edit puts back only the fields it changed, so later edits to the
+        # other fields stay; items it did not change have nothing to undo
+        items = []
+        for doc in before:
+            changed = [field for field, value in changes.items() if field not in ('_id', 'version') and doc.get(field) != value]
+            if changed:
+                items.append({'_id': doc['_id'], 'set': {field: doc.get(field, '') for field in changed},
+                              'was': {field: changes[field] for field in changed}})
+        if items:
+            self.push_undo(label, 'revert', [item['_id'] for item in items], {'docs': items})
+
+    def undo(self):
+        if not self.undo_stack or self.progress_label.isVisibleTo(self):
+            return
+        entry = self.undo_stack.pop()
+        label, op, ids, fields = entry
+        self.undo_btn.setEnabled(bool(self.undo_stack))
+        self.undo_btn.setToolTip(f"Undo {self.undo_stack[-1][0]}" if self.undo_stack else "")
+        self.save_item(op, ids, fields, lambda queued: self.on_undone(entry, queued), f"Undoing {label}...")
+
+    def on_undone(self, entry, queued=False):
+        self.hide_progress()
+        label, op, ids, fields = entry
+        model = self.model
+        note = ""
+        if op == 'delete_many':
+            rids = [rid for rid in map(model.rid_for_id, ids) if rid is not None]
+            for rid in rids:
+                self.stats.apply(model.document(rid), None)
+            model.remove_rows(rids)
+        elif op == 'revert':
+            updates = []
+            for item in fields['docs']:
+                rid = model.rid_for_id(item['_id'])
+                if rid is None or item.get('version', 0) is None:
+                    continue
+                doc = model.document(rid)
+                # Queued offline: the version the server will give it on replay
+                version = item['version'] if 'version' in item else (doc.get('version') or 0) + 1
+                self.stats.apply(doc, dict(doc, **item['set']))
+                updates.append((rid, dict(item['set'], version=version)))
+            model.update_rows(updates)
+            left = [item['_id'] for item in fields['docs'] if item.get('version', 0) is None]
+            if left:
+                current = fields.get('current', [])
+                found = {doc_key(doc['_id']) for doc in current}
+                # The table shows the server's copies of the items left alone
+                self.apply_changes(current, [doc_id for doc_id in left if doc_key(doc_id) not in found])
+                note = (f"\n\n{len(left):,} of the items had been changed again by someone else, "
+                        "so they were left as they are now.")
+        else:
+            updates, added = [], []
+            for doc in fields['docs']:
+                rid = model.rid_for_id(doc['_id'])
+                if rid is None:
+                    self.stats.apply(None, doc)
+                    added.append(dict(doc))
+                else:
+                    self.stats.apply(model.document(rid), doc)
+                    updates.append((rid, doc))
+            model.update_rows(updates)
+            model.add_rows(added)
+        self.refresh_stats()
+        QMessageBox.information(self, "Undo", f"Undid the {label}." + note + self.saved_offline_note(queued))
+
+    # --- Scan mode ---
+    def show_scan_mode(self):
+        if self.scan_dialog is None:
+            self.scan_dialog = ScanDialog(self)
+            # Builds the serial map now rather than on the first scan
+            self.model.rid_for_serial('')
+        self.scan_dialog.show()
+        self.scan_dialog.raise_()
+        self.scan_dialog.serial_input.setFocus()
+
+    def scan_serial(self, serial, changes, report):
+        # report(device name or None, result text) fills in the scan log. A server search
+        # holds only a page of rows, so serials it has not loaded are looked up by index.
+        rid = self.model.rid_for_serial(serial)
+        if rid is not None:
+            report(*self.apply_scan(rid, changes))
+        elif self.server_search:
+            inventory_col = self.inventory_col
+            run_in_background(lambda worker: inventory_col.find_one({'serial_number': serial}, INVENTORY_PROJECTION),
+                              on_result=lambda doc: self.on_scan_lookup(doc, changes, report),
+                              on_error=lambda message: report(None, f"Lookup failed: {message}"))
+        else:
+            report(None, "Unknown serial number")
+
+    def on_scan_lookup(self, doc, changes, report):
+        if doc is None:
+            report(None, "Unknown serial number")
+            return
+        rid = self.model.rid_for_id(doc['_id'])
+        if rid is not None:
+            report(*self.apply_scan(rid, changes))
+            return
+        # An earlier scan of the same item may not have reached the server yet
+        doc = dict(doc, **self.write_queue.waiting(doc['_id']))
+        fields = {field: value for field, value in changes.items() if doc.get(field) != value}
+        if fields:
+            self.write_queue.add(doc['_id'], fields)
+            self.stats.apply(doc, dict(doc, **fields))
+            self.refresh_stats()
+        report(doc.get('device_name', ''), self.describe_scan(doc, fields))
+
+    def apply_scan(self, rid, changes):
+        doc = self.model.document(rid)
+        fields = {field: value for field, value in changes.items() if doc.get(field) != value}
+        result = self.describe_scan(doc, fields)
+        if fields:
+            if self.write_queue.add(doc['_id'], fields):
+                # The version the server will have once the batch lands, so a poll in between
+                # cannot put the old values back
+                fields['version'] = (doc.get('version') or 0) + 1
+            self.stats.apply(doc, dict(doc, **fields))
+            self.model.update_row(rid, fields)
+            self.refresh_stats()
+        return doc['device_name'], result
+
+    def describe_scan(self, doc, fields):
+        if not fields:
+            return "No change"
+        return ", ".join(f"{doc.get(field) or '(none)'} → {value or '(none)'}" for field, value in fields.items())
+
+    def on_scan_write_failed(self, message):
+        QMessageBox.warning(self, "Scans Not Saved", "Some scanned changes were rejected by the database:\n" + message)
 
     def export_csv(self):
-        path, _ = QFileDialog.getSaveFileName(self, "Export Inventory", "inventory.csv", "CSV Files (*.csv)")
-        if path:
-            import csv
-            with open(path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Device Name", "Serial Number", "Location", "Status", "Assigned To"])
-                for row in self.all_data:
-                    writer.writerow([
-                        row.get("device_name", ""),
-                        row.get("serial_number", ""),
-                        row.get("location", ""),
-                        row.get("status", ""),
-                        row.get("assigned_to", "")
-                    ])
+        path, selected_filter = QFileDialog.getSaveFileName(self, "Export Inventory", "inventory.csv", ";;".join(EXPORT_FILTERS))
+        if not path:
+            return
+        path = export_path_with_extension(path, selected_filter)
+        raw = self.search_input.text().strip()
+        query = raw.lower()
+        query_filter = {}
+        if query:
+            choice = QMessageBox.question(self, "Export", "Export only the items matching the current search?",
+                                          QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+            if choice == QMessageBox.Cancel:
+                return
+            if choice == QMessageBox.Yes:
+                parsed = parse_query(raw)
+                # The same matches the table shows: word-indexed on the server, substrings in memory
+                if parsed:
+                    query_filter = parsed.to_filter(indexed=self.server_search)
+                else:
+                    query_filter = build_indexed_search_filter(query) if self.server_search else build_search_filter(query)
+        worker = run_in_background(export_inventory, self.inventory_col, path, query_filter,
+                                   on_progress=lambda progress: self.on_export_progress(worker, progress),
+                                   on_result=lambda result: self.on_export_finished(path, result),
+                                   on_error=self.show_db_error)
+        self.show_progress("Exporting...", worker=worker)
+
+    def on_export_progress(self, worker, progress):
+        written, total, rate = progress
+        text = f"Exporting... {written:,}" + (f" of {total:,}" if total else "") + f" rows ({rate:,.0f} rows/s)"
+        self.show_progress(text, min(written, total or 0), total or 0, worker)
+
+    def on_export_finished(self, path, result):
+        self.hide_progress()
+        written, elapsed = result
+        QMessageBox.information(self, "Export Complete", f"Exported {written:,} items to {path} in {elapsed:.1f}s.")
+
+    def import_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Inventory", "", "Inventory Files (*.csv *.csv.gz *.jsonl *.jsonl.gz);;All Files (*)")
+        if not path:
+            return
+        worker = run_in_background(import_inventory, self.inventory_col, path, IMPORT_BATCH_SIZE, self.user,
+                                   on_progress=lambda report: self.show_progress(
+                                       f"Importing... {report['read']:,} rows read, {report['upserted'] + report['updated']:,} saved", worker=worker),
+                                   on_result=self.on_import_finished,
+                                   on_error=self.show_db_error)
+        self.show_progress("Importing...", worker=worker)
+
+    def on_import_finished(self, report):
+        self.hide_progress()
+        QMessageBox.information(self, "Import Complete", format_import_report(report))
+        if self.cache is not None:
+            # The snapshot sync pulls the imported rows and repaints if there are many
+            self.start_sync()
+        else:
+            # A bulk import touches too many rows to patch one by one
+            self.load_data()
+
+# --- Export ---
+EXPORT_FILTERS = [
+    "CSV Files (*.csv)",
+    "Compressed CSV (*.csv.gz)",
+    "JSON Lines (*.jsonl)",
+    "Compressed JSON Lines (*.jsonl.gz)",
+]
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_BATCH_SIZE = 2000
+
+def export_path_with_extension(path, selected_filter):
+    # Some platforms do not append the extension of the chosen filter
+    if not path.lower().endswith(('.csv', '.csv.gz', '.jsonl', '.jsonl.gz')):
+        path += selected_filter[selected_filter.rfind('*') + 1:-1] if '*' in selected_filter else '.csv'
+    return path
+
+def export_format(path):
+    lower = path.lower()
+    if lower.endswith('.gz'):
+        lower = lower[:-3]
+    return 'jsonl' if lower.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+def build_indexed_search_filter(query):
+    # Server search mode for plain text: one bare term, narrowed by the word indexes
+    raw = query.strip()
+    return InventoryQuery([[QueryTerm(None, raw, raw.lower(), 'contains', False)]]).to_filter()
+
+def build_search_filter(query):
+    # Server-side equivalent of the search box: substring match on any displayed column
+    if not query:
+        return {}
+    pattern = {'$regex': re.escape(query), '$options': 'i'}
+    return {'$or': [{field: pattern} for field, _ in INVENTORY_COLUMNS]}
+
+def iter_export_chunks(docs, fmt, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Yields (text, row_count) chunks so callers can write or stream large blocks at once
+    fields = [field for field, _ in INVENTORY_COLUMNS]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow([header for _, header in INVENTORY_COLUMNS])
+    docs = iter(docs)
+    while True:
+        batch = list(itertools.islice(docs, chunk_rows))
+        if fmt == 'csv':
+            writer.writerows([doc.get(field, '') for field in fields] for doc in batch)
+        else:
+            buffer.write(''.join(json.dumps({field: doc.get(field, '') for field in fields}, ensure_ascii=False, default=str) + '\n' for doc in batch))
+        text = buffer.getvalue()
+        if text or batch:
+            yield text, len(batch)
+        if len(batch) < chunk_rows:
+            return
+        buffer.seek(0)
+        buffer.truncate()
+
+def export_inventory(worker, collection, path, query_filter):
+    # Streams a projected cursor to disk; nothing beyond one chunk is held in memory
+    fmt = export_format(path)
+    total = None if query_filter else collection.estimated_document_count()
+    cursor = collection.find(query_filter, INVENTORY_PROJECTION, batch_size=EXPORT_BATCH_SIZE)
+    started = time.monotonic()
+    written = 0
+    try:
+        if path.lower().endswith('.gz'):
+            f = gzip.open(path, 'wt', compresslevel=6, encoding='utf-8', newline='')
+        else:
+            f = open(path, 'w', encoding='utf-8', newline='', buffering=1 << 20)
+        with f:
+            for text, rows in iter_export_chunks(cursor, fmt):
+                if worker.is_cancelled():
+                    break
+                f.write(text)
+                written += rows
+                worker.report((written, total, written / max(time.monotonic() - started, 1e-6)))
+    finally:
+        cursor.close()
+    if worker.is_cancelled():
+        os.remove(path)
+        return None
+    elapsed = time.monotonic() - started
+    if diagnostics is not None:
+        diagnostics.record('export', elapsed, os.path.getsize(path))
+    return written, elapsed
+
+# --- Bulk import ---
+IMPORT_BATCH_SIZE = 1000
+# Accepted column names, by field name or by the table header
+IMPORT_FIELD_NAMES = dict([(field, field) for field, _ in INVENTORY_COLUMNS] +
+                          [(header.lower(), field) for field, header in INVENTORY_COLUMNS])
+
+def normalize_status(value):
+    key = re.sub(r'[\s_-]+', ' ', str(value or '')).strip().lower()
+    for status in STATUS_OPTIONS:
+        if status.lower() == key:
+            return status
+    return None
+
+def normalize_location(value):
+    # Known locations get their canonical spelling; anything else is kept as a custom location
+    location = ' '.join(str(value or '').split())
+    for option in LOCATION_OPTIONS:
+        if option.lower() == location.lower():
+            return option
+    return location
+
+def validate_import_record(raw):
+    # Returns (document, None) or (None, error message)
+    record = {}
+    for key, value in raw.items():
+        field = IMPORT_FIELD_NAMES.get(str(key or '').strip().lower())
+        if field is not None:
+            record[field] = '' if value is None else str(value).strip()
+    if not record.get('serial_number'):
+        return None, "missing serial number"
+    if not record.get('device_name'):
+        return None, "missing device name"
+    status = normalize_status(record.get('status'))
+    if status is None:
+        return None, f"unknown status {record.get('status', '')!r}"
+    return {
+        "device_name": record['device_name'],
+        "serial_number": record['serial_number'],
+        "location": normalize_location(record.get('location')),
+        "status": status,
+        "assigned_to": record.get('assigned_to', ''),
+    }, None
+
+def iter_import_records(path):
+    # Streams (line number, raw record) pairs from CSV or JSON Lines, optionally gzip-compressed
+    opener = gzip.open if path.lower().endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8-sig', newline='') as f:
+        if export_format(path) == 'jsonl':
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield line_no, e
+                    continue
+                yield line_no, record if isinstance(record, dict) else ValueError("not a JSON object")
+        else:
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+
+def upsert_batch(collection, chunk, report, batch_label, user=None):
+    # chunk: [(label, raw record or the Exception that replaced it)], sent as one unordered
+    # bulk_write keyed on serial_number; later rows win when a serial appears twice
+    ops = {}
+    docs = {}
+    for label, raw in chunk:
+        report['read'] += 1
+        doc, error = (None, str(raw)) if isinstance(raw, Exception) else validate_import_record(raw)
+        if error:
+            report['errors'].append(f"{label}: {error}")
+            continue
+        docs[doc['serial_number']] = doc
+        ops[doc['serial_number']] = UpdateOne({'serial_number': doc['serial_number']},
+                                              {'$set': with_search_keys(doc), '$currentDate': {'updated_at': True}, '$inc': {'version': 1}}, upsert=True)
+    if not ops:
+        return
+    serials = list(ops)
+    before = {doc['serial_number']: doc for doc in collection.find({'serial_number': {'$in': serials}}, INVENTORY_PROJECTION)}
+    refused = set()
+    try:
+        result = collection.bulk_write(list(ops.values()), ordered=False)
+        report['upserted'] += result.upserted_count
+        report['updated'] += result.matched_count
+        upserted = result.upserted_ids
+    except BulkWriteError as e:
+        details = e.details
+        report['upserted'] += details.get('nUpserted', 0)
+        report['updated'] += details.get('nMatched', 0)
+        upserted = {item['index']: item['_id'] for item in details.get('upserted', [])}
+        for error in details.get('writeErrors', []):
+            report['errors'].append(f"{batch_label}: {error.get('errmsg', error)}")
+            refused.add(serials[error['index']])
+    ids = {serials[index]: doc_id for index, doc_id in upserted.items()}
+    ids.update((serial, doc['_id']) for serial, doc in before.items())
+    changes = [(before.get(serial), dict(docs[serial], _id=ids[serial])) for serial in serials if serial not in refused and serial in ids]
+    update_rollups(collection, changes)
+    audit_log.add(collection, audit_events('update', changes, user))
+
+def import_inventory(worker, collection, path, batch_size=IMPORT_BATCH_SIZE, user=None):
+    report = {'read': 0, 'upserted': 0, 'updated': 0, 'errors': []}
+    records = iter_import_records(path)
+    batch_no = 0
+    while not worker.is_cancelled():
+        chunk = list(itertools.islice(records, batch_size))
+        if not chunk:
+            break
+        batch_no += 1
+        upsert_batch(collection, [(f"line {line_no}", raw) for line_no, raw in chunk], report, f"batch {batch_no}", user)
+        worker.report(dict(report, batch=batch_no))
+    return report
+
+def format_import_report(report, limit=10):
+    lines = [f"{report['read']:,} rows read: {report['upserted']:,} added, {report['updated']:,} updated, {len(report['errors']):,} rejected."]
+    lines.extend(report['errors'][:limit])
+    if len(report['errors']) > limit:
+        lines.append(f"... and {len(report['errors']) - limit:,} more")
+    return "\n".join(lines)
+
+class ConsoleWorker:
+    # Stands in for DbWorker when a task runs from the command line
+    def __init__(self, on_report=None):
+        self.on_report = on_report
+
+    def is_cancelled(self):
+        return False
+
+    def report(self, value):
+        if self.on_report is not None:
+            self.on_report(value)
+
+# --- Local snapshot cache ---
+# SNAPSHOT_CACHE keeps a SQLite copy of the inventory so the window paints at once and
+# edits keep working while the server is unreachable
+SNAPSHOT_CACHE = config_flag('SNAPSHOT_CACHE', True) and not LAZY_LOAD
+CACHE_PATH = CONFIG.get('CACHE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inventory_cache.db')
+# A sync that changes more rows than this reloads the table instead of patching rows
+SNAPSHOT_DELTA_LIMIT = 5000
+LOGIN_HASH_ITERATIONS = 100000
+
+def doc_key(doc_id):
+    # _id as stored in the snapshot; Extended JSON keeps ObjectIds and other id types apart
+    return json_util.dumps(doc_id)
+
+class SnapshotCache:
+    # Every call opens its own short-lived connection, so worker threads can share one instance
+    def __init__(self, path):
+        self.path = path
+        self.fields = [field for field, _ in INVENTORY_COLUMNS]
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS inventory (id TEXT PRIMARY KEY, {', '.join(self.fields)}, version INTEGER)")
+            if 'version' not in {row[1] for row in conn.execute("PRAGMA table_info(inventory)")}:
+                # Snapshots written before documents carried a version
+                conn.execute("ALTER TABLE inventory ADD COLUMN version INTEGER")
+            conn.execute("CREATE TABLE IF NOT EXISTS pending_writes (seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, id TEXT NOT NULL, fields TEXT NOT NULL, user TEXT, at TEXT)")
+            if 'at' not in {row[1] for row in conn.execute("PRAGMA table_info(pending_writes)")}:
+                # Queues written before replays were credited to who made the change and when
+                conn.execute("ALTER TABLE pending_writes ADD COLUMN user TEXT")
+                conn.execute("ALTER TABLE pending_writes ADD COLUMN at TEXT")
+            conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS logins (username TEXT PRIMARY KEY, salt BLOB, hash BLOB)")
+
+    def connect(self):
+        return contextlib.closing(sqlite3.connect(self.path, timeout=10))
+
+    def count(self):
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+
+    def iter_documents(self, batch_size=LOAD_BATCH_SIZE):
+        # Read in id order one page per connection, so a paged load left open does not hold
+        # a read transaction (and the WAL) while syncs write
+        fields = self.fields
+        last = ''
+        while True:
+            with self.connect() as conn:
+                rows = conn.execute(f"SELECT id, {', '.join(fields)}, version FROM inventory WHERE id > ? ORDER BY id LIMIT ?",
+                                    (last, batch_size)).fetchall()
+            for row in rows:
+                doc = {field: '' if value is None else value for field, value in zip(fields, row[1:-1])}
+                doc['_id'] = json_util.loads(row[0])
+                doc['version'] = row[-1]
+                yield doc
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][0]
+
+    def value_counts(self, field):
+        # The same counts InventoryTableModel.value_counts gives for loaded rows
+        with self.connect() as conn:
+            return {'' if value is None else value: count
+                    for value, count in conn.execute(f"SELECT {field}, COUNT(*) FROM inventory GROUP BY {field}")}
+
+    def _row(self, doc_id, doc):
+        return [doc_key(doc_id)] + [doc.get(field, '') for field in self.fields] + [doc.get('version')]
+
+    def upsert_documents(self, docs):
+        # A copy older than the stored one (a slow pull racing the change stream) is skipped
+        placeholders = ', '.join('?' * (len(self.fields) + 2))
+        assignments = ', '.join(f'{column} = excluded.{column}' for column in self.fields + ['version'])
+        with self.connect() as conn, conn:
+            conn.executemany(f"INSERT INTO inventory VALUES ({placeholders}) ON CONFLICT(id) DO UPDATE SET {assignments} "
+                             "WHERE COALESCE(excluded.version, 0) >= COALESCE(inventory.version, 0)",
+                             [self._row(doc['_id'], doc) for doc in docs])
+
+    def cells(self, ids):
+        # The stored status, location and version of each id (None when the snapshot does
+        # not hold it), keyed by doc_key; read before a pull or the change stream overwrites them
+        keys = [doc_key(doc_id) for doc_id in ids]
+        found = {}
+        with self.connect() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                for key, status, location, version in conn.execute(
+                        f"SELECT id, status, location, version FROM inventory WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+                    found[key] = {'status': status or '', 'location': location or '', 'version': version}
+        return {key: found.get(key) for key in keys}
+
+    def delete_missing(self, server_keys):
+        # Drops rows the server no longer has and returns their ids with their stored cells
+        with self.connect() as conn, conn:
+            missing = [key for (key,) in conn.execute("SELECT id FROM inventory") if key not in server_keys]
+        if not missing:
+            return []
+        cells = self.cells([json_util.loads(key) for key in missing])
+        with self.connect() as conn, conn:
+            conn.executemany("DELETE FROM inventory WHERE id = ?", [(key,) for key in missing])
+        return [(json_util.loads(key), cells[key]) for key in missing]
+
+    def apply(self, op, doc_id, fields):
+        # Mirrors one local write into the snapshot
+        ids = doc_id if op in ('delete_many', 'update_many', 'restore', 'revert') else [doc_id]
+        placeholders = ', '.join('?' * (len(self.fields) + 2))
+        with self.connect() as conn, conn:
+            if op in ('delete', 'delete_many'):
+                conn.executemany("DELETE FROM inventory WHERE id = ?", [(doc_key(i),) for i in ids])
+            elif op == 'insert':
+                conn.execute(f"INSERT OR REPLACE INTO inventory VALUES ({placeholders})", self._row(doc_id, dict(fields, version=1)))
+            elif op == 'restore':
+                conn.executemany(f"INSERT OR REPLACE INTO inventory VALUES ({placeholders})",
+                                 [self._row(doc['_id'], doc) for doc in fields['docs']])
+            elif op == 'revert':
+                # Queued offline: assumed to go through, the next sync corrects the rest
+                for item in fields['docs']:
+                    self._update(conn, [item['_id']], item['set'])
+            else:
+                self._update(conn, ids, fields)
+
+    def restored_versions(self, docs):
+        # What the server will make each restored item's version: one past the newer of the
+        # stored row and the copy being restored
+        with self.connect() as conn:
+            stored = [conn.execute("SELECT version FROM inventory WHERE id = ?", (doc_key(doc['_id']),)).fetchone() for doc in docs]
+        return [max((row[0] or 0) + 1 if row else 0, (doc.get('version') or 0) + 1) for row, doc in zip(stored, docs)]
+
+    def _update(self, conn, ids, fields):
+        # Bumped the way the server will, so a second offline edit expects the right version
+        columns = [f'{field} = ?' for field in self.fields if field in fields]
+        values = [fields[field] for field in self.fields if field in fields]
+        if 'version' in fields:
+            columns.append('version = ?')
+            values.append((fields['version'] or 0) + 1)
+        else:
+            columns.append('version = COALESCE(version, 0) + 1')
+        conn.executemany(f"UPDATE inventory SET {', '.join(columns)} WHERE id = ?",
+                         [values + [doc_key(i)] for i in ids])
+
+    def apply_updates(self, writes, queue=False, user=None):
+        # A batch of (doc_id, fields) updates in one transaction, also queued for replay when asked
+        at = json_util.dumps(audit_now())
+        with self.connect() as conn, conn:
+            for doc_id, fields in writes:
+                self._update(conn, [doc_id], fields)
+            if queue:
+                conn.executemany("INSERT INTO pending_writes (op, id, fields, user, at) VALUES ('update', ?, ?, ?, ?)",
+                                 [(doc_key(doc_id), json_util.dumps(fields), user, at) for doc_id, fields in writes])
+
+    def reset_versions(self, ids):
+        # Lets the server's copy replace rows whose queued writes were rejected
+        with self.connect() as conn, conn:
+            conn.executemany("UPDATE inventory SET version = NULL WHERE id = ?", [(doc_key(i),) for i in ids])
+
+    # --- Writes made while offline, replayed in order by sync_snapshot ---
+    def queue_write(self, op, doc_id, fields, user=None):
+        # Who made the change and when go along, for the audit log once it is replayed
+        with self.connect() as conn, conn:
+            conn.execute("INSERT INTO pending_writes (op, id, fields, user, at) VALUES (?, ?, ?, ?, ?)",
+                         (op, doc_key(doc_id), json_util.dumps(fields), user, json_util.dumps(audit_now())))
+
+    def pending_writes(self):
+        # [(seq, op, id, fields, user, at)]; user and at are None for writes queued by older versions
+        with self.connect() as conn:
+            rows = conn.execute("SELECT seq, op, id, fields, user, at FROM pending_writes ORDER BY seq").fetchall()
+        return [(seq, op, json_util.loads(key), json_util.loads(fields), user, json_util.loads(at) if at else None)
+                for seq, op, key, fields, user, at in rows]
+
+    def drop_write(self, seq):
+        with self.connect() as conn, conn:
+            conn.execute("DELETE FROM pending_writes WHERE seq = ?", (seq,))
+
+    def pending_count(self):
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM pending_writes").fetchone()[0]
+
+    # --- Sync state ---
+    def high_water_mark(self):
+        with self.connect() as conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = 'updated_at'").fetchone()
+        return json_util.loads(row[0]) if row else None
+
+    def set_high_water_mark(self, updated_at):
+        with self.connect() as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state VALUES ('updated_at', ?)", (json_util.dumps(updated_at),))
+
+    # --- Logins, so a user who signed in online can sign in again while offline ---
+    def _hash_password(self, password, salt):
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, LOGIN_HASH_ITERATIONS)
+
+    def remember_login(self, username, password):
+        salt = os.urandom(16)
+        with self.connect() as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO logins VALUES (?, ?, ?)", (username, salt, self._hash_password(password, salt)))
+
+    def verify_login(self, username, password):
+        # None when this user has never signed in online on this computer
+        with self.connect() as conn:
+            row = conn.execute("SELECT salt, hash FROM logins WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return None
+        return hmac.compare_digest(self._hash_password(password, row[0]), row[1])
+
+class SnapshotLoader(InventoryLoader):
+    # Streams the local snapshot in the same batches InventoryLoader reads from the server
+    def __init__(self, cache, batch_size, lazy=False):
+        super().__init__(None, {}, batch_size, lazy)
+        self.cache = cache
+
+    def _open(self):
+        docs = self.cache.iter_documents(self.batch_size)
+        return self.cache.count(), docs, docs.close
+
+# --- Live sync ---
+# Every write stamps updated_at from the server clock and bumps version. Each client pulls
+# only what changed since its high-water mark: from a change stream when the server has
+# them (replica sets), otherwise by polling the updated_at index. Deletes leave a tombstone
+# so the pull can find them too.
+SYNC_INTERVAL_S = config_int('SYNC_INTERVAL_S', 10)
+STATS_RECOUNT_MS = 2000
+# Writes still in flight when a sync reads may carry a slightly older updated_at, so each
+# pull reaches back this far past the high-water mark
+SYNC_OVERLAP = datetime.timedelta(seconds=60)
+# A client away for longer than tombstones are kept starts over with a full pull
+TOMBSTONE_TTL_DAYS = max(1, config_int('TOMBSTONE_TTL_DAYS', 30))
+CHANGE_STREAMS = config_flag('CHANGE_STREAMS', True)
+# Added to every inventory update
+WRITE_STAMP = {'$currentDate': {'updated_at': True}, '$inc': {'version': 1}}
+
+class EditConflict(PyMongoError):
+    # A versioned update lost to someone else's write; current is the server's copy, or None once deleted
+    def __init__(self, current):
+        super().__init__("changed by someone else since it was loaded")
+        self.current = current
+
+def tombstones_for(collection):
+    return collection.database[collection.name + '_tombstones']
+
+def newest_stamp(docs, field, newest=None):
+    # Pops field from every doc and returns the latest value seen
+    for doc in docs:
+        stamp = doc.pop(field, None)
+        if stamp is not None and (newest is None or stamp > newest):
+            newest = stamp
+    return newest
+
+# --- Spill file ---
+# A small SQLite queue for what has to outlive the app before the server has it: audit
+# events, and scanned changes when there is no snapshot to queue them in. It does not
+# depend on SNAPSHOT_CACHE and is only created once something is put in it.
+SPILL_PATH = CONFIG.get('SPILL_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inventory_spill.db')
+
+class SpillQueue:
+    # Items are Extended JSON, grouped by kind and kept in the order they were pushed
+    def __init__(self, path):
+        self.path = path
+        self.ready = False
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self.ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS spill (seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, item TEXT NOT NULL)")
+            conn.commit()
+            self.ready = True
+        return contextlib.closing(conn)
+
+    def push(self, kind, items, replace=()):
+        # Returns the new items' seqs; the items at the replace seqs go in the same transaction
+        with self.connect() as conn, conn:
+            conn.executemany("DELETE FROM spill WHERE seq = ?", [(seq,) for seq in replace])
+            return [conn.execute("INSERT INTO spill (kind, item) VALUES (?, ?)", (kind, json_util.dumps(item))).lastrowid for item in items]
+
+    def items(self, kind, limit=-1):
+        # [(seq, item)], oldest first. Nothing was ever spilled if the file does not exist.
+        if not self.ready and not os.path.exists(self.path):
+            return []
+        with self.connect() as conn:
+            rows = conn.execute("SELECT seq, item FROM spill WHERE kind = ? ORDER BY seq LIMIT ?", (kind, limit)).fetchall()
+        return [(seq, json_util.loads(item)) for seq, item in rows]
+
+    def drop(self, seqs):
+        with self.connect() as conn, conn:
+            conn.executemany("DELETE FROM spill WHERE seq = ?", [(seq,) for seq in seqs])
+
+    def count(self, kind):
+        if not self.ready and not os.path.exists(self.path):
+            return 0
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM spill WHERE kind = ?", (kind,)).fetchone()[0]
+
+spill_queue = SpillQueue(SPILL_PATH)
+
+# --- Audit log ---
+# Every write appends one small event per item to inventory_audit: the fields that changed
+# with their new values, who and when. Every AUDIT_CHECKPOINT_EVERY versions (and on add
+# or restore) the event carries the whole item as well, so the state at any moment is the
+# newest checkpoint before it plus the diffs after. The before images come back from the
+# write itself (find_one_and_update/find_one_and_delete) or from the one read a batch makes
+# anyway. The events are committed to the spill file before the write is reported done and
+# sent in batches by AuditLog, so an edit costs a local commit rather than a round trip to
+# the server, and events survive the app being closed or killed until the server has them.
+AUDIT_RETENTION_DAYS = config_int('AUDIT_RETENTION_DAYS', 730)
+AUDIT_CHECKPOINT_EVERY = max(1, config_int('AUDIT_CHECKPOINT_EVERY', 20))
+AUDIT_FLUSH_MS = config_int('AUDIT_FLUSH_MS', 1000)
+AUDIT_BATCH = 500
+# Events kept back while the server is unreachable before the oldest are dropped
+AUDIT_MAX_PENDING = 100000
+AUDIT_HISTORY_LIMIT = 500
+AUDIT_FIELDS = [field for field, _ in INVENTORY_COLUMNS]
+
+def audit_for(collection):
+    return collection.database[collection.name + '_audit']
+
+def audit_now():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def audit_events(op, changes, user, at=None):
+    # changes: [(before or None, after or None)] with _id, as apply_inventory_write returns them;
+    # at is when the change was made, if not now (an offline write replayed later)
+    at = at or audit_now()
+    events = []
+    for before, after in changes:
+        event = {'asset': (after or before)['_id'], 'at': at, 'user': user}
+        if after is None:
+            events.append(dict(event, op='delete'))
+            continue
+        event['op'] = 'restore' if op == 'restore' else 'insert' if before is None else 'update'
+        if event['op'] == 'restore':
+            event['v'] = after.get('version')
+        else:
+            event['v'] = 1 if before is None else (before.get('version') or 0) + 1
+        if before is not None:
+            event['set'] = {field: after[field] for field in AUDIT_FIELDS if field in after and after[field] != before.get(field)}
+            if not event['set'] and event['op'] == 'update':
+                continue
+        if event['op'] != 'update' or event['v'] % AUDIT_CHECKPOINT_EVERY == 0:
+            event['state'] = {field: after.get(field, '') for field in AUDIT_FIELDS}
+        events.append(event)
+    return events
+
+def insert_audit(collection, events):
+    # A retried batch that partly arrived before only repeats the _ids it already has
+    for start in range(0, len(events), AUDIT_BATCH):
+        try:
+            audit_for(collection).insert_many(events[start:start + AUDIT_BATCH], ordered=False)
+        except BulkWriteError as e:
+            rejected = [error for error in e.details.get('writeErrors', []) if error.get('code') != 11000]
+            if rejected:
+                print(f"⚠️ Audit log refused {len(rejected):,} events: {rejected[0].get('errmsg')}")
+
+class AuditLog:
+    # A background thread sends what is in the spill file at least every AUDIT_FLUSH_MS, or
+    # sooner once AUDIT_BATCH events wait, and drops each batch from the file once the
+    # server has it. While the server is unreachable the events stay where they are, and
+    # the next start sends what is left.
+    def __init__(self, spill):
+        self.spill = spill
+        self.collections = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.waiting = 0
+
+    def add(self, collection, events):
+        if not events:
+            return
+        self.collections[collection.full_name] = collection
+        events = [dict(event, _id=ObjectId()) for event in events]
+        try:
+            self.spill.push('audit', [{'collection': collection.full_name, 'event': event} for event in events])
+        except sqlite3.Error as e:
+            # Nowhere to keep them: better a round trip now than a gap in the history
+            print(f"⚠️ Could not keep audit events on this computer, sending them now: {e}")
+            try:
+                insert_audit(collection, events)
+            except PyMongoError as e:
+                print(f"⚠️ Audit log not written, {len(events):,} events lost: {e}")
+            return
+        self.waiting += len(events)
+        self.start()
+        if self.waiting >= AUDIT_BATCH:
+            self.wake.set()
+
+    def start(self):
+        # Also called on startup, to send events left over from the last run
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='audit-log', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wake.wait(AUDIT_FLUSH_MS / 1000)
+            self.wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not read the audit events kept on this computer: {e}")
+
+    def _collection(self, full_name):
+        collection = self.collections.get(full_name)
+        if collection is None:
+            # Left over from the last run
+            db_name, name = full_name.split('.', 1)
+            collection = self.collections[full_name] = get_client()[db_name][name]
+        return collection
+
+    def flush(self):
+        # Returns False when some events could not be written and were kept for later
+        with self.lock:
+            self.waiting = 0
+            overflow = self.spill.count('audit') - AUDIT_MAX_PENDING
+            if overflow > 0:
+                self.spill.drop([seq for seq, _ in self.spill.items('audit', overflow)])
+                print(f"⚠️ Audit log backlog full, dropped the {overflow:,} oldest events")
+            while True:
+                pending = self.spill.items('audit', AUDIT_BATCH)
+                if not pending:
+                    return True
+                batches = {}
+                for seq, item in pending:
+                    batch = batches.setdefault(item['collection'], ([], []))
+                    batch[0].append(seq)
+                    batch[1].append(item['event'])
+                for full_name, (seqs, events) in batches.items():
+                    try:
+                        insert_audit(self._collection(full_name), events)
+                    except PyMongoError as e:
+                        print(f"⚠️ Audit log not written, will retry: {e}")
+                        return False
+                    self.spill.drop(seqs)
+                if len(pending) < AUDIT_BATCH:
+                    return True
+
+audit_log = AuditLog(spill_queue)
+
+def load_history(worker, collection, doc_id, limit=AUDIT_HISTORY_LIMIT):
+    # One item's newest events, straight off the (asset, at) index
+    return list(audit_for(collection).find({'asset': doc_id}, {'asset': 0}).sort('at', DESCENDING).limit(limit))
+
+def reconstruct_item(worker, collection, doc_id, when):
+    # The item as it was at `when` (naive UTC): the newest checkpoint before it, then the
+    # diffs after that. state is None when the item did not exist or was deleted by then.
+    # complete is False when no checkpoint is left to start from, because it expired or the
+    # item predates the audit log; state then holds only the fields changed since.
+    audit = audit_for(collection)
+    checkpoint = audit.find_one({'asset': doc_id, 'at': {'$lte': when}, 'state': {'$exists': True}}, sort=[('at', DESCENDING), ('_id', DESCENDING)])
+    query = {'asset': doc_id, 'at': {'$lte': when}}
+    state = None
+    if checkpoint is not None:
+        state = dict(checkpoint['state'])
+        query['$or'] = [{'at': {'$gt': checkpoint['at']}}, {'at': checkpoint['at'], '_id': {'$gt': checkpoint['_id']}}]
+    replayed = 0
+    for event in audit.find(query).sort([('at', ASCENDING), ('_id', ASCENDING)]):
+        replayed += 1
+        if event['op'] == 'delete':
+            state = None
+        elif 'state' in event:
+            state = dict(event['state'])
+        else:
+            state = dict(state or {}, **event.get('set', {}))
+    complete = checkpoint is not None
+    if not complete and not replayed:
+        # Nothing recorded by then: fine if the item was added later, unknown otherwise
+        first = audit.find_one({'asset': doc_id}, {'op': 1}, sort=[('at', ASCENDING), ('_id', ASCENDING)])
+        complete = first is not None and first['op'] == 'insert'
+    return {'state': state, 'complete': complete, 'events': replayed}
+
+def record_tombstones(collection, ids):
+    tombstones_for(collection).bulk_write([UpdateOne({'_id': doc_id}, {'$currentDate': {'deleted_at': True}}, upsert=True)
+                                           for doc_id in ids], ordered=False)
+
+def apply_inventory_write(collection, op, doc_id, fields, user=None, at=None):
+    # The *_many ops, restore and revert take a list of ids; restore upserts fields['docs']
+    # whole, revert puts back only the fields an edit changed (see below).
+    # An update whose fields carry the version it was read at only applies if nobody wrote
+    # in between, and raises EditConflict otherwise. The rollup cells and the audit log
+    # follow each write; at is when a replayed offline write was made. Returns the (before,
+    # after) documents it changed.
+    stamp = WRITE_STAMP
+    changes = []
+    if op == 'delete':
+        before = collection.find_one_and_delete({'_id': doc_id}, projection=INVENTORY_PROJECTION)
+        if before is not None:
+            changes.append((before, None))
+        record_tombstones(collection, [doc_id])
+    elif op == 'delete_many':
+        before = list(collection.find({'_id': {'$in': doc_id}}, INVENTORY_PROJECTION))
+        collection.delete_many({'_id': {'$in': doc_id}})
+        changes = [(doc, None) for doc in before]
+        record_tombstones(collection, doc_id)
+    elif op == 'update_many':
+        before = list(collection.find({'_id': {'$in': doc_id}}, INVENTORY_PROJECTION))
+        collection.update_many({'_id': {'$in': doc_id}}, {'$set': with_search_keys(fields), **stamp})
+        changes = [(doc, dict(doc, **fields)) for doc in before]
+    elif op == 'restore':
+        docs = fields['docs']
+        ids = [doc['_id'] for doc in docs]
+        before = {doc_key(doc['_id']): doc for doc in collection.find({'_id': {'$in': ids}}, INVENTORY_PROJECTION)}
+        # A restored item gets a version past both the server's and the restored copy's, so
+        # no client can take it for an older copy: items still there are bumped first (which
+        # also refuses an edit racing the undo), then raised past the copy being put back
+        existing = [doc['_id'] for doc in docs if doc_key(doc['_id']) in before]
+        if existing:
+            collection.update_many({'_id': {'$in': existing}}, {'$inc': {'version': 1}})
+        collection.bulk_write([UpdateOne({'_id': doc['_id']}, {'$set': with_search_keys({key: value for key, value in doc.items() if key not in ('_id', 'version')}),
+                                                               '$currentDate': {'updated_at': True}, '$max': {'version': (doc.get('version') or 0) + 1}}, upsert=True)
+                               for doc in docs], ordered=False)
+        versions = {doc_key(doc['_id']): doc.get('version') for doc in collection.find({'_id': {'$in': ids}}, {'version': 1})}
+        changes = [(before.get(doc_key(doc['_id'])), dict(doc, version=versions.get(doc_key(doc['_id'])))) for doc in docs]
+        tombstones_for(collection).delete_many({'_id': {'$in': ids}})
+    elif op == 'revert':
+        # fields['docs']: [{'_id', 'set': values before the edit, 'was': values the edit wrote}].
+        # Only items whose fields still hold what the edit wrote are put back, at the version
+        # just read like any versioned update, so writes made since to other fields stay and
+        # writes to the same fields are not overwritten. The items left alone are the ones
+        # missing from the changes returned.
+        items = fields['docs']
+        current = {doc_key(doc['_id']): doc for doc in collection.find({'_id': {'$in': [item['_id'] for item in items]}}, INVENTORY_PROJECTION)}
+        ready = [(current[doc_key(item['_id'])], item) for item in items
+                 if doc_key(item['_id']) in current and all(current[doc_key(item['_id'])].get(field) == value for field, value in item['was'].items())]
+        if ready:
+            result = collection.bulk_write([UpdateOne({'_id': doc['_id'], 'version': doc.get('version')}, {'$set': with_search_keys(item['set']), **stamp})
+                                            for doc, item in ready], ordered=False)
+            if result.matched_count < len(ready):
+                # Someone wrote in between the read and the update: keep the ones that landed
+                wanted = {doc_key(item['_id']): item['set'] for _, item in ready}
+                landed = {doc_key(doc['_id']) for doc in collection.find({'_id': {'$in': [doc['_id'] for doc, _ in ready]}}, INVENTORY_PROJECTION)
+                          if all(doc.get(field) == value for field, value in wanted[doc_key(doc['_id'])].items())}
+                ready = [(doc, item) for doc, item in ready if doc_key(doc['_id']) in landed]
+        changes = [(doc, dict(doc, **item['set'], version=(doc.get('version') or 0) + 1)) for doc, item in ready]
+    else:
+        query = {'_id': doc_id}
+        if 'version' in fields:
+            # None matches documents written before versioning
+            query['version'] = fields['version']
+        fields = with_search_keys({key: value for key, value in fields.items() if key not in ('_id', 'version')})
+        before = collection.find_one_and_update(query, {'$set': fields, **stamp}, projection=INVENTORY_PROJECTION,
+                                                upsert=(op == 'insert'), return_document=ReturnDocument.BEFORE)
+        if before is not None:
+            changes.append((before, dict(before, **fields)))
+        elif 'version' in query:
+            raise EditConflict(collection.find_one({'_id': doc_id}, INVENTORY_PROJECTION))
+        elif op == 'insert':
+            changes.append((None, dict(fields, _id=doc_id)))
+    update_rollups(collection, changes)
+    audit_log.add(collection, audit_events(op, changes, user, at))
+    return changes
+
+def write_inventory(worker, collection, cache, op, doc_id, fields, offline=False, user=None):
+    # Returns True when the write was queued in the snapshot instead of reaching the server,
+    # or the EditConflict when a versioned update was refused
+    queued = offline and cache is not None
+    if not queued:
+        try:
+            changes = apply_inventory_write(collection, op, doc_id, fields, user)
+            if op == 'restore':
+                # The window and the snapshot take the versions the server gave the restored items
+                versions = {doc_key(after['_id']): after['version'] for _, after in changes}
+                for doc in fields['docs']:
+                    doc['version'] = versions.get(doc_key(doc['_id']))
+            elif op == 'revert':
+                # Reverted items take the versions the server gave them; those left alone get
+                # version None, and fields['current'] holds the server's copies of them
+                versions = {doc_key(after['_id']): after['version'] for _, after in changes}
+                for item in fields['docs']:
+                    item['version'] = versions.get(doc_key(item['_id']))
+                left = [item['_id'] for item in fields['docs'] if item['version'] is None]
+                fields['current'] = list(collection.find({'_id': {'$in': left}}, INVENTORY_PROJECTION)) if left else []
+        except ConnectionFailure:
+            if cache is None:
+                raise
+            queued = True
+        except EditConflict as conflict:
+            if cache is not None:
+                if conflict.current is None:
+                    cache.apply('delete', doc_id, {})
+                else:
+                    cache.upsert_documents([conflict.current])
+            return conflict
+    if cache is not None:
+        if queued:
+            cache.queue_write(op, doc_id, fields, user)
+            if op == 'restore':
+                # Queued with the restored copies' versions; shown with the ones the server will give
+                for doc, version in zip(fields['docs'], cache.restored_versions(fields['docs'])):
+                    doc['version'] = version
+        if op == 'revert' and not queued:
+            cache.upsert_documents([after for _, after in changes] + fields['current'])
+        else:
+            cache.apply(op, doc_id, fields)
+    return queued
+
+def pull_changes(worker, collection, since, refetch=(), on_batch=None):
+    # Documents written and ids deleted since the high-water mark (everything when since is
+    # None), as {changed, deleted, newest, full}. changed turns None past SNAPSHOT_DELTA_LIMIT.
+    if since is not None and since < datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(days=TOMBSTONE_TTL_DAYS):
+        # Tombstones that old may have expired already
+        since = None
+    result = {'changed': [], 'deleted': [], 'newest': since, 'full': since is None}
+    query = {} if since is None else {'updated_at': {'$gte': since - SYNC_OVERLAP}}
+    if refetch and query:
+        query = {'$or': [query, {'_id': {'$in': list(refetch)}}]}
+    pulled = 0
+    changed = result['changed']
+    cursor = collection.find(query, dict(INVENTORY_PROJECTION, updated_at=1), batch_size=EXPORT_BATCH_SIZE)
+    try:
+        while not worker.is_cancelled():
+            batch = list(itertools.islice(cursor, EXPORT_BATCH_SIZE))
+            if not batch:
+                break
+            result['newest'] = newest_stamp(batch, 'updated_at', result['newest'])
+            if on_batch is not None:
+                on_batch(batch)
+            pulled += len(batch)
+            if changed is not None:
+                changed.extend(batch)
+                if len(changed) > SNAPSHOT_DELTA_LIMIT:
+                    changed = result['changed'] = None
+            worker.report(pulled)
+    finally:
+        cursor.close()
+    if worker.is_cancelled():
+        return None
+    if since is not None:
+        tombstones = list(tombstones_for(collection).find({'deleted_at': {'$gte': since - SYNC_OVERLAP}}))
+        result['newest'] = newest_stamp(tombstones, 'deleted_at', result['newest'])
+        ids = [tombstone['_id'] for tombstone in tombstones]
+        if ids:
+            # An undo may have brought a deleted id back since its tombstone was read
+            restored = {doc_key(doc['_id']) for doc in collection.find({'_id': {'$in': ids}}, {'_id': 1})}
+            result['deleted'] = [doc_id for doc_id in ids if doc_key(doc_id) not in restored]
+    return result
+
+def sync_snapshot(worker, collection, cache, reconcile=False, user=None):
+    # Replays queued offline writes, then pulls what changed since the high-water mark.
+    # Tombstones cover the app's own deletes; ids are also compared with the server when
+    # asked to (reconcile), after a full pull, or when the row counts disagree.
+    replayed = 0
+    rejected = []
+    refetch = []
+    for seq, op, doc_id, fields, queued_by, queued_at in cache.pending_writes():
+        try:
+            # Credited to whoever made the change, when they made it; writes queued before
+            # the snapshot kept those go to whoever is signed in now
+            apply_inventory_write(collection, op, doc_id, fields, queued_by or user, queued_at)
+            replayed += 1
+        except ConnectionFailure:
+            # Still offline; the rest of the queue waits for the next sync
+            raise
+        except PyMongoError as e:
+            ids = doc_id if isinstance(doc_id, list) else [doc_id]
+            rejected.append(f"{op} {fields.get('serial_number') or (f'{len(ids)} items' if len(ids) > 1 else ids[0])}: {e}")
+            # Put back the server's copy of anything a rejected write had changed locally
+            refetch.extend(ids)
+        cache.drop_write(seq)
+    if refetch:
+        cache.reset_versions(refetch)
+    high_water_mark = cache.high_water_mark()
+    # The snapshot's cells from before the pull, so the window can move its counters for
+    # rows a server search has not loaded (None: the snapshot did not hold the row)
+    before = {}
+
+    def on_batch(docs):
+        before.update(cache.cells([doc['_id'] for doc in docs]))
+        cache.upsert_documents(docs)
+
+    result = pull_changes(worker, collection, high_water_mark, refetch, on_batch)
+    if result is None:
+        return None
+    result.update(replayed=replayed, rejected=rejected, before=before)
+    if result['deleted']:
+        before.update(cache.cells(result['deleted']))
+        cache.apply('delete_many', result['deleted'], {})
+    if reconcile or refetch or result['full'] or collection.estimated_document_count() != cache.count():
+        # A count mismatch after the pull means rows were deleted outside the app
+        server_keys = {doc_key(doc['_id']) for doc in collection.find({}, {'_id': 1}, batch_size=10000)}
+        for doc_id, cell in cache.delete_missing(server_keys):
+            result['deleted'].append(doc_id)
+            before[doc_key(doc_id)] = cell
+    if result['newest'] is not None and result['newest'] != high_water_mark:
+        cache.set_high_water_mark(result['newest'])
+    result['total'] = cache.count()
+    return result
+
+def watch_changes(worker, collection, cache):
+    # Reports (changed, deleted, newest, before) as writes land on the server, mirrored into
+    # the snapshot first (before holds the snapshot's cells they replaced, as in
+    # sync_snapshot, and is None without one), and reports None once the stream is open. Returns the server's reason
+    # when it has no change streams (a standalone mongod); the caller keeps polling then.
+    pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}}}]
+    try:
+        stream = collection.watch(pipeline, full_document='updateLookup', max_await_time_ms=500)
+    except OperationFailure as e:
+        return str(e)
+    fields = list(INVENTORY_PROJECTION) + ['updated_at']
+    with stream:
+        worker.report(None)
+        while not worker.is_cancelled() and stream.alive:
+            # Drain what is waiting so a burst of writes reaches the window as one delta
+            changed, deleted = {}, {}
+            change = stream.try_next()
+            while change is not None:
+                doc_id = change['documentKey']['_id']
+                key = doc_key(doc_id)
+                if change['operationType'] == 'delete':
+                    changed.pop(key, None)
+                    deleted[key] = doc_id
+                elif change.get('fullDocument') is not None:
+                    doc = change['fullDocument']
+                    deleted.pop(key, None)
+                    changed[key] = dict({field: doc[field] for field in fields if field in doc}, _id=doc_id)
+                if len(changed) + len(deleted) >= EXPORT_BATCH_SIZE:
+                    break
+                change = stream.try_next()
+            if not changed and not deleted:
+                continue
+            changed = list(changed.values())
+            deleted = list(deleted.values())
+            newest = newest_stamp(changed, 'updated_at')
+            before = None
+            if cache is not None:
+                before = cache.cells([doc['_id'] for doc in changed] + deleted)
+                cache.upsert_documents(changed)
+                cache.apply('delete_many', deleted, {})
+                high_water_mark = cache.high_water_mark()
+                if newest is not None and (high_water_mark is None or newest > high_water_mark):
+                    cache.set_high_water_mark(newest)
+            worker.report((changed, deleted, newest, before))
+
+# --- Scan mode: write-behind queue ---
+# Scans update the table at once; their writes are batched into one bulk_write per
+# WRITE_BEHIND_FLUSH_MS, or sooner once WRITE_BEHIND_BATCH items are waiting
+WRITE_BEHIND_FLUSH_MS = max(50, config_int('WRITE_BEHIND_FLUSH_MS', 1000))
+WRITE_BEHIND_BATCH = max(1, config_int('WRITE_BEHIND_BATCH', 200))
+# On close, how long the window waits for a batch already on its way to the server
+WRITE_BEHIND_DRAIN_MS = max(0, config_int('WRITE_BEHIND_DRAIN_MS', 5000))
+
+def flush_writes(worker, collection, cache, writes, offline=False, user=None):
+    # writes: [(doc_id, fields)] sent as one unordered bulk_write. Returns (queued, errors):
+    # queued when the batch was spilled to the snapshot's offline queue for sync_snapshot
+    # to replay, errors for items the server refused.
+    queued = offline and cache is not None
+    errors = []
+    if not queued:
+        ids = [doc_id for doc_id, _ in writes]
+        before = list(collection.find({'_id': {'$in': ids}}, INVENTORY_PROJECTION))
+        refused = set()
+        try:
+            collection.bulk_write([UpdateOne({'_id': doc_id}, {'$set': with_search_keys(fields), **WRITE_STAMP}) for doc_id, fields in writes], ordered=False)
+        except ConnectionFailure:
+            if cache is None:
+                raise
+            queued = True
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            errors = [error.get('errmsg', str(error)) for error in write_errors]
+            refused = {doc_key(writes[error['index']][0]) for error in write_errors}
+        if not queued:
+            fields_by_key = {doc_key(doc_id): fields for doc_id, fields in writes}
+            changes = [(doc, dict(doc, **fields_by_key[doc_key(doc['_id'])])) for doc in before if doc_key(doc['_id']) not in refused]
+            update_rollups(collection, changes)
+            audit_log.add(collection, audit_events('update', changes, user))
+    if cache is not None:
+        cache.apply_updates(writes, queue=queued, user=user)
+    return queued, errors
+
+class WriteBehindQueue(QObject):
+    # Updates to the same item merge while they wait. A batch that fails goes back in front
+    # and is retried with backoff; with a snapshot, a dropped connection spills it to the
+    # offline queue on disk instead, so nothing scanned is lost if the app closes. Without
+    # one, what is waiting while the connection is down (or when the app closes) is copied
+    # to the spill file, and the next start picks it up from there.
+    changed = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, collection, cache=None, connection=None, parent=None, user=None):
+        super().__init__(parent)
+        self.collection = collection
+        self.cache = cache
+        self.connection = connection
+        self.user = user
+        self.pending = {}
+        self.in_flight = []
+        self.worker = None
+        self.delay = WRITE_BEHIND_FLUSH_MS
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+        self.on_drained = None
+        self.drain_timer = QTimer(self)
+        self.drain_timer.setSingleShot(True)
+        self.drain_timer.timeout.connect(self.finish_drain)
+        # Seqs of the spill file's copy of what is waiting
+        self.spilled = []
+        if cache is None:
+            self.load_spilled()
+
+    def __len__(self):
+        return len(self.pending) + len(self.in_flight)
+
+    def add(self, doc_id, fields):
+        # True when the item was not already waiting, i.e. the server will bump its version once more
+        key = doc_key(doc_id)
+        entry = self.pending.get(key)
+        if entry is None:
+            self.pending[key] = (doc_id, dict(fields))
+        else:
+            entry[1].update(fields)
+        if len(self.pending) >= WRITE_BEHIND_BATCH:
+            self.flush()
+        elif not self.timer.isActive():
+            self.timer.start(self.delay)
+        self.changed.emit()
+        return entry is None
+
+    def waiting(self, doc_id):
+        # The fields still on their way to the server for one item
+        key = doc_key(doc_id)
+        fields = {}
+        for write_id, write_fields in self.in_flight:
+            if doc_key(write_id) == key:
+                fields.update(write_fields)
+        fields.update(self.pending.get(key, (None, {}))[1])
+        return fields
+
+    def flush(self):
+        # One batch in flight at a time; the next goes out when it finishes
+        if self.worker is not None or not self.pending:
+            return
+        self.timer.stop()
+        offline = self.connection is not None and not self.connection.is_connected()
+        if offline and self.cache is None:
+            self.keep_on_disk()
+            self.connection.retry_now()
+            if self.on_drained is None:
+                self.timer.start(self.delay)
+            return
+        writes = list(self.pending.values())
+        self.pending = {}
+        self.in_flight = writes
+        self.worker = run_in_background(flush_writes, self.collection, self.cache, writes, offline, self.user,
+                                        on_result=self.on_flushed,
+                                        on_error=lambda message: self.on_flush_error(writes, message),
+                                        on_finished=self.on_flush_finished)
+
+    def on_flushed(self, result):
+        queued, errors = result
+        self.delay = WRITE_BEHIND_FLUSH_MS
+        if queued and self.connection is not None:
+            self.connection.retry_now()
+        if errors:
+            self.failed.emit("\n".join(errors[:10]))
+
+    def on_flush_error(self, writes, message):
+        print(f"⚠️ Saving {len(writes):,} scanned changes failed, retrying in {self.delay / 1000:.1f}s: {message}")
+        # Later scans of the same item win over the batch that failed
+        pending = {doc_key(doc_id): (doc_id, fields) for doc_id, fields in writes}
+        for key, (doc_id, fields) in self.pending.items():
+            if key in pending:
+                pending[key][1].update(fields)
+            else:
+                pending[key] = (doc_id, fields)
+        self.pending = pending
+        self.delay = min(self.delay * 2, CONNECT_BACKOFF_MAX_MS)
+        if self.connection is not None:
+            self.connection.retry_now()
+
+    def on_flush_finished(self):
+        self.worker = None
+        self.in_flight = []
+        if self.spilled:
+            # What reached the server leaves the spill file's copy
+            self.keep_on_disk()
+        if self.on_drained is not None:
+            # Closing: without a snapshot, what came back or arrived meanwhile gets one more try
+            if self.pending and self.cache is None:
+                self.flush()
+            if self.worker is None:
+                self.finish_drain()
+        elif len(self.pending) >= WRITE_BEHIND_BATCH:
+            self.flush()
+        elif self.pending:
+            self.timer.start(self.delay)
+        self.changed.emit()
+
+    # --- Without a snapshot ---
+    def load_spilled(self):
+        try:
+            spilled = spill_queue.items('scans')
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not read the scanned changes kept on this computer: {e}")
+            return
+        for seq, item in spilled:
+            key = doc_key(item['id'])
+            if key in self.pending:
+                self.pending[key][1].update(item['fields'])
+            else:
+                self.pending[key] = (item['id'], item['fields'])
+            self.spilled.append(seq)
+        if self.pending:
+            print(f"ℹ️ Sending {len(self.pending):,} scanned changes kept from the last run")
+            self.timer.start(self.delay)
+
+    def keep_on_disk(self):
+        # Replaces the spill file's copy with what is still unsaved; False if it could not
+        writes = self.in_flight + list(self.pending.values())
+        try:
+            self.spilled = spill_queue.push('scans', [{'id': doc_id, 'fields': fields} for doc_id, fields in writes], self.spilled)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not keep {len(writes):,} scanned changes on this computer: {e}")
+            return False
+        return True
+
+    # --- On close ---
+    # Nothing here blocks the GUI thread. With a snapshot, what is waiting goes to its offline
+    # queue at once for the next sync to send. The batch in flight (and, without a snapshot,
+    # what is waiting) gets WRITE_BEHIND_DRAIN_MS to reach the server; then on_drained(saved)
+    # is called and anything still unsaved is spilled to the snapshot or the spill file. A
+    # batch that lands after all is only sent again with the same values. saved is False
+    # when some changes could not be kept anywhere.
+    def drain(self, on_drained):
+        self.timer.stop()
+        self.on_drained = on_drained
+        if self.cache is not None:
+            self.spill(list(self.pending.values()))
+        else:
+            self.flush()
+        # Even with nothing in flight on_drained comes from the event loop, not from inside
+        # the closeEvent that started the drain
+        self.drain_timer.start(WRITE_BEHIND_DRAIN_MS if self.worker is not None else 0)
+
+    def spill(self, writes):
+        try:
+            self.cache.apply_updates(writes, queue=True, user=self.user)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not keep {len(writes):,} scanned changes on this computer: {e}")
+            return
+        for doc_id, _ in writes:
+            self.pending.pop(doc_key(doc_id), None)
+
+    def finish_drain(self):
+        if self.on_drained is None:
+            return
+        self.drain_timer.stop()
+        if self.cache is not None:
+            # The batch in flight first, so later scans of the same item win on replay
+            self.spill((self.in_flight if self.worker is not None else []) + list(self.pending.values()))
+            if not self.pending:
+                self.in_flight = []
+        elif (self.pending or self.in_flight) and self.keep_on_disk():
+            # The next start sends them, so a batch landing now leaves the file alone
+            self.pending = {}
+            self.in_flight = []
+            self.spilled = []
+        on_drained, self.on_drained = self.on_drained, None
+        on_drained(not self.pending and not self.in_flight)
+        self.changed.emit()
+
+    def resume(self):
+        # The window stayed open after all
+        if self.pending and self.worker is None:
+            self.timer.start(self.delay)
 
 from PyQt5.QtWidgets import QComboBox
 
 class InventoryDialog(QDialog):
-    def __init__(self, parent=None, data=None):
+    # check_duplicates(serial, device_name, report) calls report([(doc, reason)]) one or
+    # more times with the items this one may duplicate
+    def __init__(self, parent=None, data=None, check_duplicates=None):
         super().__init__(parent)
+        self.check_duplicates = check_duplicates
+        self.duplicates = []
         self.setWindowTitle("Inventory Item")
         self.resize(350, 220)
         layout = QFormLayout()
@@ -441,10 +4065,7 @@ class InventoryDialog(QDialog):
         self.serial_number.setMinimumHeight(32)
         self.location = QComboBox()
         self.location.setEditable(False)
-        self.location_options = [
-            "IT Office", "Reception", "Server Room", "CEO Office", "Lobby", "HR", "Finance", "Storage", "Meeting Room",
-            "crudo", "s-lounge", "social kitchen", "parisa", "Other"
-        ]
+        self.location_options = LOCATION_OPTIONS + ["Other"]
         self.location.addItems(self.location_options)
         self.location_other = QLineEdit()
         self.location_other.setPlaceholderText("Enter custom location...")
@@ -452,7 +4073,7 @@ class InventoryDialog(QDialog):
         self.location_other.setVisible(False)
         self.location.currentTextChanged.connect(self.on_location_changed)
         self.status = QComboBox()
-        self.status.addItems(["In Use", "Available", "Retired"])
+        self.status.addItems(STATUS_OPTIONS)
         self.status.setMinimumHeight(32)
         self.assigned_to = QLineEdit()
         self.assigned_to.setPlaceholderText("Assigned To")
@@ -465,6 +4086,18 @@ class InventoryDialog(QDialog):
         layout.addRow("Location:", location_row)
         layout.addRow("Status:", self.status)
         layout.addRow("Assigned To:", self.assigned_to)
+        self.duplicate_label = QLabel()
+        self.duplicate_label.setWordWrap(True)
+        self.duplicate_label.setStyleSheet("font-size:13px;color:#b45309;background:#fef3c7;border-radius:6px;padding:6px 8px;")
+        self.duplicate_label.setVisible(False)
+        layout.addRow(self.duplicate_label)
+        # Checks once typing pauses; only edits count, so opening an item does not warn
+        self.duplicate_timer = QTimer(self)
+        self.duplicate_timer.setSingleShot(True)
+        self.duplicate_timer.setInterval(200)
+        self.duplicate_timer.timeout.connect(self.run_duplicate_check)
+        self.serial_number.textEdited.connect(lambda _text: self.duplicate_timer.start())
+        self.device_name.textEdited.connect(lambda _text: self.duplicate_timer.start())
         self.buttons = QHBoxLayout()
         self.ok_btn = QPushButton("✔ OK")
         self.ok_btn.setMinimumHeight(32)
@@ -499,6 +4132,34 @@ class InventoryDialog(QDialog):
                 self.status.setCurrentIndex(idx)
             self.assigned_to.setText(str(data[5]))
 
+    def run_duplicate_check(self):
+        if self.check_duplicates is None:
+            return
+        serial = self.serial_number.text()
+        self.check_duplicates(serial, self.device_name.text(), lambda matches: self.show_duplicates(serial, matches))
+
+    def show_duplicates(self, serial, matches):
+        # Answers for a serial that has since been edited are stale
+        if serial != self.serial_number.text():
+            return
+        self.duplicates = matches
+        lines = [f"{doc.get('serial_number', '')} · {doc.get('device_name', '')} · {doc.get('location', '')} ({reason.lower()})"
+                 for doc, reason in matches[:3]]
+        if len(matches) > 3:
+            lines.append(f"and {len(matches) - 3} more")
+        self.duplicate_label.setText("⚠️ Possible duplicate of:\n" + "\n".join(lines))
+        self.duplicate_label.setVisible(bool(matches))
+
+    def accept(self):
+        if self.duplicate_timer.isActive():
+            self.duplicate_timer.stop()
+            self.run_duplicate_check()
+        if self.duplicates and QMessageBox.question(
+                self, "Possible Duplicate", self.duplicate_label.text() + "\n\nSave this item anyway?",
+                QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            return
+        super().accept()
+
     def on_location_changed(self, text):
         if text == "Other":
             self.location_other.setVisible(True)
@@ -517,9 +4178,528 @@ class InventoryDialog(QDialog):
             "assigned_to": self.assigned_to.text(),
         }
 
+class BulkEditDialog(QDialog):
+    # Only the checked fields are written to every selected item
+    def __init__(self, count, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Edit {count:,} Items")
+        self.resize(380, 240)
+        self.delete_requested = False
+        layout = QFormLayout()
+        layout.setContentsMargins(18, 24, 18, 18)
+        layout.setSpacing(14)
+        self.status_check = QCheckBox("Status:")
+        self.status = QComboBox()
+        self.status.addItems(STATUS_OPTIONS)
+        self.status.setMinimumHeight(32)
+        self.location_check = QCheckBox("Location:")
+        self.location = QComboBox()
+        self.location.addItems(LOCATION_OPTIONS + ["Other"])
+        self.location.setMinimumHeight(32)
+        self.location_other = QLineEdit()
+        self.location_other.setPlaceholderText("Enter custom location...")
+        self.location_other.setMinimumHeight(32)
+        self.location_other.setVisible(False)
+        self.location.currentTextChanged.connect(lambda text: self.location_other.setVisible(text == "Other"))
+        self.assigned_check = QCheckBox("Assigned To:")
+        self.assigned_to = QLineEdit()
+        self.assigned_to.setPlaceholderText("Leave empty to unassign")
+        self.assigned_to.setMinimumHeight(32)
+        for check, widget in [(self.status_check, self.status), (self.location_check, self.location), (self.assigned_check, self.assigned_to)]:
+            widget.setEnabled(False)
+            check.toggled.connect(widget.setEnabled)
+        self.location_check.toggled.connect(self.location_other.setEnabled)
+        self.location_other.setEnabled(False)
+        location_row = QHBoxLayout()
+        location_row.addWidget(self.location)
+        location_row.addWidget(self.location_other)
+        layout.addRow(self.status_check, self.status)
+        layout.addRow(self.location_check, location_row)
+        layout.addRow(self.assigned_check, self.assigned_to)
+        buttons = QHBoxLayout()
+        self.ok_btn = QPushButton("✔ Apply")
+        self.ok_btn.setMinimumHeight(32)
+        self.ok_btn.setStyleSheet("background:#44b37f;color:#fff;font-weight:600;border-radius:7px;font-size:15px;")
+        self.delete_btn = QPushButton(f"Delete {count:,} Items")
+        self.delete_btn.setMinimumHeight(32)
+        self.delete_btn.setStyleSheet("background:#b94c3f;color:#fff;font-weight:600;border-radius:7px;font-size:15px;")
+        self.cancel_btn = QPushButton("✖ Cancel")
+        self.cancel_btn.setMinimumHeight(32)
+        self.cancel_btn.setStyleSheet("background:#e06f6c;color:#fff;font-weight:600;border-radius:7px;font-size:15px;")
+        self.ok_btn.clicked.connect(self.apply)
+        self.delete_btn.clicked.connect(self.request_delete)
+        self.cancel_btn.clicked.connect(self.reject)
+        buttons.addWidget(self.ok_btn)
+        buttons.addWidget(self.delete_btn)
+        buttons.addWidget(self.cancel_btn)
+        layout.addRow(buttons)
+        self.setLayout(layout)
+
+    def apply(self):
+        if not self.get_changes():
+            QMessageBox.warning(self, "Nothing to Change", "Tick at least one field to change.")
+            return
+        self.accept()
+
+    def request_delete(self):
+        if QMessageBox.question(self, "Confirm Delete", "Are you sure you want to delete all selected items?",
+                                QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
+            self.delete_requested = True
+            self.accept()
+
+    def get_changes(self):
+        changes = {}
+        if self.status_check.isChecked():
+            changes['status'] = self.status.currentText()
+        if self.location_check.isChecked():
+            location = self.location.currentText()
+            changes['location'] = self.location_other.text().strip() if location == "Other" else location
+        if self.assigned_check.isChecked():
+            changes['assigned_to'] = self.assigned_to.text().strip()
+        return changes
+
+class ScanDialog(QDialog):
+    # Stays open beside the table: each serial the scanner types (ending in Enter) applies
+    # the chosen action at once, and the window saves the changes in the background
+    ACTIONS = [
+        ("Check out", {'status': "In Use"}),
+        ("Check in", {'status': "Available", 'assigned_to': ""}),
+        ("Retire", {'status': "Retired", 'assigned_to': ""}),
+        ("Move only", {}),
+    ]
+    LOG_ROWS = 200
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.inventory_window = window
+        self.setWindowTitle("Scan Mode")
+        self.resize(560, 480)
+        self.scanned = 0
+        layout = QVBoxLayout()
+        form = QFormLayout()
+        form.setSpacing(10)
+        self.action = QComboBox()
+        self.action.addItems([name for name, _ in self.ACTIONS])
+        self.action.setMinimumHeight(32)
+        self.location = QComboBox()
+        self.location.addItems(["Keep location"] + LOCATION_OPTIONS)
+        self.location.setMinimumHeight(32)
+        self.assigned_to = QLineEdit()
+        self.assigned_to.setPlaceholderText("Optional, for check out")
+        self.assigned_to.setMinimumHeight(32)
+        self.serial_input = QLineEdit()
+        self.serial_input.setPlaceholderText("Scan or type a serial number and press Enter")
+        self.serial_input.setMinimumHeight(38)
+        self.serial_input.setStyleSheet("font-size:17px;border:1.5px solid #4F8FF9;border-radius:7px;padding:6px 12px;")
+        self.serial_input.returnPressed.connect(self.scan)
+        form.addRow("Action:", self.action)
+        form.addRow("Location:", self.location)
+        form.addRow("Assign to:", self.assigned_to)
+        form.addRow("Serial:", self.serial_input)
+        layout.addLayout(form)
+        self.log = QTableWidget(0, 3)
+        self.log.setHorizontalHeaderLabels(["Serial", "Device", "Result"])
+        self.log.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.log.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.log.verticalHeader().setVisible(False)
+        layout.addWidget(self.log)
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("font-size:13px;color:#6b7280;")
+        layout.addWidget(self.status_label)
+        self.setLayout(layout)
+        window.write_queue.changed.connect(self.update_status)
+        self.update_status()
+
+    def changes(self):
+        changes = dict(self.ACTIONS[self.action.currentIndex()][1])
+        if self.location.currentIndex() > 0:
+            changes['location'] = self.location.currentText()
+        if changes.get('status') == "In Use" and self.assigned_to.text().strip():
+            changes['assigned_to'] = self.assigned_to.text().strip()
+        return changes
+
+    def scan(self):
+        serial = self.serial_input.text().strip()
+        self.serial_input.clear()
+        if not serial:
+            return
+        self.scanned += 1
+        self.log.insertRow(0)
+        self.log.setItem(0, 0, QTableWidgetItem(serial))
+        if self.log.rowCount() > self.LOG_ROWS:
+            self.log.removeRow(self.LOG_ROWS)
+        item = QTableWidgetItem()
+        self.log.setItem(0, 2, item)
+        self.inventory_window.scan_serial(serial, self.changes(), lambda device, result: self.show_result(item, device, result))
+        self.update_status()
+
+    def show_result(self, item, device, result):
+        # The log row may have scrolled off the end by the time a server lookup answers
+        row = self.log.row(item)
+        if row < 0:
+            return
+        self.log.setItem(row, 1, QTableWidgetItem(device or ""))
+        item.setText(result)
+        if device is None:
+            QApplication.beep()
+
+    def update_status(self):
+        waiting = len(self.inventory_window.write_queue)
+        self.status_label.setText(f"{self.scanned:,} scanned" + (f", {waiting:,} waiting to be saved" if waiting else ", all saved"))
+
+class TrendChart(QWidget):
+    # One line per status across the recorded days
+    MARGIN = 28
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.days = []
+        self.setMinimumHeight(180)
+
+    def set_days(self, days):
+        self.days = days
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(QColor('#6b7280'))
+        if len(self.days) < 2:
+            painter.drawText(self.rect(), Qt.AlignCenter, "The trend fills in with one snapshot per day")
+            return
+        margin = self.MARGIN
+        width = self.width() - 2 * margin
+        height = self.height() - 2 * margin
+        series = {status: [dict(day.get('status', [])).get(status, 0) for day in self.days] for status in STATUS_OPTIONS}
+        peak = max(max(values) for values in series.values()) or 1
+        painter.drawText(4, margin, f"{peak:,}")
+        painter.drawText(margin, self.height() - 6, self.days[0]['_id'])
+        painter.drawText(margin + width - 70, self.height() - 6, self.days[-1]['_id'])
+        painter.setPen(QColor('#e0e4ea'))
+        painter.drawLine(margin, margin + height, margin + width, margin + height)
+        for status, values in series.items():
+            painter.setPen(QPen(QColor(STATUS_COLORS[status.lower()]), 2))
+            painter.drawPolyline(QPolygonF([QPointF(margin + width * i / (len(values) - 1), margin + height * (1 - value / peak))
+                                            for i, value in enumerate(values)]))
+
+class ReportsDialog(QDialog):
+    # Counts by location, model and status read from the rollups, so opening it costs the
+    # same for ten items or a million
+    def __init__(self, collection, parent=None):
+        super().__init__(parent)
+        self.collection = collection
+        self.setWindowTitle("Reports")
+        self.resize(760, 520)
+        layout = QVBoxLayout()
+        self.tabs = QTabWidget()
+        self.location_table = self.make_table()
+        self.model_table = self.make_table()
+        trend = QWidget()
+        trend_layout = QVBoxLayout()
+        self.trend_chart = TrendChart()
+        self.trend_table = self.make_table()
+        trend_layout.addWidget(self.trend_chart)
+        trend_layout.addWidget(self.trend_table)
+        trend.setLayout(trend_layout)
+        self.tabs.addTab(self.location_table, "By Location")
+        self.tabs.addTab(self.model_table, "By Device Model")
+        self.tabs.addTab(trend, "Trend")
+        duplicates = QWidget()
+        duplicates_layout = QVBoxLayout()
+        duplicates_row = QHBoxLayout()
+        self.duplicates_btn = QPushButton("Find Duplicates")
+        self.duplicates_btn.setToolTip("Scan every serial number for duplicates and likely typos")
+        self.duplicates_btn.clicked.connect(self.find_duplicates)
+        self.duplicates_label = QLabel("Double-click a pair to show both items in the table.")
+        self.duplicates_label.setStyleSheet("font-size:13px;color:#6b7280;")
+        duplicates_row.addWidget(self.duplicates_btn)
+        duplicates_row.addWidget(self.duplicates_label)
+        duplicates_row.addStretch()
+        self.duplicates_table = self.make_table()
+        self.duplicates_table.itemDoubleClicked.connect(self.show_duplicate_pair)
+        duplicates_layout.addLayout(duplicates_row)
+        duplicates_layout.addWidget(self.duplicates_table)
+        duplicates.setLayout(duplicates_layout)
+        self.tabs.addTab(duplicates, "Duplicates")
+        self.duplicates_worker = None
+        layout.addWidget(self.tabs)
+        buttons = QHBoxLayout()
+        self.summary_label = QLabel()
+        self.summary_label.setStyleSheet("font-size:13px;color:#6b7280;")
+        self.rebuild_btn = QPushButton("Recount")
+        self.rebuild_btn.setToolTip("Recount every item on the server, e.g. after changes made outside the app")
+        self.rebuild_btn.clicked.connect(self.rebuild)
+        self.refresh_btn = QPushButton("Refresh")
+        self.refresh_btn.clicked.connect(lambda: self.load())
+        buttons.addWidget(self.summary_label)
+        buttons.addStretch()
+        buttons.addWidget(self.rebuild_btn)
+        buttons.addWidget(self.refresh_btn)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+    def make_table(self):
+        table = QTableWidget(0, 0)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.setSortingEnabled(True)
+        return table
+
+    def showEvent(self, event):
+        self.load()
+        super().showEvent(event)
+
+    def rebuild(self):
+        if QMessageBox.question(self, "Recount", "Recount every item on the server?", QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
+            self.load(rebuild=True)
+
+    def load(self, rebuild=False):
+        self.rebuild_btn.setEnabled(False)
+        self.refresh_btn.setEnabled(False)
+        self.summary_label.setText("Recounting..." if rebuild else "Loading...")
+        run_in_background(load_report, self.collection, rebuild, on_result=self.show_report,
+                          on_error=lambda message: self.summary_label.setText(f"Reports unavailable: {message}"),
+                          on_finished=self.loaded)
+
+    def loaded(self):
+        self.rebuild_btn.setEnabled(True)
+        self.refresh_btn.setEnabled(True)
+
+    def fill(self, table, headers, rows):
+        table.setSortingEnabled(False)
+        table.clear()
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = QTableWidgetItem()
+                if isinstance(value, int):
+                    # Sorts numerically, shown with separators
+                    item.setData(Qt.EditRole, value)
+                    item.setText(f"{value:,}")
+                    item.setTextAlignment(int(Qt.AlignRight | Qt.AlignVCenter))
+                else:
+                    item.setText(value)
+                table.setItem(row, column, item)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        table.setSortingEnabled(True)
+
+    def pivot(self, table, cells, field, label, statuses):
+        counts = {}
+        for cell in cells:
+            counts.setdefault(cell[field] or "(none)", Counter())[cell['status']] += cell['count']
+        rows = sorted(counts.items(), key=lambda item: -sum(item[1].values()))
+        self.fill(table, [label] + statuses + ["Total"],
+                  [[name] + [by_status[status] for status in statuses] + [sum(by_status.values())] for name, by_status in rows])
+
+    def show_report(self, report):
+        cells = report['cells']
+        statuses = STATUS_OPTIONS + sorted({cell['status'] for cell in cells} - set(STATUS_OPTIONS))
+        self.pivot(self.location_table, cells, 'location', "Location", statuses)
+        self.pivot(self.model_table, cells, 'device_name', "Device Model", statuses)
+        days = report['days']
+        self.trend_chart.set_days(days)
+        self.fill(self.trend_table, ["Day", "Total"] + STATUS_OPTIONS,
+                  [[day['_id'], day.get('total', 0)] + [dict(day.get('status', [])).get(status, 0) for status in STATUS_OPTIONS]
+                   for day in reversed(days)])
+        self.summary_label.setText(f"{sum(cell['count'] for cell in cells):,} items, {len(days)} day(s) of history")
+
+    def find_duplicates(self):
+        # Reads every serial, unlike the rest of the reports, so it only runs when asked
+        if self.duplicates_worker is not None:
+            self.duplicates_worker.cancel()
+        self.duplicates_btn.setEnabled(False)
+        self.duplicates_label.setText("Reading serial numbers...")
+        self.duplicates_worker = run_in_background(
+            find_duplicates, self.collection,
+            on_progress=lambda progress: self.duplicates_label.setText(f"Reading serial numbers... {progress[0]:,} of {progress[1]:,}"),
+            on_result=self.show_duplicates,
+            on_error=lambda message: self.duplicates_label.setText(f"Duplicate scan failed: {message}"),
+            on_finished=self.duplicates_finished)
+
+    def duplicates_finished(self):
+        self.duplicates_worker = None
+        self.duplicates_btn.setEnabled(True)
+
+    def show_duplicates(self, result):
+        if result is None:
+            return
+        pairs = result['pairs']
+        self.fill(self.duplicates_table, ["Reason", "Serial", "Device", "Location", "Possible duplicate", "Device", "Location"],
+                  [[pair['reason']] + [pair[side].get(field, '') for side in 'ab' for field in ('serial_number', 'device_name', 'location')]
+                   for pair in pairs])
+        self.duplicates_label.setText(f"{len(pairs):,} possible duplicates among {result['read']:,} items. Double-click a pair to show both items.")
+
+    def show_duplicate_pair(self, item):
+        row = item.row()
+        serials = [self.duplicates_table.item(row, column).text() for column in (1, 4)]
+        window = self.parent()
+        if isinstance(window, InventoryWindow):
+            window.search_input.setText(" OR ".join(f'serial:"{serial}"' for serial in serials))
+            window.raise_()
+            window.activateWindow()
+
+    def hideEvent(self, event):
+        if self.duplicates_worker is not None:
+            self.duplicates_worker.cancel()
+        super().hideEvent(event)
+
+class HistoryDialog(QDialog):
+    # One item's changes, newest first, read from the audit log's (asset, at) index, and its
+    # state at any earlier moment replayed from the nearest checkpoint
+    def __init__(self, collection, doc, parent=None):
+        super().__init__(parent)
+        self.collection = collection
+        self.doc_id = doc['_id']
+        self.setWindowTitle(f"History - {doc.get('serial_number', '')}")
+        self.resize(760, 480)
+        layout = QVBoxLayout()
+        self.table = QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(["When", "User", "Change"])
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        layout.addWidget(self.table)
+        state_row = QHBoxLayout()
+        self.when_edit = QDateTimeEdit(QDateTime.currentDateTime())
+        self.when_edit.setCalendarPopup(True)
+        self.when_edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+        self.state_btn = QPushButton("Show")
+        self.state_btn.setToolTip("Show the item as it was at this time")
+        self.state_btn.clicked.connect(self.show_state_at)
+        state_row.addWidget(QLabel("State at"))
+        state_row.addWidget(self.when_edit)
+        state_row.addWidget(self.state_btn)
+        state_row.addStretch()
+        layout.addLayout(state_row)
+        self.state_label = QLabel()
+        self.state_label.setWordWrap(True)
+        self.state_label.setStyleSheet("font-size:13px;color:#374151;")
+        layout.addWidget(self.state_label)
+        self.summary_label = QLabel("Loading...")
+        self.summary_label.setStyleSheet("font-size:13px;color:#6b7280;")
+        layout.addWidget(self.summary_label)
+        self.setLayout(layout)
+        def load(worker):
+            # Events still waiting for the audit log's next batch would be missing otherwise
+            audit_log.flush()
+            return load_history(worker, collection, self.doc_id)
+        run_in_background(load, on_result=self.show_history,
+                          on_error=lambda message: self.summary_label.setText(f"History unavailable: {message}"))
+
+    def show_history(self, events):
+        labels = dict(INVENTORY_COLUMNS)
+        rows = []
+        # Replayed oldest first so each change can show the value it replaced
+        state = None
+        for event in reversed(events):
+            if event['op'] == 'delete':
+                change = "Deleted"
+                state = None
+            elif event['op'] in ('insert', 'restore'):
+                change = ("Added: " if event['op'] == 'insert' else "Restored: ") + ", ".join(
+                    f"{labels[field]}: {value}" for field, value in event['state'].items() if value)
+            else:
+                change = "; ".join(f"{labels[field]}: {(state.get(field) or '-') if state is not None else '?'} → {value or '-'}"
+                                   for field, value in event['set'].items())
+            if event['op'] != 'delete':
+                state = dict(event['state']) if 'state' in event else dict(state or {}, **event.get('set', {}))
+            rows.append([local_time(event['at']), event.get('user') or '', change])
+        rows.reverse()
+        self.table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        self.table.resizeColumnsToContents()
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        more = " (latest shown)" if len(events) >= AUDIT_HISTORY_LIMIT else ""
+        self.summary_label.setText(f"{len(events):,} change(s){more}")
+
+    def show_state_at(self):
+        # The picker shows local time; the audit log is in UTC
+        when = self.when_edit.dateTime().toPyDateTime().astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        self.state_btn.setEnabled(False)
+        self.state_label.setText("Replaying...")
+        run_in_background(reconstruct_item, self.collection, self.doc_id, when,
+                          on_result=self.show_state,
+                          on_error=lambda message: self.state_label.setText(f"Could not replay the history: {message}"),
+                          on_finished=lambda: self.state_btn.setEnabled(True))
+
+    def show_state(self, result):
+        state = result['state']
+        if state is None:
+            text = "Not in the inventory at that time." if result['complete'] else "No history recorded that far back."
+        else:
+            text = " · ".join(f"{header}: {state[field] or '-' if field in state else '?'}" for field, header in INVENTORY_COLUMNS)
+            if not result['complete']:
+                text += "\nOlder history is not recorded, so fields marked ? were not changed since."
+        self.state_label.setText(text)
+
+def local_time(when):
+    # Stored times are naive UTC
+    return when.replace(tzinfo=datetime.timezone.utc).astimezone().strftime('%Y-%m-%d %H:%M:%S')
+
+class DiagnosticsDialog(QDialog):
+    # Hidden panel (Ctrl+Shift+D) with live percentiles for every recorded operation
+    COLUMNS = [('count', "Count"), ('p50_ms', "p50 ms"), ('p95_ms', "p95 ms"), ('p99_ms', "p99 ms"), ('max_ms', "Max ms"), ('avg_bytes', "Avg bytes")]
+
+    def __init__(self, diagnostics, parent=None):
+        super().__init__(parent)
+        self.diagnostics = diagnostics
+        self.setWindowTitle("Diagnostics")
+        self.resize(720, 420)
+        layout = QVBoxLayout()
+        self.table = QTableWidget(0, len(self.COLUMNS) + 1)
+        self.table.setHorizontalHeaderLabels(["Operation"] + [header for _, header in self.COLUMNS])
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+        buttons = QHBoxLayout()
+        self.log_label = QLabel(f"Log: {DIAGNOSTICS_LOG}")
+        self.log_label.setStyleSheet("font-size:12px;color:#6b7280;")
+        reset_btn = QPushButton("Reset")
+        reset_btn.clicked.connect(self.reset)
+        write_btn = QPushButton("Write log now")
+        write_btn.clicked.connect(lambda: self.diagnostics.write_log())
+        buttons.addWidget(self.log_label)
+        buttons.addStretch()
+        buttons.addWidget(write_btn)
+        buttons.addWidget(reset_btn)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+        self.refresh()
+
+    def showEvent(self, event):
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def reset(self):
+        self.diagnostics.reset()
+        self.refresh()
+
+    def refresh(self):
+        summary = self.diagnostics.summary()
+        self.table.setRowCount(len(summary))
+        for row, (name, values) in enumerate(summary.items()):
+            self.table.setItem(row, 0, QTableWidgetItem(name))
+            for column, (key, _) in enumerate(self.COLUMNS, 1):
+                item = QTableWidgetItem(f"{values[key]:,}")
+                item.setTextAlignment(int(Qt.AlignRight | Qt.AlignVCenter))
+                self.table.setItem(row, column, item)
+
 def populate_sample_inventory():
     inventory_col = get_inventory_col()
-    if inventory_col.count_documents({}) == 0:
+    # Only an empty collection is seeded; checking for one document avoids counting them all
+    if inventory_col.find_one({}, {'_id': 1}) is None:
         sample_data = [
             {"device_name": "Dell Latitude 5420", "serial_number": "SN1234567", "location": "IT Office", "status": "In Use", "assigned_to": "Ahmed"},
             {"device_name": "HP EliteBook 840", "serial_number": "SN9876543", "location": "Reception", "status": "Available", "assigned_to": ""},
@@ -532,15 +4712,503 @@ def populate_sample_inventory():
             {"device_name": "Samsung SSD 1TB", "serial_number": "SSD1TB22", "location": "Storage", "status": "Available", "assigned_to": ""},
             {"device_name": "Epson Projector", "serial_number": "PROJ2023", "location": "Meeting Room", "status": "In Use", "assigned_to": "All Staff"}
         ]
-        inventory_col.insert_many(sample_data)
+        # Upserts keyed on serial_number so two clients seeding at once cannot duplicate rows
+        inventory_col.bulk_write([UpdateOne({'serial_number': doc['serial_number']},
+                                            {'$setOnInsert': with_search_keys(dict(doc, version=1)), '$currentDate': {'updated_at': True}}, upsert=True)
+                                  for doc in sample_data], ordered=False)
 
 
 # ... (rest of code unchanged)
 
+def run_import(path, batch_size):
+    def show_batch(report):
+        print(f"batch {report['batch']}: {report['read']:,} read, {report['upserted']:,} added, {report['updated']:,} updated, {len(report['errors']):,} rejected")
+    report = import_inventory(ConsoleWorker(show_batch), get_inventory_col(), path, batch_size, getpass.getuser())
+    audit_log.flush()
+    print(format_import_report(report, limit=len(report['errors'])))
+    return 1 if report['errors'] else 0
+
+# --- HTTP API (--serve) ---
+# python main.py --serve runs without a window: an asyncio HTTP/1.1 server in front of the
+# same MongoClient pool the app uses. The blocking pymongo calls run on a thread pool the
+# size of the client pool, and at most SERVE_MAX_REQUESTS requests are worked on at once;
+# the rest wait on their connection for a slot.
+SERVE_HOST = CONFIG.get('SERVE_HOST') or '127.0.0.1'
+SERVE_PORT = config_int('SERVE_PORT', 8765)
+SERVE_MAX_REQUESTS = max(1, config_int('SERVE_MAX_REQUESTS', 64))
+# When set, every request needs an "Authorization: Bearer <token>" header
+SERVE_TOKEN = CONFIG.get('SERVE_TOKEN', '')
+SERVE_MAX_BODY = 16 * 1024 * 1024
+# Documents per streamed chunk of a listing
+SERVE_CHUNK_ROWS = 500
+API_FIELDS = [field for field, _ in INVENTORY_COLUMNS]
+
+class ApiError(Exception):
+    def __init__(self, status, message, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body if body is not None else {'error': message}
+
+def api_document(doc):
+    result = {'_id': str(doc['_id'])}
+    result.update((field, doc.get(field, '')) for field in API_FIELDS)
+    result['version'] = doc.get('version')
+    return result
+
+def api_filter(params):
+    # ?q= takes the search box syntax, answered from the indexes like a server search
+    text = params.get('q', '').strip()
+    if not text:
+        return {}
+    parsed = parse_query(text)
+    return parsed.to_filter() if parsed else build_indexed_search_filter(text.lower())
+
+def api_fields(body, partial):
+    # The editable fields of a request body, checked the same way as an imported row
+    if not isinstance(body, dict):
+        raise ApiError(400, "expected a JSON object")
+    unknown = set(body) - set(API_FIELDS) - {'_id', 'version'}
+    if unknown:
+        raise ApiError(400, f"unknown fields: {', '.join(sorted(unknown))}")
+    fields = {field: '' if body[field] is None else str(body[field]).strip() for field in API_FIELDS if field in body}
+    if 'status' in fields:
+        status = normalize_status(fields['status'])
+        if status is None:
+            raise ApiError(400, f"unknown status {fields['status']!r}")
+        fields['status'] = status
+    if 'location' in fields:
+        fields['location'] = normalize_location(fields['location'])
+    for field in ('device_name', 'serial_number'):
+        if field in fields and not fields[field]:
+            raise ApiError(400, f"{field} cannot be empty")
+        if not partial and field not in fields:
+            raise ApiError(400, f"missing {field}")
+    if not fields:
+        raise ApiError(400, "nothing to change")
+    return fields
+
+def api_id(text):
+    if not ObjectId.is_valid(text):
+        raise ApiError(404, "no such item")
+    return ObjectId(text)
+
+def api_time(when):
+    # Stored times are naive UTC
+    return when.replace(tzinfo=datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
+
+def item_etag(doc):
+    return f'"v{doc.get("version") or 0}"'
+
+def etag_version(header):
+    # If-Match: "v3" -> 3; None when absent or "*"
+    header = header.strip()
+    if not header or header == '*':
+        return None
+    match = re.fullmatch(r'(?:W/)?"v(\d+)"', header)
+    if match is None:
+        raise ApiError(412, "If-Match must be an ETag from this API")
+    return int(match.group(1)) or None
+
+def collection_etag(collection, target):
+    # Changes whenever a write stamps updated_at, a delete leaves a tombstone or the count
+    # moves; three indexed lookups instead of running the query. Weak, as two writes in
+    # the same millisecond share a stamp.
+    newest = collection.find_one({}, {'updated_at': 1}, sort=[('updated_at', DESCENDING)]) or {}
+    deleted = tombstones_for(collection).find_one({}, {'deleted_at': 1}, sort=[('deleted_at', DESCENDING)]) or {}
+    state = f"{target}|{newest.get('updated_at')}|{deleted.get('deleted_at')}|{collection.estimated_document_count()}"
+    return f'W/"{hashlib.sha1(state.encode()).hexdigest()[:20]}"'
+
+def iter_api_items(cursor, limit):
+    # Blocking chunks of one JSON object, {"items": [...], "next": id or null}
+    yield '{"items":['
+    last = None
+    count = 0
+    separator = ''
+    while True:
+        batch = list(itertools.islice(cursor, SERVE_CHUNK_ROWS))
+        if batch:
+            yield separator + ','.join(json.dumps(api_document(doc), ensure_ascii=False, default=str) for doc in batch)
+            separator = ','
+            last = batch[-1]['_id']
+            count += len(batch)
+        if len(batch) < SERVE_CHUNK_ROWS:
+            break
+    more = limit is not None and count == limit
+    yield '],"next":' + json.dumps(str(last) if more else None) + '}'
+
+class InventoryApi:
+    ROUTES = [
+        ('GET', re.compile(r'/health'), 'health'),
+        ('GET', re.compile(r'/items'), 'list_items'),
+        ('POST', re.compile(r'/items'), 'create_item'),
+        ('POST', re.compile(r'/items/bulk'), 'bulk'),
+        ('GET', re.compile(r'/items/serial/(.+)'), 'get_by_serial'),
+        ('GET', re.compile(r'/items/([^/]+)/history'), 'get_history'),
+        ('GET', re.compile(r'/items/([^/]+)'), 'get_item'),
+        ('PATCH', re.compile(r'/items/([^/]+)'), 'update_item'),
+        ('DELETE', re.compile(r'/items/([^/]+)'), 'delete_item'),
+        ('GET', re.compile(r'/export'), 'export'),
+    ]
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.executor = ThreadPoolExecutor(max_workers=max(1, MONGO_MAX_POOL_SIZE), thread_name_prefix='api')
+        self.slots = asyncio.Semaphore(SERVE_MAX_REQUESTS)
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args))
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"✅ Serving the inventory API on http://{host}:{port}/")
+        async with server:
+            await server.serve_forever()
+
+    # --- HTTP ---
+    async def handle_connection(self, reader, writer):
+        # Keep-alive: requests on one connection are answered in order
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length > SERVE_MAX_BODY:
+                    self.send(writer, 413, {'error': "request body too large"}, {'Connection': 'close'})
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length) if length else b''
+                async with self.slots:
+                    await self.dispatch(writer, method.upper(), target, headers, body)
+                await writer.drain()
+                if version == 'HTTP/1.0' or headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, writer, method, target, headers, body):
+        started = time.perf_counter()
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        status = 500
+        try:
+            if SERVE_TOKEN and not hmac.compare_digest(headers.get('authorization', ''), f"Bearer {SERVE_TOKEN}"):
+                raise ApiError(401, "missing or wrong bearer token")
+            handler = None
+            allowed = False
+            for route_method, pattern, name in self.ROUTES:
+                match = pattern.fullmatch(path)
+                if match:
+                    allowed = True
+                    if route_method == method:
+                        handler = getattr(self, name)
+                        args = [unquote(group) for group in match.groups()]
+                        break
+            if handler is None:
+                raise ApiError(405 if allowed else 404, "method not allowed" if allowed else "not found")
+            # X-User names who made a change in the audit log
+            request = {'params': params, 'headers': headers, 'target': target, 'user': headers.get('x-user') or 'api'}
+            if body:
+                try:
+                    request['json'] = json.loads(body)
+                except ValueError:
+                    raise ApiError(400, "body is not valid JSON")
+            status = await handler(writer, request, *args)
+        except ApiError as e:
+            status = e.status
+            self.send(writer, e.status, e.body)
+        except ConnectionFailure as e:
+            status = 503
+            self.send(writer, 503, {'error': f"database unreachable: {e}"})
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            print(f"❌ {method} {target}: {e}")
+            self.send(writer, 500, {'error': str(e)})
+        if diagnostics is not None:
+            diagnostics.record(f"api.{method} {path.split('/')[1] if '/' in path else path}", time.perf_counter() - started)
+        return status
+
+    def send(self, writer, status, body=None, headers=None):
+        data = b'' if body is None or status == 304 else json.dumps(body, ensure_ascii=False, default=str).encode('utf-8')
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Length: {len(data)}"]
+        if data:
+            lines.append("Content-Type: application/json; charset=utf-8")
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + data)
+
+    async def stream(self, writer, chunks, content_type, headers=None):
+        # chunks is a blocking iterator of text; every next() runs on the thread pool and each
+        # chunk goes out with chunked transfer encoding as soon as it is ready
+        lines = ["HTTP/1.1 200 OK", f"Content-Type: {content_type}", "Transfer-Encoding: chunked"]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+        try:
+            while True:
+                chunk = await self.run(next, chunks, None)
+                if chunk is None:
+                    break
+                data = chunk.encode('utf-8')
+                if data:
+                    writer.write(f"{len(data):X}\r\n".encode('latin-1') + data + b"\r\n")
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            # The status line is out, so dropping the connection is the only way left to fail
+            print(f"❌ Streaming stopped: {e}")
+            writer.transport.abort()
+            raise ConnectionAbortedError(str(e))
+        finally:
+            await self.run(chunks.close)
+        return 200
+
+    async def conditional(self, writer, request):
+        # Returns the collection ETag, or None once a 304 has been sent
+        etag = await self.run(collection_etag, self.collection, request['target'])
+        if request['headers'].get('if-none-match') == etag:
+            self.send(writer, 304, headers={'ETag': etag})
+            return None
+        return etag
+
+    # --- Endpoints ---
+    async def health(self, writer, request):
+        count = await self.run(self.collection.estimated_document_count)
+        self.send(writer, 200, {'ok': True, 'items': count})
+        return 200
+
+    async def list_items(self, writer, request):
+        # ?q= search, ?limit= and ?after=<id of the last item> page through in _id order
+        params = request['params']
+        try:
+            limit = int(params['limit']) if 'limit' in params else None
+        except ValueError:
+            raise ApiError(400, "limit must be a number")
+        query_filter = api_filter(params)
+        if 'after' in params:
+            query_filter = {'$and': [query_filter, {'_id': {'$gt': api_id(params['after'])}}]}
+        etag = await self.conditional(writer, request)
+        if etag is None:
+            return 304
+        cursor = self.collection.find(query_filter, INVENTORY_PROJECTION, batch_size=EXPORT_BATCH_SIZE).sort('_id', ASCENDING)
+        if limit is not None:
+            cursor = cursor.limit(max(0, limit))
+        return await self.stream(writer, iter_api_items(cursor, limit), "application/json; charset=utf-8", {'ETag': etag})
+
+    async def get_item(self, writer, request, item_id):
+        doc = await self.run(self.collection.find_one, {'_id': api_id(item_id)}, INVENTORY_PROJECTION)
+        if doc is None:
+            raise ApiError(404, "no such item")
+        return self.send_item(writer, request, doc)
+
+    async def get_by_serial(self, writer, request, serial):
+        # The exact serial first, then the normalized form the duplicate check uses
+        doc = await self.run(self.collection.find_one, {'serial_number': serial}, INVENTORY_PROJECTION)
+        if doc is None:
+            doc = await self.run(self.collection.find_one, {'serial_norm': normalize_serial(serial)}, INVENTORY_PROJECTION)
+        if doc is None:
+            raise ApiError(404, "no item with this serial number")
+        return self.send_item(writer, request, doc)
+
+    def send_item(self, writer, request, doc, status=200, headers=None):
+        etag = item_etag(doc)
+        if status == 200 and request['headers'].get('if-none-match') == etag:
+            self.send(writer, 304, headers={'ETag': etag})
+            return 304
+        self.send(writer, status, api_document(doc), dict(headers or {}, ETag=etag))
+        return status
+
+    async def get_history(self, writer, request, item_id):
+        # Newest changes first (?limit=), or with ?at=<ISO time> the item as it was then
+        doc_id = api_id(item_id)
+        params = request['params']
+        await self.run(audit_log.flush)
+        if 'at' in params:
+            try:
+                when = datetime.datetime.fromisoformat(params['at'].replace('Z', '+00:00'))
+            except ValueError:
+                raise ApiError(400, "at must be an ISO 8601 time")
+            if when.tzinfo is not None:
+                when = when.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            result = await self.run(reconstruct_item, None, self.collection, doc_id, when)
+            self.send(writer, 200, {'at': api_time(when), 'item': result['state'], 'complete': result['complete']})
+            return 200
+        try:
+            limit = min(int(params.get('limit', AUDIT_HISTORY_LIMIT)), AUDIT_HISTORY_LIMIT)
+        except ValueError:
+            raise ApiError(400, "limit must be a number")
+        events = await self.run(load_history, None, self.collection, doc_id, max(1, limit))
+        self.send(writer, 200, {'events': [dict({key: value for key, value in event.items() if key != '_id'}, at=api_time(event['at']))
+                                           for event in events]})
+        return 200
+
+    async def create_item(self, writer, request):
+        fields = api_fields(request.get('json'), partial=False)
+        doc_id = ObjectId()
+        try:
+            await self.run(apply_inventory_write, self.collection, 'insert', doc_id, fields, request['user'])
+        except DuplicateKeyError:
+            raise ApiError(409, "an item with this serial number already exists")
+        doc = await self.run(self.collection.find_one, {'_id': doc_id}, INVENTORY_PROJECTION)
+        return self.send_item(writer, request, doc, 201, {'Location': f"/items/{doc_id}"})
+
+    async def update_item(self, writer, request, item_id):
+        # If-Match: "v<version>" makes the update conditional, like an edit in the window
+        doc_id = api_id(item_id)
+        fields = api_fields(request.get('json'), partial=True)
+        if 'if-match' in request['headers']:
+            fields['version'] = etag_version(request['headers']['if-match'])
+        try:
+            changes = await self.run(apply_inventory_write, self.collection, 'update', doc_id, fields, request['user'])
+        except EditConflict as conflict:
+            if conflict.current is None:
+                raise ApiError(404, "no such item")
+            raise ApiError(412, "changed since that version", {'error': "changed since that version", 'current': api_document(conflict.current)})
+        except DuplicateKeyError:
+            raise ApiError(409, "an item with this serial number already exists")
+        if not changes:
+            raise ApiError(404, "no such item")
+        doc = await self.run(self.collection.find_one, {'_id': doc_id}, INVENTORY_PROJECTION)
+        return self.send_item(writer, request, doc)
+
+    async def delete_item(self, writer, request, item_id):
+        changes = await self.run(apply_inventory_write, self.collection, 'delete', api_id(item_id), {}, request['user'])
+        if not changes:
+            raise ApiError(404, "no such item")
+        self.send(writer, 204)
+        return 204
+
+    async def bulk(self, writer, request):
+        # {"upsert": [items]} upserts on serial number like an import; {"ids": [...], "set":
+        # {...}} or {"ids": [...], "delete": true} change many items in one round trip
+        body = request.get('json')
+        if not isinstance(body, dict):
+            raise ApiError(400, "expected a JSON object")
+        if 'upsert' in body:
+            items = body['upsert']
+            if not isinstance(items, list):
+                raise ApiError(400, "upsert must be a list")
+            report = {'read': 0, 'upserted': 0, 'updated': 0, 'errors': []}
+            for start in range(0, len(items), IMPORT_BATCH_SIZE):
+                chunk = [(f"item {index}", item if isinstance(item, dict) else ValueError("not an object"))
+                         for index, item in enumerate(items[start:start + IMPORT_BATCH_SIZE], start)]
+                await self.run(upsert_batch, self.collection, chunk, report, f"items {start}-{start + len(chunk) - 1}", request['user'])
+            self.send(writer, 200, report)
+            return 200
+        ids = [api_id(str(item_id)) for item_id in body.get('ids') or []]
+        if not ids:
+            raise ApiError(400, "ids must list the items to change")
+        if body.get('delete'):
+            changes = await self.run(apply_inventory_write, self.collection, 'delete_many', ids, {}, request['user'])
+            self.send(writer, 200, {'deleted': len(changes)})
+            return 200
+        fields = api_fields(body.get('set'), partial=True)
+        if 'serial_number' in fields:
+            raise ApiError(400, "serial numbers cannot be set in bulk")
+        # Counted from the items the write found; missing or deleted ids are left out
+        changes = await self.run(apply_inventory_write, self.collection, 'update_many', ids, fields, request['user'])
+        self.send(writer, 200, {'updated': len(changes)})
+        return 200
+
+    async def export(self, writer, request):
+        # ?format=csv (default) or jsonl, with the same ?q= as the listing
+        fmt = request['params'].get('format', 'csv')
+        if fmt not in ('csv', 'jsonl'):
+            raise ApiError(400, "format must be csv or jsonl")
+        query_filter = api_filter(request['params'])
+        etag = await self.conditional(writer, request)
+        if etag is None:
+            return 304
+        cursor = self.collection.find(query_filter, INVENTORY_PROJECTION, batch_size=EXPORT_BATCH_SIZE)
+        content_type = "text/csv; charset=utf-8" if fmt == 'csv' else "application/x-ndjson; charset=utf-8"
+        chunks = (text for text, _ in iter_export_chunks(cursor, 'csv' if fmt == 'csv' else 'jsonl'))
+        return await self.stream(writer, chunks, content_type,
+                                 {'ETag': etag, 'Content-Disposition': f'attachment; filename="inventory.{fmt}"'})
+
+def run_server(host, port):
+    # Connects and sets up the database with the window's retries before accepting requests
+    def show_retry(progress):
+        attempt, delay, error = progress
+        print(f"❌ Error connecting to MongoDB (attempt {attempt}): {error}; retrying in {delay:.0f}s")
+    ConnectionManager()._connect(ConsoleWorker(show_retry))
+    api = InventoryApi(get_inventory_col())
+    audit_log.start()
+    try:
+        asyncio.run(api.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.executor.shutdown(wait=False)
+        audit_log.flush()
+    return 0
+
 if __name__ == "__main__":
-    init_db()
-    populate_sample_inventory()
-    app = QApplication(sys.argv)
-    login = LoginWindow()
+    parser = argparse.ArgumentParser(description="IT Inventory")
+    parser.add_argument('--import', dest='import_path', metavar='FILE', help="bulk import a CSV or JSON Lines file and exit")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help="documents per bulk_write batch for --import")
+    parser.add_argument('--check-indexes', action='store_true', help="create indexes, explain the app's queries and exit non-zero on any collection scan")
+    parser.add_argument('--rebuild-rollups', action='store_true', help="recount the report rollups from the inventory and exit")
+    parser.add_argument('--serve', action='store_true', help="run the HTTP/JSON API instead of the window")
+    parser.add_argument('--host', default=SERVE_HOST, help="address for --serve to listen on")
+    parser.add_argument('--port', type=int, default=SERVE_PORT, help="port for --serve to listen on")
+    parser.add_argument('--find-duplicates', action='store_true', help="list items whose serial numbers are the same or a typo apart and exit non-zero if any")
+    args, qt_args = parser.parse_known_args()
+    if args.import_path:
+        sys.exit(run_import(args.import_path, args.batch_size))
+    if args.check_indexes:
+        ensure_indexes()
+        sys.exit(1 if check_query_plans() else 0)
+    if args.rebuild_rollups:
+        inventory_col = get_inventory_col()
+        rebuild_rollups(inventory_col)
+        cells = read_rollups(inventory_col)
+        record_daily_rollup(inventory_col, cells)
+        print(f"✅ Rollups rebuilt: {sum(cell['count'] for cell in cells):,} items in {len(cells):,} cells")
+        sys.exit(0)
+    if args.serve:
+        sys.exit(run_server(args.host, args.port))
+    if args.find_duplicates:
+        result = find_duplicates(ConsoleWorker(lambda progress: print(f"{progress[0]:,} of {progress[1]:,} serials read")), get_inventory_col())
+        for pair in result['pairs']:
+            a, b = pair['a'], pair['b']
+            print(f"{pair['reason']:<22} {a.get('serial_number', '')} ({a.get('device_name', '')}, {a.get('location', '')})"
+                  f"  ~  {b.get('serial_number', '')} ({b.get('device_name', '')}, {b.get('location', '')})")
+        print(f"{len(result['pairs']):,} possible duplicates among {result['read']:,} items")
+        sys.exit(1 if result['pairs'] else 0)
+    app = QApplication(sys.argv[:1] + qt_args)
+    app.aboutToQuit.connect(cancel_all_workers)
+    # Changes made just before closing are still waiting for the audit log's next batch;
+    # what the server does not take stays in the spill file for the next start
+    app.aboutToQuit.connect(lambda: audit_log.flush())
+    if diagnostics is not None:
+        # A rolling summary line per interval, and a last one on exit
+        diagnostics_timer = QTimer()
+        diagnostics_timer.timeout.connect(lambda: diagnostics.write_log())
+        diagnostics_timer.start(max(1, DIAGNOSTICS_INTERVAL_S) * 1000)
+        app.aboutToQuit.connect(lambda: diagnostics.write_log())
+    # The login window paints first; init_db and seeding run once the connection comes up
+    connection = ConnectionManager()
+    cache = None
+    if SNAPSHOT_CACHE:
+        try:
+            cache = SnapshotCache(CACHE_PATH)
+        except sqlite3.Error as e:
+            print(f"⚠️ Local snapshot disabled, could not open {CACHE_PATH}: {e}")
+    login = LoginWindow(connection, cache)
     login.show()
+    connection.start()
+    # Sends audit events left in the spill file by the last run
+    audit_log.start()
     sys.exit(app.exec_())
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+
+# Headless Qt, and the app module from the repository root
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mongomock
+import pytest
+from pymongo import UpdateOne
+from PyQt5.QtWidgets import QApplication
+
+import main
+
+SAMPLE_INVENTORY = [
+    {"device_name": "Dell Latitude 5420", "serial_number": "SN1234567", "location": "IT Office", "status": "In Use", "assigned_to": "Ahmed"},
+    {"device_name": "Dell Latitude 7430", "serial_number": "SN7654321", "location": "Reception", "status": "Available", "assigned_to": ""},
+    {"device_name": "HP EliteBook 840", "serial_number": "SN9876543", "location": "Reception", "status": "Available", "assigned_to": ""},
+    {"device_name": "Cisco Switch 2960", "serial_number": "SW001122", "location": "Server Room", "status": "In Use", "assigned_to": "IT Team"},
+    {"device_name": "Logitech MX Master 3S", "serial_number": "MXM2025", "location": "IT Office", "status": "Available", "assigned_to": ""},
+    {"device_name": "Apple MacBook Pro", "serial_number": "MBP2022", "location": "CEO Office", "status": "In Use", "assigned_to": "Mr. Smith"},
+    {"device_name": "Ubiquiti AP AC Pro", "serial_number": "UBIAP01", "location": "Lobby", "status": "Retired", "assigned_to": ""},
+    {"device_name": "Lenovo ThinkPad X1", "serial_number": "THINKX1", "location": "HR", "status": "Available", "assigned_to": ""},
+    {"device_name": "Brother HL-L2370DN", "serial_number": "PRT9988", "location": "Finance", "status": "In Use", "assigned_to": "Finance Team"},
+    {"device_name": "Samsung SSD 1TB", "serial_number": "SSD1TB22", "location": "Storage", "status": "Retired", "assigned_to": ""},
+    {"device_name": "Epson Projector", "serial_number": "PROJ2023", "location": "Meeting Room", "status": "In Use", "assigned_to": "All Staff"},
+    {"device_name": "Dell P2422H Monitor", "serial_number": "mn-0042", "location": "Spa", "status": "Available", "assigned_to": "Sara Tazi"},
+]
+
+@pytest.fixture(autouse=True)
+def spill_file(tmp_path, monkeypatch):
+    # Audit events and spilled scans go to a file of each test's own
+    spill = main.SpillQueue(str(tmp_path / 'spill.db'))
+    monkeypatch.setattr(main, 'spill_queue', spill)
+    monkeypatch.setattr(main.audit_log, 'spill', spill)
+    return spill
+
+@pytest.fixture(scope='session')
+def qapp():
+    return QApplication.instance() or QApplication(sys.argv[:1])
+
+@pytest.fixture
+def collection():
+    col = mongomock.MongoClient()['inventory_test']['inventory']
+    # Through $set like the app's writes, so the words.* keys nest
+    col.bulk_write([UpdateOne({'serial_number': doc['serial_number']}, {'$set': main.with_search_keys(dict(doc, version=1))}, upsert=True)
+                    for doc in SAMPLE_INVENTORY])
+    return col
+
+@pytest.fixture
+def model(qapp, collection):
+    model = main.InventoryTableModel()
+    model.set_rows(list(collection.find({}, main.INVENTORY_PROJECTION)))
+    return model
+
+@pytest.fixture
+def merge_stage(monkeypatch):
+    # mongomock has no $merge; run the pipeline before it and write its output the way
+    # whenMatched: 'replace', whenNotMatched: 'insert' does
+    aggregate = mongomock.collection.Collection.aggregate
+    def with_merge(self, pipeline, *args, **kwargs):
+        if pipeline and '$merge' in pipeline[-1]:
+            target = self.database[pipeline[-1]['$merge']['into']]
+            for doc in aggregate(self, pipeline[:-1]):
+                target.replace_one({'_id': doc['_id']}, doc, upsert=True)
+            return iter(())
+        return aggregate(self, pipeline, *args, **kwargs)
+    monkeypatch.setattr(mongomock.collection.Collection, 'aggregate', with_merge)
+
+@pytest.fixture
+def wait(qapp):
+    # Runs the event loop until cond() holds, for work done through run_in_background
+    def wait(cond, timeout=10):
+        deadline = time.monotonic() + timeout
+        while not cond():
+            if time.monotonic() > deadline:
+                raise TimeoutError
+            qapp.processEvents()
+            time.sleep(0.005)
+    return wait
@@ -0,0 +1,126 @@
+import asyncio
+import http.client
+import json
+import threading
+
+import pytest
+
+import main
+
+@pytest.fixture
+def api(collection):
+    # The API on a free port, served from a loop of its own; yields a request function
+    api = main.InventoryApi(collection)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(api.handle_connection, '127.0.0.1', 0))
+    port = server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def request(method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            conn.request(method, path, None if body is None else json.dumps(body), headers or {})
+            response = conn.getresponse()
+            data = response.read()
+            return response.status, dict(response.getheaders()), json.loads(data) if data and 'json' in response.getheader('Content-Type', '') else data
+        finally:
+            conn.close()
+
+    yield request
+
+    async def shut_down():
+        # Connection handlers still waiting for a next request end here, not at garbage collection
+        server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shut_down(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+    api.executor.shutdown(wait=False)
+
+def item_id(collection, serial):
+    return str(collection.find_one({'serial_number': serial})['_id'])
+
+def test_bulk_update_counts_only_items_it_found(api, collection):
+    gone = item_id(collection, 'SN7654321')
+    status, _, body = api('DELETE', f'/items/{gone}')
+    assert status == 204
+    ids = [item_id(collection, 'SN1234567'), gone, '0123456789abcdef01234567']
+    status, _, body = api('POST', '/items/bulk', {'ids': ids, 'set': {'location': 'Storage'}})
+    assert (status, body) == (200, {'updated': 1})
+    assert collection.find_one({'serial_number': 'SN1234567'})['location'] == 'Storage'
+
+def test_health_and_unknown_routes(api, collection):
+    assert api('GET', '/health')[2] == {'ok': True, 'items': collection.count_documents({})}
+    assert api('GET', '/nowhere')[0] == 404
+    assert api('PUT', '/items')[0] == 405
+
+def test_bearer_token(api, monkeypatch):
+    monkeypatch.setattr(main, 'SERVE_TOKEN', 'secret')
+    assert api('GET', '/health')[0] == 401
+    assert api('GET', '/health', headers={'Authorization': 'Bearer secret'})[0] == 200
+
+def test_listing_pages_in_id_order_and_searches(api, collection):
+    status, headers, body = api('GET', '/items?limit=5')
+    assert status == 200
+    first = [item['_id'] for item in body['items']]
+    assert len(first) == 5 and body['next'] == first[-1]
+    rest = api('GET', f"/items?after={body['next']}")[2]
+    assert first + [item['_id'] for item in rest['items']] == sorted(str(doc['_id']) for doc in collection.find())
+    assert rest['next'] is None
+    found = api('GET', '/items?q=status:retired')[2]['items']
+    assert sorted(item['serial_number'] for item in found) == ['SSD1TB22', 'UBIAP01']
+    # Unchanged since: 304 against the collection ETag
+    assert api('GET', '/items?limit=5', headers={'If-None-Match': headers['ETag']})[0] == 304
+
+def test_create_read_and_duplicate_serial(api, collection):
+    main.create_index(collection, 'serial_number', unique=True)
+    item = {'device_name': 'Dell Latitude 5540', 'serial_number': 'NEW-1', 'location': 'hr', 'status': 'in use'}
+    status, headers, body = api('POST', '/items', item, {'X-User': 'omar'})
+    assert status == 201
+    assert (body['status'], body['version'], headers['ETag']) == ('In Use', 1, '"v1"')
+    assert headers['Location'] == f"/items/{body['_id']}"
+    assert api('GET', '/items/serial/new1')[2]['_id'] == body['_id']
+    assert api('GET', f"/items/{body['_id']}", headers={'If-None-Match': '"v1"'})[0] == 304
+    assert api('POST', '/items', item)[0] == 409
+    assert api('POST', '/items', {'device_name': 'No serial'})[0] == 400
+    main.audit_log.flush()
+    history = api('GET', f"/items/{body['_id']}/history")[2]['events']
+    assert [(event['op'], event['user']) for event in history] == [('insert', 'omar')]
+
+def test_conditional_update_and_delete(api, collection):
+    doc_id = item_id(collection, 'SN1234567')
+    status, headers, body = api('PATCH', f'/items/{doc_id}', {'status': 'Retired'}, {'If-Match': '"v1"'})
+    assert (status, body['status'], headers['ETag']) == (200, 'Retired', '"v2"')
+    status, _, body = api('PATCH', f'/items/{doc_id}', {'status': 'Available'}, {'If-Match': '"v1"'})
+    assert status == 412
+    assert body['current']['status'] == 'Retired'
+    assert api('PATCH', f'/items/{doc_id}', {'colour': 'red'})[0] == 400
+    assert api('DELETE', f'/items/{doc_id}')[0] == 204
+    assert api('DELETE', f'/items/{doc_id}')[0] == 404
+    assert api('GET', f'/items/{doc_id}')[0] == 404
+
+def test_bulk_upsert_and_delete(api, collection):
+    status, _, body = api('POST', '/items/bulk', {'upsert': [
+        {'device_name': 'Dell Latitude 5420', 'serial_number': 'SN1234567', 'location': 'HR', 'status': 'In Use'},
+        {'device_name': 'New Switch', 'serial_number': 'SW-NEW', 'location': 'Server Room', 'status': 'Available'},
+        {'device_name': 'Broken', 'serial_number': 'BAD1', 'status': 'Lost'},
+    ]})
+    assert status == 200
+    assert (body['read'], body['upserted'], body['updated'], len(body['errors'])) == (3, 1, 1, 1)
+    ids = [item_id(collection, 'SW-NEW'), item_id(collection, 'SN1234567')]
+    assert api('POST', '/items/bulk', {'ids': ids, 'delete': True})[2] == {'deleted': 2}
+    assert api('POST', '/items/bulk', {'ids': ids, 'set': {'serial_number': 'X'}})[0] == 400
+
+def test_export_streams_csv(api, collection):
+    status, headers, body = api('GET', '/export?format=csv&q=status:retired')
+    assert status == 200
+    assert headers['Content-Type'].startswith('text/csv')
+    lines = body.decode('utf-8-sig').splitlines()
+    assert len(lines) == 3
+    assert api('GET', '/export?format=xml')[0] == 400
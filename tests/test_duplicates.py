@@ -0,0 +1,47 @@
+from pymongo import UpdateOne
+
+import main
+
+def add_items(collection, *items):
+    collection.bulk_write([UpdateOne({'serial_number': serial}, {'$set': main.with_search_keys({'serial_number': serial, 'device_name': name,
+                                                                                                 'location': 'HR', 'status': 'Available', 'assigned_to': ''})}, upsert=True)
+                           for serial, name in items])
+
+def reasons(matches):
+    return sorted((doc['serial_number'], reason) for doc, reason in matches)
+
+def test_serials_normalize_case_separators_and_lookalikes():
+    assert main.normalize_serial('SN-1234567') == main.normalize_serial('sn 1234567') == main.normalize_serial('SNI234567')
+    assert main.normalize_serial('MB-O42') == 'MB042'
+    assert main.normalize_serial('--') == ''
+
+def test_live_check_finds_same_and_one_typo_apart(collection):
+    found = main.find_similar_serials(main.ConsoleWorker(), collection, 'sn-1234567')
+    assert reasons(found) == [('SN1234567', main.SAME_SERIAL)]
+    assert reasons(main.find_similar_serials(main.ConsoleWorker(), collection, 'SN1234576')) == [('SN1234567', "Characters swapped")]
+    assert reasons(main.find_similar_serials(main.ConsoleWorker(), collection, 'SN123456')) == [('SN1234567', "One character missing")]
+    assert reasons(main.find_similar_serials(main.ConsoleWorker(), collection, 'SN12345678')) == [('SN1234567', "One character extra")]
+    # Sequential serials differ in place and are not flagged
+    assert main.find_similar_serials(main.ConsoleWorker(), collection, 'SN1234568') == []
+
+def test_loaded_rows_answer_like_the_server(collection, model):
+    for serial in ('SN1234576', 'sn 1234567', 'SN123456', 'SN1234568'):
+        local = [(model.document(rid), reason) for rid, reason in model.similar_rids(serial)]
+        assert reasons(local) == reasons(main.find_similar_serials(main.ConsoleWorker(), collection, serial))
+
+def test_report_pairs_near_serials_only_with_similar_names(collection):
+    add_items(collection, ('sn-1234567', 'Dell Latitude 5420'), ('PROJ2032', 'Epson Projector EB'), ('THINKXI', 'Cisco Phone'))
+    report = main.find_duplicates(main.ConsoleWorker(), collection)
+    assert report['read'] == collection.count_documents({})
+    pairs = sorted((pair['reason'], *sorted((pair['a']['serial_number'], pair['b']['serial_number']))) for pair in report['pairs'])
+    # THINKX1 and THINKXI share a key, so they pair whatever the names
+    assert pairs == [("Characters swapped", 'PROJ2023', 'PROJ2032'), (main.SAME_SERIAL, 'SN1234567', 'sn-1234567'),
+                     (main.SAME_SERIAL, 'THINKX1', 'THINKXI')]
+    # Exact matches are listed first
+    assert report['pairs'][0]['reason'] == main.SAME_SERIAL
+
+def test_near_serial_with_another_device_is_not_a_duplicate(collection):
+    add_items(collection, ('SN1234576', 'Coffee Machine'))
+    assert main.find_duplicates(main.ConsoleWorker(), collection)['pairs'] == []
+    assert main.likely_duplicate("Characters swapped", 'Coffee Machine', 'Dell Latitude 5420') is False
+    assert main.likely_duplicate(main.SAME_SERIAL, 'Coffee Machine', 'Dell Latitude 5420') is True
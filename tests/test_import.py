@@ -0,0 +1,56 @@
+import gzip
+import json
+
+import pytest
+
+import main
+
+@pytest.mark.parametrize('raw, expected', [
+    ({'Device Name': ' Dell Latitude ', 'Serial Number': 'SN1', 'Location': 'it office', 'Status': 'in-use', 'Assigned To': 'Sara'},
+     {'device_name': 'Dell Latitude', 'serial_number': 'SN1', 'location': 'IT Office', 'status': 'In Use', 'assigned_to': 'Sara'}),
+    ({'device_name': 'HP', 'serial_number': 'SN2', 'location': 'Kids  Club', 'status': 'AVAILABLE', 'notes': 'ignored'},
+     {'device_name': 'HP', 'serial_number': 'SN2', 'location': 'Kids Club', 'status': 'Available', 'assigned_to': ''}),
+])
+def test_valid_records_are_normalized(raw, expected):
+    assert main.validate_import_record(raw) == (expected, None)
+
+@pytest.mark.parametrize('raw, error', [
+    ({'device_name': 'HP', 'status': 'Available'}, "missing serial number"),
+    ({'device_name': 'HP', 'serial_number': '  ', 'status': 'Available'}, "missing serial number"),
+    ({'serial_number': 'SN3', 'status': 'Available'}, "missing device name"),
+    ({'device_name': 'HP', 'serial_number': 'SN3', 'status': 'Broken'}, "unknown status 'Broken'"),
+    ({'device_name': 'HP', 'serial_number': 'SN3', 'status': None}, "unknown status ''"),
+])
+def test_invalid_records_are_rejected(raw, error):
+    assert main.validate_import_record(raw) == (None, error)
+
+def test_csv_import_upserts_by_serial_and_reports_rejects(collection, tmp_path):
+    path = tmp_path / 'inventory.csv'
+    path.write_text(
+        "Device Name,Serial Number,Location,Status,Assigned To\n"
+        "Dell Latitude 5420,SN1234567,HR,Retired,\n"
+        "Dell Latitude 5540,NEW001,Spa,Available,\n"
+        ",NEW002,Spa,Available,\n"
+        "HP ProBook,NEW003,Spa,Lost,\n"
+        "Dell Latitude 5540,NEW001,Spa,In Use,Omar\n",
+        encoding='utf-8-sig')
+    report = main.import_inventory(main.ConsoleWorker(), collection, str(path), batch_size=2)
+    assert (report['read'], report['upserted'], report['updated']) == (5, 1, 2)
+    assert report['errors'] == ["line 4: missing device name", "line 5: unknown status 'Lost'"]
+    updated = collection.find_one({'serial_number': 'SN1234567'})
+    assert (updated['location'], updated['status'], updated['version']) == ('HR', 'Retired', 2)
+    added = collection.find_one({'serial_number': 'NEW001'})
+    # The later line won, and the words the server search uses came along
+    assert (added['status'], added['assigned_to'], added['version']) == ('In Use', 'Omar', 2)
+    assert added['words']['assigned_to'] == ['omar']
+    assert collection.count_documents({'serial_number': {'$in': ['NEW002', 'NEW003']}}) == 0
+
+def test_jsonl_import_rejects_lines_that_are_not_objects(collection, tmp_path):
+    path = tmp_path / 'inventory.jsonl.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'device_name': 'Zebra ZD421', 'serial_number': 'ZB01', 'status': 'Available'}) + "\n")
+        f.write("\n[1, 2]\n{broken\n")
+    report = main.import_inventory(main.ConsoleWorker(), collection, str(path))
+    assert (report['read'], report['upserted']) == (3, 1)
+    assert report['errors'][0] == "line 3: not a JSON object"
+    assert report['errors'][1].startswith("line 4: ")
@@ -0,0 +1,84 @@
+import random
+
+from bson import ObjectId
+from PyQt5.QtCore import QItemSelectionModel, Qt
+
+import main
+
+COLUMNS = [field for field, _ in main.INVENTORY_COLUMNS]
+
+def view(model, field='serial_number'):
+    return [model.row_data(row)[field] for row in range(model.rowCount())]
+
+def resorted(model, column, order):
+    # The same rows in a fresh model, sorted from scratch
+    fresh = main.InventoryTableModel()
+    fresh.set_rows(list(model.documents()))
+    fresh.sort(column, order)
+    return fresh
+
+def new_item(serial, **fields):
+    return dict({'_id': ObjectId(), 'device_name': 'Dell Latitude', 'serial_number': serial, 'location': 'HR',
+                 'status': 'Available', 'assigned_to': '', 'version': 1}, **fields)
+
+def test_sorted_insert_update_and_remove_keep_the_order(model):
+    column = COLUMNS.index('serial_number')
+    model.sort(column)
+    model.add_row(new_item('AAA001'))
+    model.add_row(new_item('ZZZ999'))
+    assert view(model)[0] == 'AAA001' and view(model)[-1] == 'ZZZ999'
+    model.update_row(model.rid_for_serial('AAA001'), {'serial_number': 'NNN500'})
+    model.remove_row(model.rid_for_serial('ZZZ999'))
+    assert view(model) == view(resorted(model, column, Qt.AscendingOrder))
+    assert 'NNN500' in view(model) and 'ZZZ999' not in view(model)
+
+def test_random_deltas_match_a_full_sort(model):
+    rng = random.Random(7)
+    column = COLUMNS.index('location')
+    model.sort(column, Qt.DescendingOrder)
+    locations = ['HR', 'Spa', 'Lobby', 'Finance', '']
+    for step in range(300):
+        rids = list(model.store.rids())
+        choice = rng.random()
+        if choice < 0.4 or not rids:
+            model.add_row(new_item(f'R{step:04d}', location=rng.choice(locations)))
+        elif choice < 0.8:
+            model.update_row(rng.choice(rids), {'location': rng.choice(locations)})
+        else:
+            model.remove_row(rng.choice(rids))
+    # Batches past BATCH_DELTA_ROWS take the merge path
+    rids = list(model.store.rids())
+    model.update_rows([(rid, {'location': rng.choice(locations)}) for rid in rng.sample(rids, 40)])
+    model.add_rows([new_item(f'B{index:04d}', location=rng.choice(locations)) for index in range(40)])
+    model.remove_rows(rng.sample(list(model.store.rids()), 40))
+    expected = resorted(model, column, Qt.DescendingOrder)
+    assert view(model, 'location') == view(expected, 'location')
+    assert view(model) == view(expected)
+
+def test_deltas_respect_the_search(model):
+    model.set_query('dell')
+    before = model.rowCount()
+    model.add_row(new_item('DUP001', device_name='Dell OptiPlex'))
+    model.add_row(new_item('HP001', device_name='HP ProDesk'))
+    assert model.rowCount() == before + 1
+    model.update_row(model.rid_for_serial('DUP001'), {'device_name': 'Lenovo M70'})
+    assert model.rowCount() == before
+    model.update_row(model.rid_for_serial('HP001'), {'device_name': 'Dell Vostro'})
+    assert 'HP001' in view(model)
+
+def test_selection_follows_rows_moved_by_deltas(model):
+    # The window maps selected rows to row ids; rows inserted or removed above a selected
+    # one must not change which item it names
+    model.sort(COLUMNS.index('serial_number'))
+    selection = QItemSelectionModel(model)
+    target = model.rid_for_serial('SN1234567')
+    row = view(model).index('SN1234567')
+    selection.select(model.index(row, 0), QItemSelectionModel.Select | QItemSelectionModel.Rows)
+    model.add_row(new_item('AAA001'))
+    model.remove_row(model.rid_for_serial('MBP2022'))
+    model.update_row(model.rid_for_serial('UBIAP01'), {'serial_number': 'AAA000'})
+    selected = [model.rid_at(index.row()) for index in selection.selectedRows()]
+    assert selected == [target]
+    # Row ids stay put while the row itself moves
+    model.update_row(target, {'serial_number': 'ZZZ999'})
+    assert model.row_data(model.rowCount() - 1)['_id'] == model.document(target)['_id']
@@ -0,0 +1,83 @@
+import pytest
+
+import main
+
+def serials(model, rids):
+    return {model.document(rid)['serial_number'] for rid in rids}
+
+def server_serials(collection, query_filter):
+    return {doc['serial_number'] for doc in collection.find(query_filter, {'serial_number': 1})}
+
+@pytest.mark.parametrize('text', ['', 'dell', 'Dell Latitude', 'sn12', 'in use', '  '])
+def test_plain_text_is_not_structured(text):
+    assert main.parse_query(text) is None
+
+def test_parse_terms():
+    query = main.parse_query('status:available location:"server room" -assigned:"" dell OR serial:SN12*')
+    T = main.QueryTerm
+    assert query.clauses == [
+        [T('status', 'available', 'available', 'equals', False),
+         T('location', 'server room', 'server room', 'equals', False),
+         T('assigned_to', '', '', 'equals', True),
+         T(None, 'dell', 'dell', 'contains', False)],
+        [T('serial_number', 'SN12', 'sn12', 'prefix', False)],
+    ]
+
+def test_parse_aliases_and_unknown_fields():
+    query = main.parse_query('user:ahmed loc:it -foo:bar')
+    T = main.QueryTerm
+    assert query.clauses == [[
+        T('assigned_to', 'ahmed', 'ahmed', 'contains', False),
+        T('location', 'it', 'it', 'equals', False),
+        T(None, 'foo:bar', 'foo:bar', 'contains', True),
+    ]]
+
+def test_parse_or_separators():
+    assert main.parse_query('status:retired | status:available') == main.parse_query('status:retired OR status:available')
+    assert len(main.parse_query('status:retired OR').clauses) == 1
+
+PARITY_QUERIES = [
+    'status:available',
+    'status:"in use" location:"it office"',
+    '-status:retired',
+    'dell -status:available',
+    'device:dell location:reception',
+    'name:lat*',
+    'serial:sn*',
+    'serial:"sn1234567"',
+    'sn:1234',
+    'assigned:""',
+    '-assigned:""',
+    'user:smith OR user:sara',
+    'status:retired | loc:spa',
+    'location:"server room" OR serial:MXM*',
+    '"dell"',
+    '-dell -hp',
+    'status:avail*',
+    'status:nonsense',
+]
+
+@pytest.mark.parametrize('text', PARITY_QUERIES)
+def test_memory_and_server_agree(model, collection, text):
+    query = main.parse_query(text)
+    expected = serials(model, query.search(model))
+    assert expected == serials(model, [rid for rid in model.store.rids() if query.matches(model, rid)])
+    assert expected == server_serials(collection, query.to_filter(indexed=False))
+
+# Word starts, where the indexed server filter matches what substring search does
+@pytest.mark.parametrize('text', [
+    'status:available', 'dell -status:available', 'device:lat', 'device:dell*', 'user:smith OR user:sara',
+    'assigned:""', 'serial:sn*', 'sn:sn12', 'location:"server room" OR serial:MXM*', 'status:retired | loc:spa',
+])
+def test_indexed_filter_agrees_on_word_starts(model, collection, text):
+    query = main.parse_query(text)
+    assert serials(model, query.search(model)) == server_serials(collection, query.to_filter(indexed=True))
+
+def test_indexed_filter_matches_from_word_start(collection):
+    assert server_serials(collection, main.parse_query('device:lat').to_filter()) == {'SN1234567', 'SN7654321'}
+    assert server_serials(collection, main.parse_query('device:titude').to_filter()) == set()
+    assert server_serials(collection, main.parse_query('sn:1234').to_filter()) == set()
+
+@pytest.mark.parametrize('text', ['dell', 'lat', 'in use', 'sn', 'room', 'a', 'zz'])
+def test_plain_search_agrees_with_server(model, collection, text):
+    assert serials(model, model.search_index.search(text)) == server_serials(collection, main.build_search_filter(text))
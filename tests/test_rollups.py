@@ -0,0 +1,54 @@
+import datetime
+
+import main
+
+def cells(collection):
+    return {(cell['location'], cell['status'], cell['device_name']): cell['count'] for cell in main.read_rollups(collection)}
+
+def test_rebuild_counts_every_cell(collection, merge_stage):
+    main.rebuild_rollups(collection)
+    counted = cells(collection)
+    assert sum(counted.values()) == collection.count_documents({})
+    assert counted[('Reception', 'Available', 'HP EliteBook 840')] == 1
+
+def test_writes_move_items_between_cells(collection, merge_stage):
+    main.rebuild_rollups(collection)
+    doc = collection.find_one({'serial_number': 'SN9876543'})
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'status': 'In Use', 'assigned_to': 'Omar'})
+    counted = cells(collection)
+    assert ('Reception', 'Available', 'HP EliteBook 840') not in counted
+    assert counted[('Reception', 'In Use', 'HP EliteBook 840')] == 1
+    main.apply_inventory_write(collection, 'delete', doc['_id'], {})
+    assert ('Reception', 'In Use', 'HP EliteBook 840') not in cells(collection)
+    assert sum(cells(collection).values()) == collection.count_documents({})
+
+def test_rebuild_keeps_cells_written_while_it_runs(collection, merge_stage, monkeypatch):
+    main.update_rollups(collection, [(None, {'location': 'Gone', 'status': 'Retired', 'device_name': 'Old'})])
+    aggregate = collection.aggregate
+    def racing(pipeline, *args, **kwargs):
+        result = aggregate(pipeline, *args, **kwargs)
+        # Another client adds an item between the $merge and the cleanup
+        main.update_rollups(collection, [(None, {'location': 'Spa', 'status': 'Available', 'device_name': 'New'})])
+        return result
+    monkeypatch.setattr(collection, 'aggregate', racing)
+    main.rebuild_rollups(collection)
+    counted = cells(collection)
+    assert ('Gone', 'Retired', 'Old') not in counted
+    assert counted[('Spa', 'Available', 'New')] == 1
+
+def test_drift_with_the_right_total_is_recounted_once_due(collection, merge_stage):
+    main.ensure_rollups(collection)
+    # A delta computed from a stale read: the item never left its cell, but the total still matches
+    main.update_rollups(collection, [({'location': 'HR', 'status': 'Available', 'device_name': 'Lenovo ThinkPad X1'},
+                                      {'location': 'HR', 'status': 'Retired', 'device_name': 'Lenovo ThinkPad X1'})])
+    drifted = cells(collection)
+    assert sum(drifted.values()) == collection.count_documents({})
+    main.ensure_rollups(collection)
+    assert cells(collection) == drifted
+    recounted_at = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=main.ROLLUP_RECOUNT_HOURS + 1)
+    main.rollups_for(collection).update_one({'_id': main.ROLLUP_RECOUNTED}, {'$set': {'at': recounted_at}})
+    main.ensure_rollups(collection)
+    counted = cells(collection)
+    assert counted[('HR', 'Available', 'Lenovo ThinkPad X1')] == 1
+    assert ('HR', 'Retired', 'Lenovo ThinkPad X1') not in counted
+    assert not main.rollups_due(collection)
@@ -0,0 +1,67 @@
+import random
+
+import main
+
+def brute_force(texts, query):
+    return {rid for rid, text in texts.items() if query in text}
+
+def test_no_query_means_no_filter():
+    index = main.SearchIndex()
+    index.add(0, 'dell latitude')
+    assert index.search('') is None
+
+def test_short_and_long_queries():
+    index = main.SearchIndex()
+    texts = {0: 'dell latitude 5420', 1: 'hp elitebook 840', 2: 'dell p2422h monitor'}
+    for rid, text in texts.items():
+        index.add(rid, text)
+    for query in ('d', 'de', 'dell', '42', '840', 'dell l', 'nothing', 'e'):
+        assert index.search(query) == brute_force(texts, query), query
+
+def test_edits_and_removals_drop_stale_matches():
+    index = main.SearchIndex()
+    index.add(0, 'dell latitude')
+    index.add(1, 'hp elitebook')
+    assert index.search('dell') == {0}
+    index.update(0, 'lenovo thinkpad')
+    assert index.search('dell') == set()
+    assert index.search('think') == {0}
+    index.remove(1)
+    assert index.search('elite') == set()
+    assert index.text(1) is None
+
+def test_narrowed_query_sees_rows_added_since():
+    # The previous result only narrows the next search until the index changes
+    index = main.SearchIndex()
+    index.add(0, 'dell latitude')
+    assert index.search('del') == {0}
+    index.add(1, 'dell monitor')
+    assert index.search('dell') == {0, 1}
+    index.update(1, 'hp monitor')
+    assert index.search('dell') == {0}
+
+def test_matches_brute_force_through_compaction():
+    rng = random.Random(7)
+    words = ['dell', 'latitude', 'hp', 'elitebook', 'reception', 'it office', 'in use', 'available', 'sn12', 'ahmed']
+    index = main.SearchIndex()
+    texts = {}
+    next_rid = 0
+    for step in range(6000):
+        action = rng.random()
+        if action < 0.4 or not texts:
+            text = ' '.join(rng.sample(words, 3))
+            index.add(next_rid, text)
+            texts[next_rid] = text
+            next_rid += 1
+        elif action < 0.7:
+            rid = rng.choice(list(texts))
+            text = ' '.join(rng.sample(words, 3))
+            index.update(rid, text)
+            texts[rid] = text
+        else:
+            rid = rng.choice(list(texts))
+            index.remove(rid)
+            del texts[rid]
+        if step % 200 == 0:
+            for query in ('d', 'el', 'dell', 'dell lat', 'in use', 'office it', 'xyz'):
+                assert index.search(query) == brute_force(texts, query), (step, query)
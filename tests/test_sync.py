@@ -0,0 +1,91 @@
+import datetime
+
+import pytest
+
+import main
+
+@pytest.fixture
+def cache(tmp_path, collection):
+    # A snapshot already in step with the collection
+    collection.update_many({}, {'$currentDate': {'updated_at': True}})
+    cache = main.SnapshotCache(str(tmp_path / 'snapshot.db'))
+    main.sync_snapshot(main.ConsoleWorker(), collection, cache)
+    return cache
+
+def item(collection, serial):
+    return collection.find_one({'serial_number': serial})
+
+def test_sync_reports_the_cells_it_replaced(collection, cache):
+    moved = item(collection, 'SN1234567')
+    gone = item(collection, 'SN7654321')
+    main.apply_inventory_write(collection, 'update', moved['_id'], {'status': 'Retired', 'location': 'Storage'})
+    main.apply_inventory_write(collection, 'delete', gone['_id'], {})
+    result = main.sync_snapshot(main.ConsoleWorker(), collection, cache)
+    assert 'SN1234567' in [doc['serial_number'] for doc in result['changed']]
+    assert result['deleted'] == [gone['_id']]
+    before = result['before']
+    assert before[main.doc_key(moved['_id'])] == {'status': 'In Use', 'location': 'IT Office', 'version': 1}
+    assert before[main.doc_key(gone['_id'])] == {'status': 'Available', 'location': 'Reception', 'version': 1}
+    assert cache.cells([moved['_id'], gone['_id']]) == {main.doc_key(moved['_id']): {'status': 'Retired', 'location': 'Storage', 'version': 2},
+                                                        main.doc_key(gone['_id']): None}
+
+def test_sync_reports_rows_deleted_outside_the_app(collection, cache):
+    gone = item(collection, 'UBIAP01')
+    collection.delete_one({'_id': gone['_id']})
+    result = main.sync_snapshot(main.ConsoleWorker(), collection, cache)
+    assert result['deleted'] == [gone['_id']]
+    assert result['before'][main.doc_key(gone['_id'])]['status'] == 'Retired'
+    assert cache.count() == collection.count_documents({})
+
+def pull(collection, since, **kwargs):
+    return main.pull_changes(main.ConsoleWorker(), collection, since, **kwargs)
+
+def test_pull_without_a_mark_is_full(collection):
+    result = pull(collection, None)
+    assert result['full'] is True
+    assert len(result['changed']) == collection.count_documents({})
+
+def test_pull_sees_writes_and_deletes_since_the_mark(collection):
+    old = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(hours=1)
+    collection.update_many({}, {'$set': {'updated_at': old}})
+    since = old + main.SYNC_OVERLAP + datetime.timedelta(seconds=1)
+    moved = item(collection, 'SN1234567')
+    gone = item(collection, 'SN7654321')
+    main.apply_inventory_write(collection, 'update', moved['_id'], {'status': 'Retired'})
+    main.apply_inventory_write(collection, 'delete', gone['_id'], {})
+    result = pull(collection, since)
+    assert result['full'] is False
+    assert [doc['serial_number'] for doc in result['changed']] == ['SN1234567']
+    assert result['deleted'] == [gone['_id']]
+    assert result['newest'] > since
+    # An undo brings the deleted item back: its tombstone no longer counts
+    main.apply_inventory_write(collection, 'restore', [gone['_id']], {'docs': [gone]})
+    assert pull(collection, since)['deleted'] == []
+
+def test_pull_past_the_delta_limit_asks_for_a_reload(collection, monkeypatch):
+    monkeypatch.setattr(main, 'SNAPSHOT_DELTA_LIMIT', 5)
+    result = pull(collection, None)
+    assert result['changed'] is None
+
+def test_offline_writes_are_replayed_in_order(collection, cache):
+    doc = item(collection, 'SN1234567')
+    main.write_inventory(main.ConsoleWorker(), collection, cache, 'update', doc['_id'], {'status': 'Retired', 'version': 1}, offline=True, user='omar')
+    main.write_inventory(main.ConsoleWorker(), collection, cache, 'update', doc['_id'], {'location': 'HR', 'version': 2}, offline=True, user='omar')
+    assert cache.pending_count() == 2
+    assert cache.cells([doc['_id']])[main.doc_key(doc['_id'])] == {'status': 'Retired', 'location': 'HR', 'version': 3}
+    result = main.sync_snapshot(main.ConsoleWorker(), collection, cache)
+    assert (result['replayed'], result['rejected']) == (2, [])
+    assert cache.pending_count() == 0
+    doc = item(collection, 'SN1234567')
+    assert (doc['status'], doc['location'], doc['version']) == ('Retired', 'HR', 3)
+
+def test_rejected_replay_takes_the_server_copy(collection, cache):
+    doc = item(collection, 'SN1234567')
+    main.write_inventory(main.ConsoleWorker(), collection, cache, 'update', doc['_id'], {'status': 'Retired', 'version': 1}, offline=True)
+    # Someone else edited it first
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'assigned_to': 'Sara', 'version': 1})
+    result = main.sync_snapshot(main.ConsoleWorker(), collection, cache)
+    assert result['replayed'] == 0
+    assert len(result['rejected']) == 1
+    stored = {row['serial_number']: row for row in cache.iter_documents()}['SN1234567']
+    assert (stored['status'], stored['assigned_to'], stored['version']) == ('In Use', 'Sara', 2)
@@ -0,0 +1,85 @@
+from pymongo.errors import AutoReconnect
+
+import main
+
+class Connection:
+    # Stands in for ConnectionManager
+    def __init__(self, up=True):
+        self.up = up
+        self.retries = 0
+
+    def is_connected(self):
+        return self.up
+
+    def retry_now(self):
+        self.retries += 1
+
+def item(collection, serial):
+    return collection.find_one({'serial_number': serial})
+
+def settled(queue):
+    return lambda: queue.worker is None and not queue.pending
+
+def test_updates_to_one_item_merge_into_one_write(qapp, wait, collection):
+    queue = main.WriteBehindQueue(collection, connection=Connection())
+    doc = item(collection, 'SN1234567')
+    assert queue.add(doc['_id'], {'status': 'Retired'}) is True
+    assert queue.add(doc['_id'], {'location': 'Storage'}) is False
+    assert queue.waiting(doc['_id']) == {'status': 'Retired', 'location': 'Storage'}
+    queue.flush()
+    wait(settled(queue))
+    doc = item(collection, 'SN1234567')
+    assert (doc['status'], doc['location'], doc['version']) == ('Retired', 'Storage', 2)
+
+def test_failed_batch_is_retried_with_later_scans_on_top(qapp, wait, collection, monkeypatch):
+    connection = Connection()
+    queue = main.WriteBehindQueue(collection, connection=connection)
+    doc = item(collection, 'SN1234567')
+    real_flush = main.flush_writes
+    def unreachable(*args):
+        raise AutoReconnect("connection reset")
+    monkeypatch.setattr(main, 'flush_writes', unreachable)
+    queue.add(doc['_id'], {'status': 'Retired', 'location': 'Storage'})
+    queue.flush()
+    wait(lambda: queue.worker is None)
+    assert queue.delay == 2 * main.WRITE_BEHIND_FLUSH_MS
+    assert connection.retries == 1
+    queue.add(doc['_id'], {'status': 'In Use'})
+    monkeypatch.setattr(main, 'flush_writes', real_flush)
+    queue.flush()
+    wait(settled(queue))
+    doc = item(collection, 'SN1234567')
+    assert (doc['status'], doc['location']) == ('In Use', 'Storage')
+    assert queue.delay == main.WRITE_BEHIND_FLUSH_MS
+
+def test_offline_scans_without_a_snapshot_survive_a_restart(qapp, wait, collection, spill_file):
+    connection = Connection(up=False)
+    queue = main.WriteBehindQueue(collection, connection=connection)
+    doc = item(collection, 'SN1234567')
+    queue.add(doc['_id'], {'status': 'Retired'})
+    queue.flush()
+    assert spill_file.count('scans') == 1
+    queue.timer.stop()
+    # The app was killed; the next start sends what the file kept
+    restarted = main.WriteBehindQueue(collection, connection=Connection())
+    assert len(restarted) == 1
+    restarted.flush()
+    wait(settled(restarted))
+    assert item(collection, 'SN1234567')['status'] == 'Retired'
+    assert spill_file.count('scans') == 0
+
+def test_drain_with_a_snapshot_queues_what_is_waiting(qapp, wait, collection, tmp_path):
+    cache = main.SnapshotCache(str(tmp_path / 'snapshot.db'))
+    main.sync_snapshot(main.ConsoleWorker(), collection, cache)
+    queue = main.WriteBehindQueue(collection, cache, Connection())
+    doc = item(collection, 'SN1234567')
+    queue.add(doc['_id'], {'status': 'Retired'})
+    drained = []
+    queue.drain(drained.append)
+    wait(lambda: drained)
+    assert drained == [True]
+    assert [(op, fields) for _, op, _, fields, _, _ in cache.pending_writes()] == [('update', {'status': 'Retired'})]
+    assert item(collection, 'SN1234567')['status'] == 'In Use'
+    # Replayed by the next sync
+    main.sync_snapshot(main.ConsoleWorker(), collection, cache)
+    assert item(collection, 'SN1234567')['status'] == 'Retired'
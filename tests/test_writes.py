@@ -0,0 +1,148 @@
+import pytest
+from bson import ObjectId
+
+import main
+
+def item(collection, serial):
+    return collection.find_one({'serial_number': serial})
+
+def history(collection, doc_id):
+    main.audit_log.flush()
+    return [(event['op'], event.get('v')) for event in main.load_history(None, collection, doc_id)]
+
+def test_insert_starts_at_version_one(collection):
+    doc_id = ObjectId()
+    fields = {"device_name": "Dell Latitude 5540", "serial_number": "NEW001", "location": "HR", "status": "Available", "assigned_to": ""}
+    changes = main.apply_inventory_write(collection, 'insert', doc_id, fields, 'tester')
+    assert changes == [(None, dict(main.with_search_keys(fields), _id=doc_id))]
+    doc = collection.find_one({'_id': doc_id})
+    assert doc['version'] == 1
+    assert doc['words']['device_name'] == ['dell', 'latitude', '5540']
+    assert history(collection, doc_id) == [('insert', 1)]
+
+def test_update_bumps_the_version(collection):
+    doc = item(collection, 'SN1234567')
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'status': 'Retired', 'version': 1}, 'tester')
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'location': 'HR'}, 'tester')
+    doc = item(collection, 'SN1234567')
+    assert (doc['status'], doc['location'], doc['version']) == ('Retired', 'HR', 3)
+    assert history(collection, doc['_id']) == [('update', 3), ('update', 2)]
+
+def test_stale_version_raises_conflict_with_the_current_copy(collection):
+    doc = item(collection, 'SN1234567')
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'assigned_to': 'Sara', 'version': 1})
+    with pytest.raises(main.EditConflict) as conflict:
+        main.apply_inventory_write(collection, 'update', doc['_id'], {'assigned_to': 'Omar', 'version': 1})
+    assert conflict.value.current['assigned_to'] == 'Sara'
+    assert conflict.value.current['version'] == 2
+    assert item(collection, 'SN1234567')['assigned_to'] == 'Sara'
+
+def test_conflict_on_a_deleted_item_has_no_current_copy(collection):
+    doc = item(collection, 'SN1234567')
+    main.apply_inventory_write(collection, 'delete', doc['_id'], {})
+    assert main.tombstones_for(collection).find_one({'_id': doc['_id']}) is not None
+    with pytest.raises(main.EditConflict) as conflict:
+        main.apply_inventory_write(collection, 'update', doc['_id'], {'status': 'Retired', 'version': 1})
+    assert conflict.value.current is None
+
+def test_restore_of_a_deleted_item(collection):
+    doc = item(collection, 'SN1234567')
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'status': 'Retired', 'version': 1})
+    deleted = dict(doc, status='Retired', version=2)
+    main.apply_inventory_write(collection, 'delete', doc['_id'], {})
+    changes = main.apply_inventory_write(collection, 'restore', [doc['_id']], {'docs': [deleted]})
+    restored = item(collection, 'SN1234567')
+    # Past the copy being put back, so no client takes it for that older copy
+    assert restored['version'] == 3
+    assert restored['status'] == 'Retired'
+    assert changes[0][1]['version'] == 3
+    assert main.tombstones_for(collection).find_one({'_id': doc['_id']}) is None
+    assert history(collection, doc['_id'])[0] == ('restore', 3)
+
+def revert_item(doc, **edit):
+    return {'_id': doc['_id'], 'set': {field: doc[field] for field in edit}, 'was': edit}
+
+def test_revert_keeps_later_writes_to_other_fields(collection):
+    # Undoing an edit after someone else wrote on top of it only puts back what the edit changed
+    doc = item(collection, 'SN1234567')
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'status': 'Retired', 'version': 1})
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'location': 'Spa', 'version': 2})
+    changes = main.apply_inventory_write(collection, 'revert', [doc['_id']], {'docs': [revert_item(doc, status='Retired')]})
+    reverted = item(collection, 'SN1234567')
+    assert (reverted['status'], reverted['location'], reverted['version']) == ('In Use', 'Spa', 4)
+    assert changes[0][1]['version'] == 4
+    assert history(collection, doc['_id'])[0] == ('update', 4)
+
+def test_revert_leaves_fields_written_since(collection, tmp_path):
+    kept, changed = item(collection, 'SN1234567'), item(collection, 'SN7654321')
+    ids = [kept['_id'], changed['_id']]
+    main.apply_inventory_write(collection, 'update_many', ids, {'status': 'Retired'})
+    main.apply_inventory_write(collection, 'update', changed['_id'], {'status': 'In Use', 'version': 2})
+    cache = main.SnapshotCache(str(tmp_path / 'snapshot.db'))
+    fields = {'docs': [revert_item(kept, status='Retired'), revert_item(changed, status='Retired')]}
+    assert main.write_inventory(main.ConsoleWorker(), collection, cache, 'revert', ids, fields) is False
+    assert [doc['version'] for doc in fields['docs']] == [3, None]
+    assert [doc['serial_number'] for doc in fields['current']] == ['SN7654321']
+    assert item(collection, 'SN1234567')['status'] == 'In Use'
+    assert item(collection, 'SN7654321')['status'] == 'In Use'
+    assert item(collection, 'SN7654321')['version'] == 3
+    assert cache.cells(ids) == {main.doc_key(kept['_id']): {'status': 'In Use', 'location': 'IT Office', 'version': 3},
+                                main.doc_key(changed['_id']): {'status': 'In Use', 'location': 'Reception', 'version': 3}}
+
+def test_edit_read_before_a_restore_conflicts(collection):
+    doc = item(collection, 'SN1234567')
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'status': 'Retired', 'version': 1})
+    main.apply_inventory_write(collection, 'restore', [doc['_id']], {'docs': [doc]})
+    with pytest.raises(main.EditConflict):
+        main.apply_inventory_write(collection, 'update', doc['_id'], {'assigned_to': 'Omar', 'version': 2})
+    restored = item(collection, 'SN1234567')
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'assigned_to': 'Omar', 'version': restored['version']})
+    assert item(collection, 'SN1234567')['assigned_to'] == 'Omar'
+
+def test_bulk_ops(collection):
+    ids = [item(collection, serial)['_id'] for serial in ('SN1234567', 'SN9876543')]
+    main.apply_inventory_write(collection, 'update_many', ids, {'location': 'Storage'})
+    assert {doc['location'] for doc in collection.find({'_id': {'$in': ids}})} == {'Storage'}
+    assert {doc['version'] for doc in collection.find({'_id': {'$in': ids}})} == {2}
+    changes = main.apply_inventory_write(collection, 'delete_many', ids, {})
+    assert len(changes) == 2
+    assert collection.count_documents({'_id': {'$in': ids}}) == 0
+
+def test_audit_events_wait_on_disk_until_the_server_has_them(collection, spill_file, monkeypatch):
+    doc = item(collection, 'SN1234567')
+    main.apply_inventory_write(collection, 'update', doc['_id'], {'status': 'Retired', 'version': 1}, 'tester')
+    assert spill_file.count('audit') == 1
+    def unreachable(collection, events):
+        raise main.ConnectionFailure("server went away")
+    with monkeypatch.context() as patch:
+        patch.setattr(main, 'insert_audit', unreachable)
+        assert main.audit_log.flush() is False
+    assert spill_file.count('audit') == 1
+    # Sent again after a restart: only the file is left
+    main.audit_log.collections.clear()
+    monkeypatch.setattr(main, 'get_client', lambda: collection.database.client)
+    assert history(collection, doc['_id']) == [('update', 2)]
+    assert spill_file.count('audit') == 0
+
+def test_replayed_offline_writes_keep_their_author_and_time(collection, tmp_path):
+    cache = main.SnapshotCache(str(tmp_path / 'snapshot.db'))
+    doc = item(collection, 'SN1234567')
+    main.write_inventory(None, collection, cache, 'update', doc['_id'], {'assigned_to': 'Omar', 'version': 1}, offline=True, user='sara')
+    queued_at = cache.pending_writes()[0][5]
+    main.sync_snapshot(main.ConsoleWorker(), collection, cache, user='admin')
+    assert item(collection, 'SN1234567')['assigned_to'] == 'Omar'
+    main.audit_log.flush()
+    event = main.audit_for(collection).find_one({'asset': doc['_id']})
+    assert (event['user'], event['at']) == ('sara', queued_at)
+
+def test_old_documents_are_upgraded_once(collection):
+    old = collection.insert_one({'device_name': 'Old Laptop', 'serial_number': 'OLD-1', 'location': 'HR', 'status': 'Available', 'assigned_to': ''}).inserted_id
+    main.upgrade_documents(collection)
+    doc = collection.find_one({'_id': old})
+    assert (doc['version'], doc['serial_norm'], doc['words']['device_name']) == (1, main.normalize_serial('OLD-1'), ['old', 'laptop'])
+    assert doc['updated_at'] is not None
+    assert main.meta_for(collection).find_one({'_id': main.SCHEMA_MARKER})['version'] == main.SCHEMA_VERSION
+    # Later starts skip the scan
+    later = collection.insert_one({'device_name': 'Later', 'serial_number': 'OLD-2'}).inserted_id
+    main.upgrade_documents(collection)
+    assert 'updated_at' not in collection.find_one({'_id': later})